@@ -2,7 +2,7 @@
 """customized widgets"""
 
 from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtWidgets import QCheckBox, QComboBox, QPushButton, QRadioButton, QSizePolicy, QTableWidget
+from PyQt5.QtWidgets import QCheckBox, QComboBox, QPushButton, QRadioButton, QSizePolicy, QTableView
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 # from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
@@ -95,12 +95,12 @@ class CustomMplCanvas(FigureCanvas):
         raise NotImplementedError("this method needs to be defined by subclass")
 
 
-class CustomTableWidget(QTableWidget):
-    """customized table widget to enable right click events"""
+class CustomTableView(QTableView):
+    """customized table view to enable right click events"""
     rightClicked = pyqtSignal(int)
 
     def mousePressEvent(self, e):
         """..."""
-        super(CustomTableWidget, self).mousePressEvent(e)
+        super(CustomTableView, self).mousePressEvent(e)
         if e.buttons() == Qt.RightButton:
-            self.rightClicked.emit(self.currentRow())
+            self.rightClicked.emit(self.currentIndex().row())
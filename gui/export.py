@@ -0,0 +1,131 @@
+# coding=utf-8
+"""
+headless batch export of portfolio curve images
+curves are rendered on Agg canvases in a process pool, neither display nor QApplication is required
+every worker keeps one figure template and only updates its artists between images
+"""
+
+from sys import path as sys_path
+sys_path.append("{}/..".format(sys_path[0]))
+
+from concurrent.futures import ProcessPoolExecutor
+from gui.figure import PayoffPlot, PlotParam, plot_reference
+from instrument import Instrument
+from instrument.default_param import env_default_param
+from instrument.portfolio import CurveType, Portfolio
+from instrument.storage import BookBuilder, JsonPortfolioReader, from_records, load_book
+from os import cpu_count, makedirs, path as os_path
+
+image_format = ['png', 'svg']
+book_suffix = '.book'
+payoff_curve = [CurveType.Payoff.value, CurveType.NetPayoff.value]
+
+_template = None
+
+
+class CurveFigure(object):
+    """offscreen payoff curve figure, created once and reused for every image"""
+    def __init__(self, width_=5, height_=4, dpi_=100):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self._fig = Figure(figsize=(width_, height_), dpi=dpi_)
+        self._canvas = FigureCanvasAgg(self._fig)
+        self._payoff = PayoffPlot(self._fig.add_subplot(111))
+
+    def render(self, data_, file_path_, format_='png'):
+        """
+        render payoff curve into image file
+        :param data_: a dict as PayoffCurve.update_figure
+        """
+        self._payoff.update(data_)
+        self._fig.savefig(file_path_, format=format_)
+
+
+def read_portfolio(file_path_):
+    """
+    read a json or book portfolio file
+    :return: leg dicts of json schema, env, and row index and error message of skipped invalid json legs
+    """
+    if file_path_.endswith(book_suffix):
+        _records, _env, _curves, _extra = load_book(file_path_)
+        return list(from_records(_records, _extra)), _env, []
+    _reader = JsonPortfolioReader(file_path_)
+    _builder = BookBuilder()
+    for _leg in _reader.legs():
+        _builder.add(_leg)
+    return list(from_records(_builder.records(), _builder.extra())), _reader.header.get('env'), _builder.errors()
+
+
+def export_curves(file_paths_, types_, directory_, format_='png', worker_=None, size_=(5, 4), dpi_=100, cache_=None):
+    """
+    render curve images of many portfolio files in a process pool
+    images are named after portfolio file and curve type, e.g. book_1_net_payoff.png
+    :param types_: curve types rendered for every portfolio
+    :param worker_: number of worker processes, default to number of cpus
+    :param cache_: DiskCache shared by workers for curves needing pricing engine
+    :return: list of (portfolio file, image files, error message or None) in order of portfolio files
+    """
+    if format_ not in image_format:
+        raise ValueError("invalid image format given: {}".format(format_))
+    for _type in types_:
+        if _type not in [_c.value for _c in CurveType]:
+            raise ValueError("invalid curve type given: {}".format(_type))
+    makedirs(directory_, exist_ok=True)
+
+    with ProcessPoolExecutor(worker_ or cpu_count() or 1, initializer=_init_worker,
+                             initargs=(size_, dpi_)) as _pool:
+        _futures = [_pool.submit(_export_portfolio, _path, list(types_), directory_, format_, cache_)
+                    for _path in file_paths_]
+        return [_future.result() for _future in _futures]
+
+
+def _init_worker(size_, dpi_):
+    global _template
+    _template = CurveFigure(size_[0], size_[1], dpi_)
+
+
+def _export_portfolio(file_path_, types_, directory_, format_, cache_):
+    from gui.pricing_env import parse_env
+    _res = []
+    try:
+        _data, _env, _errors = read_portfolio(file_path_)
+        if _errors:
+            raise ValueError("{} invalid legs, first at row {}: {}".format(len(_errors), *_errors[0]))
+        if not _data:
+            raise ValueError("no data found")
+        _mkt, _engine, _rounding = parse_env(dict(env_default_param, **(_env or {})))
+        _portfolio = Portfolio([Instrument.get_inst(_leg) for _leg in _data])
+        _portfolio.set_mkt(_mkt)
+        _portfolio.set_engine(_engine)
+        _portfolio.set_show([Instrument.get_inst(_leg) for _leg in _data if _leg.get(PlotParam.Show.value)])
+
+        if set(types_) - set(payoff_curve):
+            _curves = _portfolio.gen_all_curves(full_=True, cache_=cache_, types_=types_)
+        else:
+            _curves = {_type: _portfolio.gen_curve(_type, full_=True) for _type in types_}
+
+        _name = os_path.splitext(os_path.basename(file_path_))[0]
+        for _type in types_:
+            _x, _y = _curves[_type]
+            _x_ref, _y_ref = plot_reference(_portfolio, _type)
+            _path = os_path.join(directory_, "{}_{}.{}".format(_name, _type.lower().replace(' ', '_'), format_))
+            _template.render(dict(x=_x, y=_y, type=_type, x_ref=_x_ref, y_ref=_y_ref), _path, format_)
+            _res.append(_path)
+    except (ValueError, KeyError, TypeError, OSError) as e:
+        return file_path_, _res, str(e)
+    return file_path_, _res, None
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    _parser = ArgumentParser(description="headless batch export of portfolio curve images")
+    _parser.add_argument('portfolio', nargs='+', help="json or book portfolio files")
+    _parser.add_argument('--type', nargs='+', default=[CurveType.Payoff.value], help="curve types")
+    _parser.add_argument('--output', default='.', help="output directory")
+    _parser.add_argument('--format', default='png', choices=image_format)
+    _parser.add_argument('--worker', type=int, default=None)
+    _args = _parser.parse_args()
+    for _file, _images, _error in export_curves(_args.portfolio, _args.type, _args.output, _args.format,
+                                                _args.worker):
+        print("{}: {}".format(_file, _error or ", ".join(_images)))
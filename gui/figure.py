@@ -0,0 +1,130 @@
+# coding=utf-8
+"""payoff curve figure template, independent of gui backend"""
+
+from enum import Enum
+from matplotlib.collections import LineCollection
+from numpy import arange, array, column_stack, empty, maximum as np_maximum, minimum as np_minimum, stack
+from utils import PRECISION_ZERO
+
+
+class PlotParam(Enum):
+    """plotting parameters"""
+    Show = 'Show'
+
+
+plot_default_param = {
+    PlotParam.Show.value: False,
+}
+
+plot_margin = 0.05
+
+
+def plot_reference(portfolio_, type_):
+    """horizontal (x_ref) and vertical (y_ref) reference levels of a portfolio curve"""
+    from instrument.portfolio import CurveType
+    _x_ref = 0 if type_ == CurveType.PnL.value else 100 if portfolio_.has_stock() else 0
+    return _x_ref, portfolio_.center()
+
+
+class PayoffPlot(object):
+    """
+    payoff curve artists on given axes
+    all artists are created once and updated in place, component lines share one line collection
+    """
+    def __init__(self, axes_, animated_=False):
+        self._axes = axes_
+        _vertical, = axes_.plot([], [], color="grey", linewidth=1.5, animated=animated_)
+        _horizontal, = axes_.plot([], [], color="grey", linewidth=1.5, animated=animated_)
+        _components = LineCollection([], colors="blue", linestyles='--', animated=animated_)
+        axes_.add_collection(_components, autolim=False)
+        _portfolio, = axes_.plot([], [], color="red", linestyle='-', animated=animated_)
+        self._lines = (_vertical, _horizontal, _components, _portfolio)
+        self._limits = None
+        self._title = None
+
+    def lines(self):
+        """all data artists"""
+        return self._lines
+
+    def set_animated(self, animated_):
+        """set if data artists are skipped by normal figure drawing"""
+        for _artist in self._lines:
+            _artist.set_animated(animated_)
+
+    def update(self, data_):
+        """
+        plot payoff curve using given data
+        :param data_: a dict consists with x (numpy array) and y (list of numpy array) in same dimension,
+            optional y_lim (min, max) fixes vertical range, so frames of an animation keep their axes
+        :return: if axis limits or title changed, which requires a full redraw
+        """
+        _x = data_.get('x', array([]))
+        _y = array(data_.get('y', [array([])]))
+        _type = data_.get('type')
+        _x_ref = data_.get('x_ref', 0)
+        _y_ref = data_.get('y_ref', 100)
+
+        if not _type:
+            raise ValueError("plot type is required")
+
+        _vertical, _horizontal, _components, _portfolio = self._lines
+        _show = bool(_x.size and _y.size)
+        for _artist in self._lines:
+            _artist.set_visible(_show)
+        _limits = self._limits
+        if _show:
+            _y = _y.reshape(-1, _x.size)
+            _y_min, _y_max = data_.get('y_lim') or (_y.min(), _y.max())
+            _vertical.set_data((_y_ref, _y_ref), (_y_min, _y_max))
+            _horizontal.set_visible(bool(_y_min <= _x_ref <= _y_max or abs(_y_min - _x_ref) <= PRECISION_ZERO
+                                         or abs(_y_max - _x_ref) <= PRECISION_ZERO))
+            _horizontal.set_data((_x.min(), _x.max()), (_x_ref, _x_ref))
+
+            _x_plot, _y_plot = self._downsample(_x, _y, int(self._axes.get_window_extent().width) or 1)
+            _components.set_segments([column_stack([_x_plot, _line]) for _line in _y_plot[1:]])
+            _portfolio.set_data(_x_plot, _y_plot[0])
+            _limits = self._padded(min(_x.min(), _y_ref), max(_x.max(), _y_ref)) + self._padded(_y_min, _y_max)
+            self._axes.set_xlim(_limits[:2])
+            self._axes.set_ylim(_limits[2:])
+
+        _relayout = _limits != self._limits or _type != self._title
+        self._limits = _limits
+        if _type != self._title:
+            self._set_axis(_type)
+            self._title = _type
+        return _relayout
+
+    @staticmethod
+    def _downsample(x_, y_, width_):
+        """
+        reduce lines to minimum and maximum within every pixel column, which keeps the drawn envelope unchanged
+        :param x_: increasing spot shared by all lines
+        :param y_: 2-d array of lines
+        :param width_: number of pixel columns
+        """
+        if x_.size <= 4 * width_ or x_[-1] <= x_[0]:
+            return x_, y_
+        _bucket = ((x_ - x_[0]) / (x_[-1] - x_[0]) * width_).astype(int).clip(0, width_ - 1)
+        _start = arange(x_.size)[1:][_bucket[1:] != _bucket[:-1]]
+        _start = array([0] + list(_start))
+        _end = array(list(_start[1:] - 1) + [x_.size - 1])
+        # each pixel column becomes a vertical stroke from its first to its last spot through min and max
+        _x = stack([x_[_start], x_[_start], x_[_end], x_[_end]], axis=1).ravel()
+        _y = empty((y_.shape[0], _start.size, 4))
+        _y[:, :, 0] = y_[:, _start]
+        _y[:, :, 1] = np_minimum.reduceat(y_, _start, axis=1)
+        _y[:, :, 2] = np_maximum.reduceat(y_, _start, axis=1)
+        _y[:, :, 3] = y_[:, _end]
+        return _x, _y.reshape(y_.shape[0], -1)
+
+    @staticmethod
+    def _padded(low_, high_):
+        _pad = (high_ - low_) * plot_margin or 1
+        return float(low_ - _pad), float(high_ + _pad)
+
+    def _set_axis(self, type_):
+        self._axes.set_xlabel("Spot")
+        # self._axes.set_ylabel(type_)
+        self._axes.set_title("Option Portfolio {} Curve".format(type_))
+        self._axes.grid(axis='x', linewidth=0.75, linestyle='-', color='0.75')
+        self._axes.grid(axis='y', linewidth=0.75, linestyle='-', color='0.75')
@@ -7,11 +7,19 @@ from PyQt5.QtWidgets import QDialog, QDialogButtonBox, QPlainTextEdit, QTabWidge
 help_content = [
     ("Inst Params", """1. Strike - strike price of an OPTION
 
-2. Qty - unit of each instrument
+2. Maturity - time to maturity of an OPTION (y)
+    * new OPTION takes Portfolio Maturity by default
+    * OPTIONs with different maturities can be mixed
+
+3. Qty - unit of each instrument
     * could be a FLOAT number
     * could be NEGATIVE indicating SHORT position
 
-3. Premium - unit cost / premium of an OPTION"""),
+4. Premium - unit cost / premium of an OPTION
+
+5. Exercise - exercise type of an OPTION
+    * European or American
+    * American exercise requires Lattice engine"""),
 
     ("Curve Types", """From portfolio view:
 1. Payoff Curve
@@ -23,6 +31,12 @@ help_content = [
 4. Gamma Curve
     * portfolio current Gamma
     * Monte-Carlo is not recommended
+5. Vega Curve
+    * portfolio current Vega, per 1% move of volatility
+6. Theta Curve
+    * portfolio current Theta, per calendar day
+7. Rho Curve
+    * portfolio current Rho, per 1% move of risk free rate
 
 From investment view:
 1. Net Payoff Curve
@@ -33,26 +47,74 @@ From investment view:
 
     ("Pricing Tips", """1. Right click an OPTION for auto pricing
     * right click on the target line
+    * Price All button prices every OPTION at once
+    * Price All can be cancelled while pricing
 
 2. Edit pricing env in Menu - Config - Pricing Env
+    * Time Elapsed slider below the curve shows PnL, PV and
+      greek curves as time passes with market unchanged,
+      all times are evaluated once on first drag and cached
 
 3. Plotting for portfolios with STOCK may become confusing 
     when dividend yield is not zero.
     Because of the difference between STOCK and FORWARD, 
     STOCK cannot be used to hedge OPTION directly according 
-    to the DELTA curve."""),
+    to the DELTA curve.
+
+4. Hedge in Menu - Config - Hedge
+    * finds up to 6 listed OPTIONs (strikes every 5 over the
+      plotting range, portfolio maturities) or STOCK that
+      minimize DELTA and GAMMA over the plotting range
+    * hedge legs are added after confirmation, with premiums
+      priced by current engine"""),
 
     ("Pricing Params", """1. Annual Risk Free Rate (%, default 3)
 2. Underlying Volatility (%, default 30)
 3. Dividend Yield Ratio (%, default 0)
 4. Portfolio Maturity (y)
+    * default maturity of new OPTIONs
 5. Cost Rounding (default 2)
 6. Rate Format (default Single)
     * Single or Compound (continuous)
     * if Single is chosen, 1 & 3 will shifted via:
     * r_c = (ln(1 + r / 100) - 1) * 100
 7. Pricing Engine (default Black-Scholes)
-    * Black-Scholes or Monte-Carlo""")
+    * Black-Scholes, Monte-Carlo, Lattice, PDE, Heston,
+      Heston MC or Fourier
+    * Lattice prices European and American options on a
+      binomial (default) or trinomial tree (default 200 steps)
+    * PDE solves the whole curve at once on a spot grid
+      (default 400 nodes and 100 time steps)
+    * barrier, asian and lookback options (file only) are
+      priced in closed form where available, otherwise
+      with Monte-Carlo (default 50 path steps)
+    * if Monte-Carlo target error or relative tolerance is
+      given, paths run in batches until the standard error
+      reaches it, and iteration becomes the path cap
+    * Heston prices European vanilla options semi-analytically
+      (default 256 quadrature nodes), Heston MC simulates paths
+      for exotic options as well, volatility above is the
+      initial volatility of both
+    * Fourier prices all European vanilla options of a maturity
+      on one FFT strike grid (default 4096 points) under
+      Black-Scholes or Heston model
+8. Heston Parameters (default 2, 30, 50 and -0.7)
+    * mean reversion speed, long-run volatility (%), volatility
+      of variance (%) and correlation of spot and variance
+9. Volatility Surface (portfolio file env only)
+    * UdVolSurface with strikes, maturities (y) and vols (%)
+      in rows of maturity, e.g. {"strikes": [90, 100, 110],
+      "maturities": [0.5, 1], "vols": [[32, 30, 29], [31, 30, 29]]}
+    * every OPTION takes the vol at its strike and maturity,
+      flat beyond quoted strikes and maturities, in place of
+      Underlying Volatility; Heston models ignore it
+10. Rate and Dividend Curves (portfolio file env only)
+    * RateCurve and UdDivCurve with maturities (y) and rates
+      (%) in Rate Format, e.g. {"maturities": [0.5, 1, 2],
+      "rates": [2, 2.5, 3]}
+    * every OPTION is discounted and carried at the zero rates
+      to its maturity in place of 1 & 3, flat forwards between
+      maturities and flat rates beyond them""")
 ]
 
 
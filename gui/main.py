@@ -13,20 +13,25 @@ from sys import path as sys_path
 sys_path.append("{}/..".format(sys_path[0]))
 
 from PyQt5.QtCore import QRect, Qt
-from PyQt5.QtWidgets import QApplication, QFileDialog, QHBoxLayout, QMainWindow, QMenu, QMessageBox, QPushButton
-from PyQt5.QtWidgets import QVBoxLayout, QWidget
+from PyQt5.QtWidgets import QApplication, QFileDialog, QHBoxLayout, QLabel, QMainWindow, QMenu, QMessageBox
+from PyQt5.QtWidgets import QProgressDialog, QPushButton, QSlider, QVBoxLayout, QWidget
 from gui.custom import CustomPushButton
+from gui.figure import plot_reference
 from gui.help import HelpDialog
 from gui.table import InstTable
 from gui.plot import PayoffCurve, PlotParam
 from gui.pricing_env import PricingEnv, parse_env
-from instrument import Instrument
+from instrument import InstParam, Instrument
 from instrument.default_param import env_default_param
 from instrument.env_param import EngineMethod
-from instrument.portfolio import CurveType, Portfolio
-from json import dumps, loads
-from numpy import array
+from instrument.hedge import HedgeSolver
+from instrument.portfolio import CurveType, Portfolio, decay_frames
+from instrument.storage import BookBuilder, JsonPortfolioReader, load_book, save_book
+from json import dumps
+from numpy import array, isnan
+from struct import error as struct_error
 from sys import argv as sys_argv, exit as sys_exit
+from utils.cache import DiskCache
 
 
 btn_group = [
@@ -40,9 +45,24 @@ btn_group = [
         ("Delta Curve", CurveType.Delta.value),
         ("Gamma Curve", CurveType.Gamma.value),
     ],
+    [
+        ("Vega Curve", CurveType.Vega.value),
+        ("Theta Curve", CurveType.Theta.value),
+        ("Rho Curve", CurveType.Rho.value),
+    ],
 ]
 
-MC_warning_curve = [CurveType.PnL.value, CurveType.PV.value, CurveType.Delta.value, CurveType.Gamma.value]
+portfolio_filter = "JSON Files (*.json);;Book Files (*.book)"
+book_suffix = '.book'
+progress_scale = 1000
+progress_batch = 1000
+error_preview = 10
+# strike spacing of hedge candidates over the plotting range, and most hedge legs added
+hedge_strike_step = 5
+hedge_max_legs = 6
+
+MC_warning_curve = [CurveType.PnL.value, CurveType.PV.value, CurveType.Delta.value, CurveType.Gamma.value,
+                    CurveType.Vega.value, CurveType.Theta.value, CurveType.Rho.value]
 
 
 class ApplicationWindow(QMainWindow):
@@ -65,6 +85,11 @@ class ApplicationWindow(QMainWindow):
         # initialize data storage
         self.env_data = env_default_param
         self._last_path = '.'
+        self._cache = DiskCache()
+        self._portfolio = None
+        self._portfolio_revision = None
+        self._curve_type = None
+        self._cube = None
         # setup and show
         self.setup_ui()
         self.show()
@@ -73,6 +98,7 @@ class ApplicationWindow(QMainWindow):
         """setup menu, option editor, and payoff curve viewer"""
         self._set_menu()
         self._plot = PayoffCurve(dict(x=array([]), y=array([]), type="Payoff"), self._main)
+        _decay_layout = self._decay_layout()
         self._set_table()
 
         _main_layout = QHBoxLayout(self._main)
@@ -87,6 +113,7 @@ class ApplicationWindow(QMainWindow):
         _vbox.setSpacing(0)
         _vbox.addWidget(self._plot)
         # _vbox.addWidget(self._plot.tool_bar())
+        _vbox.addLayout(_decay_layout)
 
         _sub_vbox = QVBoxLayout()
         _sub_vbox.setContentsMargins(0, 8, 0, 0)
@@ -107,25 +134,27 @@ class ApplicationWindow(QMainWindow):
 
     def _load(self):
         _file_path, _file_type = QFileDialog.getOpenFileName(
-            self, "Load Portfolio", self._last_path, "JSON Files (*.json)")
+            self, "Load Portfolio", self._last_path, portfolio_filter)
         if not _file_path:
             return
 
-        with open(_file_path) as f:
-            _input_data = loads(f.read())
+        try:
+            if _file_path.endswith(book_suffix):
+                _records, _env, _curves, _extra = load_book(_file_path)
+            else:
+                _records, _extra, _env = self._read_json(_file_path)
+        except (ValueError, KeyError, OSError, struct_error) as e:
+            QMessageBox.warning(self, "Load Portfolio", "Invalid data in {}\nError Message:{}".format(
+                _file_path, str(e)))
+            return
+        if _records is None:
+            return
         self._last_path = _file_path
 
-        _raw_data = _input_data.get('data')
-        _env = _input_data.get('env')
-
-        if _raw_data and _env:
+        if len(_records) and _env:
             self.env_data = _env
             try:
-                while self._table.rowCount():
-                    self._table.removeRow(0)
-
-                for _row in _raw_data:
-                    self._add(_row)
+                self._table.load(_records, _extra)
 
             except Exception as e:
                 QMessageBox.warning(self, "Load Portfolio", "Invalid data in {}\nError Message:{}".format(
@@ -134,18 +163,43 @@ class ApplicationWindow(QMainWindow):
         else:
             QMessageBox.warning(self, "Load Portfolio", "No data found in {}".format(_file_path))
 
+    def _read_json(self, file_path_):
+        """stream legs of json portfolio into leg records with progress, invalid legs are reported and skipped"""
+        _reader = JsonPortfolioReader(file_path_)
+        _builder = BookBuilder()
+        _progress = QProgressDialog("Loading {}".format(file_path_), "Cancel", 0, progress_scale, self)
+        _progress.setWindowTitle("Load Portfolio")
+        _progress.setWindowModality(Qt.WindowModal)
+        for _leg in _reader.legs():
+            _builder.add(_leg)
+            if not len(_builder.records()) % progress_batch:
+                _progress.setValue(int(_reader.progress() * progress_scale))
+                if _progress.wasCanceled():
+                    return None, None, None
+        _progress.setValue(progress_scale)
+
+        _errors = _builder.errors()
+        if _errors:
+            QMessageBox.warning(self, "Load Portfolio", "{} invalid legs skipped in {}\n{}".format(
+                len(_errors), file_path_, "\n".join(["row {}: {}".format(_row, _message)
+                                                     for _row, _message in _errors[:error_preview]])))
+        return _builder.records(), _builder.extra(), _reader.header.get('env')
+
     def _save(self):
         _raw_data = self._collect()
         _output = dict(data=_raw_data, env=self.env_data)
 
         if _raw_data:
             _file_path, _file_type = QFileDialog.getSaveFileName(
-                self, "Save Portfolio", self._last_path, "JSON Files (*.json)")
+                self, "Save Portfolio", self._last_path, portfolio_filter)
             if not _file_path:
                 return
 
-            with open(_file_path, 'w') as f:
-                f.write(dumps(_output, indent=4))
+            if _file_path.endswith(book_suffix):
+                save_book(_file_path, _raw_data, self.env_data)
+            else:
+                with open(_file_path, 'w') as f:
+                    f.write(dumps(_output, indent=4))
             self._last_path = _file_path
 
     def _export(self):
@@ -159,6 +213,9 @@ class ApplicationWindow(QMainWindow):
     def _pricing_env(self):
         self._env_box = PricingEnv(self)
 
+    def _clear_cache(self):
+        self._cache.clear()
+
     def _about(self):
         QMessageBox.about(self, "About", __doc__)
 
@@ -185,6 +242,8 @@ class ApplicationWindow(QMainWindow):
 
         _config = QMenu("&Config", self)
         _config.addAction("&Pricing Env", self._pricing_env, Qt.CTRL + Qt.Key_P)
+        _config.addAction("&Clear Cache", self._clear_cache)
+        _config.addAction("&Hedge", self._hedge)
         self._menu.addMenu(_config)
 
         _help = QMenu("&Help", self)
@@ -207,6 +266,10 @@ class ApplicationWindow(QMainWindow):
         _delete_btn.clicked.connect(self._delete)
         _hbox.addWidget(_delete_btn)
 
+        _price_btn = QPushButton("Price All")
+        _price_btn.clicked.connect(self._price_all)
+        _hbox.addWidget(_price_btn)
+
         return _hbox
 
     def _plot_btn_layout(self, btn_group_):
@@ -217,6 +280,97 @@ class ApplicationWindow(QMainWindow):
             _hbox.addWidget(_plot_btn)
         return _hbox
 
+    def _decay_layout(self):
+        _hbox = QHBoxLayout()
+        _hbox.setContentsMargins(0, 8, 0, 0)
+        _hbox.addWidget(QLabel("Time Elapsed:"))
+        self._decay = QSlider(Qt.Horizontal)
+        self._decay.setRange(0, decay_frames - 1)
+        self._decay.setEnabled(False)
+        self._decay.valueChanged.connect(self._on_decay)
+        _hbox.addWidget(self._decay)
+        self._decay_label = QLabel(self._elapsed_text(0))
+        _hbox.addWidget(self._decay_label)
+        return _hbox
+
+    @staticmethod
+    def _elapsed_text(elapsed_):
+        return "{:.2f} Y".format(elapsed_)
+
+    def _cube_key(self):
+        return DiskCache.key(self._table.revision(), self.env_data)
+
+    def _decay_cube(self):
+        """spot x elapsed time cube of engine curves, built once until table or pricing env changes"""
+        _key = self._cube_key()
+        if self._cube is None or self._cube[0] != _key:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                _cube = self._prepare_data().gen_decay_cube(full_=True, cache_=self._cache)
+            finally:
+                QApplication.restoreOverrideCursor()
+            self._cube = (_key, _cube)
+            # frames of aged portfolios are fewer, slider follows the cube
+            self._decay.blockSignals(True)
+            self._decay.setRange(0, _cube['elapsed'].size - 1)
+            self._decay.blockSignals(False)
+        return self._cube[1]
+
+    def _on_decay(self, frame_):
+        """show current curve after elapsed time of slider, every frame is read from the cube without evaluation"""
+        if self._curve_type not in MC_warning_curve:
+            return
+        if not frame_ and (self._cube is None or self._cube[0] != self._cube_key()):
+            self._decay_label.setText(self._elapsed_text(0))
+            self._plot_impl(self._curve_type)
+            return
+        try:
+            _cube = self._decay_cube()
+            if self._curve_type not in _cube['curves']:
+                self._portfolio.check_price(full_=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Evaluation Curve", "An error occurred while generating curve: {}".format(str(e)))
+            return
+        _frame = min(frame_, _cube['elapsed'].size - 1)
+        _lines = _cube['curves'][self._curve_type]
+        _x_ref, _y_ref = plot_reference(self._portfolio, self._curve_type)
+        self._decay_label.setText(self._elapsed_text(_cube['elapsed'][_frame]))
+        self._plot.update_figure(dict(x=_cube['x'], y=_lines[_frame], type=self._curve_type, x_ref=_x_ref,
+                                      y_ref=_y_ref, y_lim=(float(_lines.min()), float(_lines.max()))))
+
+    def _hedge(self):
+        """
+        delta/gamma hedge of portfolio over the plotting range with listed strikes of portfolio maturities
+        hedge legs are added to table after confirmation, premiums are priced by current engine
+        """
+        _portfolio = self._prepare_data()
+        _mkt, _engine, _rounding = parse_env(self.env_data)
+        _solver = HedgeSolver(_portfolio)
+        _strikes = _portfolio.x_range(step_=hedge_strike_step)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            _candidates = _solver.listed(_strikes[_strikes > 0], _portfolio.maturities())
+            _fit = _solver.run(_candidates, max_legs_=hedge_max_legs)
+            _legs = _solver.hedge_legs(_candidates, _fit['units'])
+            _prices = Portfolio.price_legs([Instrument.get_inst(_leg) for _leg in _legs], _mkt, _engine)
+        except ValueError as e:
+            QMessageBox.warning(self, "Hedge", "An error occurred while hedging: {}".format(str(e)))
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        if not _legs:
+            QMessageBox.information(self, "Hedge", "No hedge leg reduces delta and gamma of portfolio.")
+            return
+        for _leg, _price in zip(_legs, _prices):
+            if not isnan(_price):
+                _leg[InstParam.InstCost.value] = round(float(_price), _rounding)
+        _summary = "\n".join(["RMS {}: {:.6g} -> {:.6g}".format(_measure.capitalize(), *_value)
+                              for _measure, _value in _fit['residual'].items()])
+        if QMessageBox.question(
+                self, "Hedge", "{} hedge legs found over spots {:g} to {:g}\n{}\nAdd them to portfolio?".format(
+                    len(_legs), _fit['spots'][0], _fit['spots'][-1], _summary)) == QMessageBox.Yes:
+            self._table.add_rows(_legs)
+
     def _set_table(self):
         self._table = InstTable(self)
         self._add()
@@ -235,15 +389,21 @@ class ApplicationWindow(QMainWindow):
     def _delete(self):
         self._table.delete_row()
 
+    def _price_all(self):
+        self._table.price_all()
+
     def _collect(self):
         return self._table.collect()
 
     def _prepare_data(self):
+        # instruments are cached by table, portfolio is compiled again only if any row changed since
+        if self._portfolio is None or self._portfolio_revision != self._table.revision():
+            self._portfolio = Portfolio(self._table.instruments())
+            self._portfolio_revision = self._table.revision()
         _raw_data = self._table.collect()
-        _inst = [Instrument.get_inst(_data) for _data in _raw_data] if _raw_data else []
         _inst_show = [Instrument.get_inst(_data)
                       for _data in filter(lambda x: x[PlotParam.Show.value], _raw_data)] if _raw_data else []
-        _portfolio = Portfolio(_inst)
+        _portfolio = self._portfolio
         _mkt, _engine, _rounding = parse_env(self.env_data)
         _portfolio.set_mkt(_mkt)
         _portfolio.set_engine(_engine)
@@ -266,6 +426,11 @@ class ApplicationWindow(QMainWindow):
         self._plot_impl(CurveType.Delta.value)
 
     def _plot_impl(self, type_):
+        self._curve_type = type_
+        self._decay.setEnabled(type_ in MC_warning_curve)
+        if type_ in MC_warning_curve and self._decay.value():
+            self._on_decay(self._decay.value())
+            return
         _portfolio = self._prepare_data()
         if _portfolio.engine['engine'] == EngineMethod.MC.value and type_ in MC_warning_curve:
             if QMessageBox.question(
@@ -273,9 +438,20 @@ class ApplicationWindow(QMainWindow):
                     "Using Monte-Carlo to generate Evaluation Curve might be extremely time consuming. "
                     "Are you sure to continue?") == QMessageBox.No:
                 return
-        _x, _y = _portfolio.gen_curve(type_, full_=True)
-        _x_ref = 0 if type_ == CurveType.PnL.value else 100 if _portfolio.has_stock() else 0
-        self._plot.update_figure(dict(x=_x, y=_y, type=type_, x_ref=_x_ref, y_ref=_portfolio.center()))
+        try:
+            if type_ in MC_warning_curve:
+                # engine curves are generated and cached together, so switching between them costs nothing
+                _curves = _portfolio.gen_all_curves(full_=True, cache_=self._cache)
+                if type_ not in _curves:
+                    _portfolio.check_price(full_=True)
+                _x, _y = _curves[type_]
+            else:
+                _x, _y = _portfolio.gen_curve(type_, full_=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Evaluation Curve", "An error occurred while generating curve: {}".format(str(e)))
+            return
+        _x_ref, _y_ref = plot_reference(_portfolio, type_)
+        self._plot.update_figure(dict(x=_x, y=_y, type=type_, x_ref=_x_ref, y_ref=_y_ref))
 
     def _test(self):
         pass
@@ -2,12 +2,13 @@
 """pricing env dialog"""
 
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QButtonGroup, QDialog, QDialogButtonBox, QHBoxLayout, QLabel, QVBoxLayout, QLineEdit
+from PyQt5.QtWidgets import QButtonGroup, QDialog, QDialogButtonBox, QHBoxLayout, QLabel, QVBoxLayout, QLineEdit, \
+    QWidget
 from copy import deepcopy
 from enum import Enum
 from gui.custom import CustomRadioButton
 from instrument.default_param import env_default_param
-from instrument.env_param import EngineMethod, EngineParam, EnvParam, RateFormat
+from instrument.env_param import EngineMethod, EngineParam, EnvParam, LatticeTree, RateFormat, heston_engine, mc_engine
 from utils import float_int
 
 
@@ -37,8 +38,38 @@ env_param = [
      [_r.value for _r in RateFormat], None, None),
     (FieldType.Radio.value, EnvParam.PricingEngine.value, "Pricing Engine:", fixed_width,
      [_e.value for _e in EngineMethod], None, None),
+    (FieldType.Number.value, EnvParam.HestonKappa.value, "Heston Mean Reversion:", fixed_width,
+     None, EnvParam.PricingEngine.value, heston_engine + [EngineMethod.Fourier.value]),
+    (FieldType.Number.value, EnvParam.HestonTheta.value, "Heston Long-Run Vol (%):", fixed_width,
+     None, EnvParam.PricingEngine.value, heston_engine + [EngineMethod.Fourier.value]),
+    (FieldType.Number.value, EnvParam.HestonVolOfVol.value, "Heston Vol of Variance (%):", fixed_width,
+     None, EnvParam.PricingEngine.value, heston_engine + [EngineMethod.Fourier.value]),
+    (FieldType.Number.value, EnvParam.HestonCorr.value, "Heston Correlation:", fixed_width,
+     None, EnvParam.PricingEngine.value, heston_engine + [EngineMethod.Fourier.value]),
     (FieldType.Number.value, EngineParam.MCIteration.value, "Monte-Carlo Iterations:", fixed_width,
-     None, EnvParam.PricingEngine.value, EngineMethod.MC.value),
+     None, EnvParam.PricingEngine.value, mc_engine),
+    (FieldType.Number.value, EngineParam.MCPathStep.value, "Monte-Carlo Path Steps:", fixed_width,
+     None, EnvParam.PricingEngine.value, mc_engine),
+    (FieldType.Number.value, EngineParam.MCSeed.value, "Monte-Carlo Seed:", fixed_width,
+     None, EnvParam.PricingEngine.value, mc_engine),
+    (FieldType.Number.value, EngineParam.MCTargetError.value, "Monte-Carlo Target Error:", fixed_width,
+     None, EnvParam.PricingEngine.value, mc_engine),
+    (FieldType.Number.value, EngineParam.MCRelTolerance.value, "Monte-Carlo Rel Tolerance:", fixed_width,
+     None, EnvParam.PricingEngine.value, mc_engine),
+    (FieldType.Number.value, EngineParam.LatticeStep.value, "Lattice Steps:", fixed_width,
+     None, EnvParam.PricingEngine.value, EngineMethod.Lattice.value),
+    (FieldType.Radio.value, EngineParam.LatticeTree.value, "Lattice Tree:", fixed_width,
+     [_t.value for _t in LatticeTree], EnvParam.PricingEngine.value, EngineMethod.Lattice.value),
+    (FieldType.Number.value, EngineParam.PDEGrid.value, "PDE Spot Nodes:", fixed_width,
+     None, EnvParam.PricingEngine.value, EngineMethod.PDE.value),
+    (FieldType.Number.value, EngineParam.PDEStep.value, "PDE Time Steps:", fixed_width,
+     None, EnvParam.PricingEngine.value, EngineMethod.PDE.value),
+    (FieldType.Number.value, EngineParam.HestonNodes.value, "Heston Quadrature Nodes:", fixed_width,
+     None, EnvParam.PricingEngine.value, EngineMethod.Heston.value),
+    (FieldType.Number.value, EngineParam.FourierGrid.value, "Fourier Grid Points:", fixed_width,
+     None, EnvParam.PricingEngine.value, EngineMethod.Fourier.value),
+    (FieldType.String.value, EngineParam.FourierModel.value, "Fourier Model:", fixed_width,
+     None, EnvParam.PricingEngine.value, EngineMethod.Fourier.value),
 ]
 
 
@@ -46,6 +77,7 @@ class PricingEnv(QDialog):
     """
     dialog for editing pricing environment parameters
     included paramters should be all defined above - env_param
+    a dependent parameter is enabled while its engine, or any of its engines if a list is given, is chosen
     """
     def __init__(self, parent_, *args, **kwargs):
         super(PricingEnv, self).__init__(*args, **kwargs)
@@ -78,35 +110,23 @@ class PricingEnv(QDialog):
             _hbox.addWidget(_label)
             _wgt = QLineEdit(self)
             _wgt.setAlignment(Qt.AlignRight)
-            _default = self._parent.env_data.get(param_[1])
+            _default = self._parent.env_data.get(param_[1], env_default_param.get(param_[1]))
             if _default is not None:
                 _wgt.setText(str(_default))
             self.__setattr__(param_[1], _wgt)
             _hbox.addWidget(_wgt)
             self._main_layout.addLayout(_hbox)
-
-            if param_[5] is not None:
-                try:
-                    _grand_parent = self.__getattribute__(param_[5])
-                    for _btn in _grand_parent.buttons():
-                        _btn.changed.connect(self._radio_connection)
-                        if not hasattr(_btn, 'param'):
-                            _btn.__setattr__('param', [])
-
-                    _parent = self.__getattribute__(param_[6])
-                    _parent.param.append(param_[1])
-                    _parent.__setattr__(param_[1], _wgt)
-                    _wgt.setEnabled(_parent.isChecked())
-
-                except AttributeError as e:
-                    raise Exception(str(e))
+            self._add_dependency(param_, _wgt)
 
         elif param_[0] == FieldType.Radio.value:
             _vbox = QVBoxLayout()
             _label = QLabel(param_[2])
             _label.setFixedWidth(param_[3])
             _vbox.addWidget(_label)
-            _hbox = QHBoxLayout()
+            # buttons share one container, so a dependent radio is enabled as a whole
+            _box = QWidget(self)
+            _hbox = QHBoxLayout(_box)
+            _hbox.setContentsMargins(0, 0, 0, 0)
             _btn_group = QButtonGroup()
             self.__setattr__(param_[1], _btn_group)
             _range = param_[4]
@@ -115,19 +135,42 @@ class PricingEnv(QDialog):
                 self.__setattr__(_item, _wgt)
                 _hbox.addWidget(_wgt)
                 _btn_group.addButton(_wgt, _idx)
-            _vbox.addLayout(_hbox)
+            _vbox.addWidget(_box)
             self._main_layout.addLayout(_vbox)
-            _default = self._parent.env_data.get(param_[1])
+            _default = self._parent.env_data.get(param_[1], env_default_param.get(param_[1]))
             self.__getattribute__(_default).setChecked(True)
+            self._add_dependency(param_, _box)
+
+    def _add_dependency(self, param_, wgt_):
+        """enable widget of a dependent parameter only while one of its engines is chosen"""
+        if param_[5] is None:
+            return
+        try:
+            _grand_parent = self.__getattribute__(param_[5])
+            for _btn in _grand_parent.buttons():
+                _btn.changed.connect(self._radio_connection)
+                if not hasattr(_btn, 'param'):
+                    _btn.__setattr__('param', [])
+
+            wgt_.__setattr__('engines', param_[6] if isinstance(param_[6], list) else [param_[6]])
+            for _engine in wgt_.engines:
+                _parent = self.__getattribute__(_engine)
+                _parent.param.append(param_[1])
+                _parent.__setattr__(param_[1], wgt_)
+            wgt_.setEnabled(any([self.__getattribute__(_e).isChecked() for _e in wgt_.engines]))
+
+        except AttributeError as e:
+            raise Exception(str(e))
 
     def _radio_connection(self, wgt_name_):
         _wgt = self.__getattribute__(wgt_name_)
         for _param in _wgt.param:
             _child = _wgt.__getattribute__(_param)
-            _child.setEnabled(_wgt.isChecked())
+            _child.setEnabled(any([self.__getattribute__(_e).isChecked() for _e in _child.engines]))
 
     def _on_ok(self):
-        _env = dict()
+        # market data not edited here, such as vol surface, is kept
+        _env = dict(self._parent.env_data)
         for _param in env_param:
             _env[_param[1]] = self._get_wgt_value(_param[1], _param[0], _param[4])
 
@@ -141,7 +184,7 @@ class PricingEnv(QDialog):
     def _set_wgt_value(self, wgt_name_, wgt_type_, value_):
         _wgt = self.__getattribute__(wgt_name_)
         if wgt_type_ in [FieldType.String.value, FieldType.Number.value]:
-            _wgt.setText(str(value_))
+            _wgt.setText('' if value_ is None else str(value_))
         elif wgt_type_ == FieldType.Radio.value:
             for _btn in _wgt.buttons():
                 if _btn.name() == value_:
@@ -163,10 +206,14 @@ class PricingEnv(QDialog):
 
 
 def parse_env(env_param_):
-    """parse environment data into market, engine, and rounding"""
+    """parse environment data into market, engine, and rounding, market parameters missing are defaulted"""
     _mkt = deepcopy(env_param_)
+    for _param in EnvParam:
+        if _param.value not in _mkt and _param.value in env_default_param:
+            _mkt[_param.value] = env_default_param[_param.value]
     _engine = dict(engine=_mkt.pop(EnvParam.PricingEngine.value), param={})
-    for _engine_param in [_param for _param in env_param if _param[5] == EnvParam.PricingEngine.value]:
-        _engine['param'][_engine_param[1]] = _mkt.pop(_engine_param[1])
+    for _engine_param in [_param for _param in env_param if _param[5] == EnvParam.PricingEngine.value
+                          and _param[1] in [_e.value for _e in EngineParam]]:
+        _engine['param'][_engine_param[1]] = _mkt.pop(_engine_param[1], env_default_param.get(_engine_param[1]))
     _rounding = _mkt.pop(EnvParam.CostRounding.value)
     return _mkt, _engine, _rounding
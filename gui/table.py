@@ -1,15 +1,20 @@
 # coding=utf-8
 """instrument table template"""
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QAbstractItemView, QMessageBox, QTableWidgetItem
+from PyQt5.QtCore import QAbstractTableModel, QEvent, QModelIndex, QThread, Qt, pyqtSignal
+from PyQt5.QtGui import QCursor
+from PyQt5.QtWidgets import QAbstractItemView, QApplication, QComboBox, QHeaderView, QMessageBox, QStyle
+from PyQt5.QtWidgets import QProgressDialog, QStyleOptionButton, QStyledItemDelegate, QToolTip
 from enum import Enum
-from gui.custom import CustomCheckBox, CustomComboBox, CustomTableWidget
-from gui.plot import PlotParam
+from gui.custom import CustomTableView
+from gui.figure import PlotParam
 from gui.pricing_env import parse_env
-from instrument import InstType, InstParam, Instrument, option_type
+from instrument import ExerciseType, InstType, InstParam, Instrument, option_type, vanilla_type
 from instrument.default_param import default_param, default_type
 from instrument.env_param import EnvParam
+from instrument.portfolio import Portfolio
+from instrument.storage import book_col, code_index, from_records, leg_dtype, no_code, to_record
+from numpy import array, concatenate, delete, flatnonzero, int64, isin, isnan, setdiff1d, zeros
 from utils import float_int
 
 
@@ -20,6 +25,7 @@ class TableCol(Enum):
     Maturity = 'Maturity'
     Qty = 'Qty'
     Premium = 'Premium'
+    Exercise = 'Exercise'
     Show = 'Show'
 
 
@@ -34,205 +40,542 @@ class ColType(Enum):
 table_col = [
     (TableCol.Type.value, ColType.Other.value, "Type", InstParam.InstType.value, 80),
     (TableCol.Strike.value, ColType.Number.value, "Strike", InstParam.OptionStrike.value, 50),
+    (TableCol.Maturity.value, ColType.Number.value, "Maturity", InstParam.OptionMaturity.value, 60),
     (TableCol.Qty.value, ColType.Number.value, "Qty", InstParam.InstUnit.value, 50),
     (TableCol.Premium.value, ColType.Number.value, "Premium", InstParam.InstCost.value, 60),
+    (TableCol.Exercise.value, ColType.Other.value, "Exercise", InstParam.OptionExercise.value, 80),
     (TableCol.Show.value, ColType.Boolean.value, "", PlotParam.Show.value, 30),
 ]
 
+combo_col = {
+    TableCol.Type.value: vanilla_type + [InstType.Stock.value],
+    TableCol.Exercise.value: [ExerciseType.European.value, ExerciseType.American.value],
+}
 
-class InstTable(CustomTableWidget):
+# instrument parameter to (leg record column, code table, code index) of instrument.storage
+record_col = {_col[2]: (_col[0], _col[3], _index) for _col, _index in zip(book_col, code_index)}
+env_default = [EnvParam.UdSpotForPrice.value, EnvParam.PortMaturity.value]
+row_height = 24
+
+
+class InstModel(QAbstractTableModel):
+    """
+    instrument table model backed by leg records (instrument.storage.leg_dtype)
+    no widget is created per row, rows are inserted and replaced in bulk
+    parameters not shown in table (e.g. bermudan exercise times) are kept as well
+    every edit is validated and stamps the row with a new revision, so consumers can ask which rows changed
+    leg dicts and instruments are cached per row and only rebuilt for changed rows
+    """
+    def __init__(self, env_, parent_=None):
+        """
+        :param env_: callable returning current env data, used for env-dependent defaults
+        """
+        super(InstModel, self).__init__(parent_)
+        self._env = env_
+        self._records = array([], dtype=leg_dtype)
+        self._extra = dict()
+        self._revision = 0
+        self._reset_revision = 0
+        self._row_revision = zeros(0, dtype=int64)
+        self._legs = []
+        self._inst = []
+        self._stale_leg = set()
+        self._stale_inst = set()
+        self._maturity = None
+
+    def rowCount(self, parent_=QModelIndex()):
+        """number of legs"""
+        return 0 if parent_.isValid() else len(self._records)
+
+    def columnCount(self, parent_=QModelIndex()):
+        """number of table columns"""
+        return 0 if parent_.isValid() else len(table_col)
+
+    def headerData(self, section_, orientation_, role_=Qt.DisplayRole):
+        """column header text and row number"""
+        if role_ != Qt.DisplayRole:
+            return None
+        return table_col[section_][2] if orientation_ == Qt.Horizontal else str(section_ + 1)
+
+    def data(self, index_, role_=Qt.DisplayRole):
+        """cell text, check state and alignment"""
+        if not index_.isValid():
+            return None
+        _col = table_col[index_.column()]
+        _name, _code, _index = record_col[_col[3]]
+        _value = self._records[_name][index_.row()]
+        if role_ == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if _col[1] == ColType.Boolean.value:
+            return (Qt.Checked if _value == _index[True] else Qt.Unchecked) if role_ == Qt.CheckStateRole else None
+        if role_ in [Qt.DisplayRole, Qt.EditRole]:
+            if _code is not None:
+                return '' if _value == no_code else _code[_value]
+            return '-' if isnan(_value) else str(float_int(_value))
+        return None
+
+    def flags(self, index_):
+        """parameters not defined for the instrument type are read only"""
+        if not index_.isValid():
+            return Qt.NoItemFlags
+        _col = table_col[index_.column()]
+        if _col[0] != TableCol.Type.value and _col[3] not in default_param[self.row_type(index_.row())]:
+            return Qt.ItemIsSelectable
+        if _col[1] == ColType.Boolean.value:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def setData(self, index_, value_, role_=Qt.EditRole):
+        """
+        validate and write one cell into leg records, invalid input is rejected
+        changing type resets the leg to defaults of the new type
+        """
+        if not index_.isValid() or not self.flags(index_) & Qt.ItemIsEnabled:
+            return False
+        _row = index_.row()
+        _col = table_col[index_.column()]
+        _name, _code, _index = record_col[_col[3]]
+
+        if _col[1] == ColType.Boolean.value:
+            if role_ != Qt.CheckStateRole:
+                return False
+            _value = _index[value_ == Qt.Checked]
+        elif role_ != Qt.EditRole:
+            return False
+        elif _col[0] == TableCol.Type.value:
+            if value_ not in combo_col[_col[0]]:
+                return False
+            if value_ != self.row_type(_row):
+                self._records[_row] = self.default_record(value_)
+                self._extra.pop(_row, None)
+                self._touch([_row])
+                self.dataChanged.emit(self.index(_row, 0), self.index(_row, len(table_col) - 1))
+            return True
+        elif _code is not None:
+            if value_ not in _index:
+                return False
+            _value = _index[value_]
+        else:
+            _value = float_int(str(value_))
+            if _value is None:
+                return False
+
+        _old, _old_revision = self._records[_name][_row], self._row_revision[_row]
+        if _old == _value:
+            return True
+        self._records[_name][_row] = _value
+        self._touch([_row])
+        try:
+            self.instrument(_row)
+        except ValueError:
+            self._records[_name][_row] = _old
+            self._touch([_row])
+            self._row_revision[_row] = _old_revision
+            return False
+        self.dataChanged.emit(index_, index_, [role_])
+        return True
+
+    def type_mask(self, types_):
+        """if each row is of given instrument types"""
+        _name, _code, _index = record_col[InstParam.InstType.value]
+        return isin(self._records[_name], [_index[_type] for _type in types_ if _type in _index])
+
+    def row_type(self, row_):
+        """instrument type of a leg"""
+        _name, _code, _index = record_col[InstParam.InstType.value]
+        return _code[self._records[_name][row_]]
+
+    def default_record(self, type_, data_=None):
+        """leg record of given type, parameters missing in data are filled with defaults of the type"""
+        _env = self._env()
+        _leg = {_param: _env.get(_value, '-') if _value in env_default else _value
+                for _param, _value in default_param[type_].items()}
+        _leg.update(data_ or {})
+        _leg[InstParam.InstType.value] = type_
+        return to_record(_leg)
+
+    def records(self):
+        """leg records of all rows, not to be modified in place"""
+        return self._records
+
+    def extra(self):
+        """parameters of legs not held in leg records"""
+        return self._extra
+
+    def append(self, records_, extra_=None):
+        """append leg records as new rows in one insertion"""
+        if not len(records_):
+            return
+        _start = len(self._records)
+        self.beginInsertRows(QModelIndex(), _start, _start + len(records_) - 1)
+        self._records = concatenate([self._records, records_])
+        self._extra.update({_start + _row: _value for _row, _value in (extra_ or {}).items()})
+        self._row_revision = concatenate([self._row_revision, zeros(len(records_), dtype=int64)])
+        self._legs += [None] * len(records_)
+        self._inst += [None] * len(records_)
+        self._touch(range(_start, len(self._records)))
+        self.endInsertRows()
+
+    def remove(self, row_):
+        """remove one row"""
+        self.beginRemoveRows(QModelIndex(), row_, row_)
+        self._records = delete(self._records, row_)
+        self._extra = {(_row - 1 if _row > row_ else _row): _value
+                       for _row, _value in self._extra.items() if _row != row_}
+        self._row_revision = delete(self._row_revision, row_)
+        del self._legs[row_]
+        del self._inst[row_]
+        self._stale_leg = set([_row - 1 if _row > row_ else _row for _row in self._stale_leg if _row != row_])
+        self._stale_inst = set([_row - 1 if _row > row_ else _row for _row in self._stale_inst if _row != row_])
+        self._revision += 1
+        self._reset_revision = self._revision
+        self.endRemoveRows()
+
+    def load(self, records_, extra_=None):
+        """
+        replace all rows with leg records in one reset, missing parameters are filled with defaults of each type
+        leg records are copied, so memory-mapped records of a book can be given
+        """
+        _records = array(records_, dtype=leg_dtype)
+        _name, _code, _index = record_col[InstParam.InstType.value]
+        _types = combo_col[TableCol.Type.value]
+        _invalid = ~isin(_records[_name], [_index[_type] for _type in _types])
+        if _invalid.any():
+            raise ValueError("{} legs of type not supported by table, first at row {}".format(
+                _invalid.sum(), _invalid.argmax()))
+
+        for _type in _types:
+            _mask = _records[_name] == _index[_type]
+            if not _mask.any():
+                continue
+            _default = array(self.default_record(_type), dtype=leg_dtype)
+            for _column in leg_dtype.names:
+                _missing = _mask & (isnan(_records[_column]) if _records[_column].dtype.kind == 'f'
+                                    else _records[_column] == no_code)
+                _records[_column][_missing] = _default[_column]
+
+        self.beginResetModel()
+        self._records = _records
+        self._extra = dict(extra_ or {})
+        self._row_revision = zeros(len(_records), dtype=int64)
+        self._legs = [None] * len(_records)
+        self._inst = [None] * len(_records)
+        self._touch(range(len(_records)))
+        self._reset_revision = self._revision
+        self.endResetModel()
+
+    def set_column(self, column_, check_state_):
+        """set check state of a boolean column on every row where it is editable, in one update"""
+        _col = table_col[column_]
+        _name, _code, _index = record_col[_col[3]]
+        _type_name, _type_code, _type_index = record_col[InstParam.InstType.value]
+        _editable = isin(self._records[_type_name],
+                         [_type_index[_type] for _type in combo_col[TableCol.Type.value]
+                          if _col[3] in default_param[_type]])
+        self._records[_name][_editable] = _index[check_state_ == Qt.Checked]
+        self._touch(flatnonzero(_editable))
+        self.dataChanged.emit(self.index(0, column_), self.index(len(self._records) - 1, column_),
+                              [Qt.CheckStateRole])
+
+    def set_prices(self, rows_, prices_):
+        """write premium of many rows in one update"""
+        if not len(rows_):
+            return
+        self._records[record_col[InstParam.InstCost.value][0]][rows_] = prices_
+        self._touch(rows_)
+        _col = [_idx for _idx, _col in enumerate(table_col) if _col[0] == TableCol.Premium.value][0]
+        self.dataChanged.emit(self.index(min(rows_), _col), self.index(max(rows_), _col), [Qt.DisplayRole])
+
+    def revision(self):
+        """revision of the latest change, increases with every edit"""
+        return self._revision
+
+    def dirty(self, since_):
+        """
+        rows changed after given revision
+        :return: sorted row index array, or None if rows were removed or replaced since, so every row is changed
+        """
+        if since_ < self._reset_revision:
+            return None
+        return flatnonzero(self._row_revision > since_)
+
+    def collect(self, row_=None):
+        """
+        leg dicts of all rows or a given row, option maturity defaults to portfolio maturity
+        only changed rows are converted from leg records, returned dicts are shared and not to be modified
+        """
+        _maturity = self._env()[EnvParam.PortMaturity.value]
+        if _maturity != self._maturity:
+            _missing = isnan(self._records[record_col[InstParam.OptionMaturity.value][0]]) & \
+                self.type_mask(option_type)
+            self._stale_leg.update(flatnonzero(_missing).tolist())
+            self._stale_inst.update(flatnonzero(_missing).tolist())
+            self._maturity = _maturity
+
+        _rows = sorted(self._stale_leg) if row_ is None else [row_] if row_ in self._stale_leg else []
+        _extra = {_idx: self._extra[_row] for _idx, _row in enumerate(_rows) if _row in self._extra}
+        for _row, _data_dict in zip(_rows, from_records(self._records[_rows], _extra)):
+            if _data_dict.get(InstParam.InstType.value) in option_type:
+                _data_dict.setdefault(InstParam.OptionMaturity.value, _maturity)
+            self._legs[_row] = _data_dict
+        self._stale_leg.difference_update(_rows)
+        return list(self._legs) if row_ is None else [self._legs[row_]]
+
+    def instrument(self, row_):
+        """instrument of a row, raise ValueError if the leg is invalid"""
+        if row_ in self._stale_inst or self._inst[row_] is None:
+            self._inst[row_] = Instrument.get_inst(self.collect(row_)[0])
+            self._stale_inst.discard(row_)
+        return self._inst[row_]
+
+    def instruments(self):
+        """instruments of all rows, only changed rows are rebuilt"""
+        _legs = self.collect()
+        for _row in sorted(self._stale_inst):
+            self._inst[_row] = Instrument.get_inst(_legs[_row])
+        self._stale_inst.clear()
+        return list(self._inst)
+
+    def _touch(self, rows_):
+        self._revision += 1
+        _rows = list(rows_)
+        self._row_revision[_rows] = self._revision
+        self._stale_leg.update(_rows)
+        self._stale_inst.update(_rows)
+
+
+class ComboDelegate(QStyledItemDelegate):
+    """combo box editor, only created while a cell is edited"""
+    def __init__(self, items_, parent_=None):
+        super(ComboDelegate, self).__init__(parent_)
+        self._items = items_
+
+    def createEditor(self, parent_, option_, index_):
+        """..."""
+        _editor = QComboBox(parent_)
+        _editor.addItems(self._items)
+        _editor.activated.connect(self._commit)
+        return _editor
+
+    def setEditorData(self, editor_, index_):
+        """..."""
+        editor_.setCurrentText(index_.data(Qt.EditRole))
+
+    def setModelData(self, editor_, model_, index_):
+        """..."""
+        model_.setData(index_, editor_.currentText(), Qt.EditRole)
+
+    def _commit(self):
+        _editor = self.sender()
+        self.commitData.emit(_editor)
+        self.closeEditor.emit(_editor)
+
+
+class CheckDelegate(QStyledItemDelegate):
+    """centered check box painted by delegate, toggled by mouse click"""
+    def paint(self, painter_, option_, index_):
+        """..."""
+        _style = option_.widget.style() if option_.widget else QApplication.style()
+        _style.drawPrimitive(QStyle.PE_PanelItemViewItem, option_, painter_, option_.widget)
+        _box = QStyleOptionButton()
+        _box.state = QStyle.State_On if index_.data(Qt.CheckStateRole) == Qt.Checked else QStyle.State_Off
+        if index_.flags() & Qt.ItemIsEnabled:
+            _box.state |= QStyle.State_Enabled
+        _size = _style.subElementRect(QStyle.SE_CheckBoxIndicator, _box, option_.widget).size()
+        _box.rect = QStyle.alignedRect(option_.direction, Qt.AlignCenter, _size, option_.rect)
+        _style.drawControl(QStyle.CE_CheckBox, _box, painter_, option_.widget)
+
+    def editorEvent(self, event_, model_, option_, index_):
+        """..."""
+        if not index_.flags() & Qt.ItemIsUserCheckable:
+            return False
+        if event_.type() == QEvent.MouseButtonDblClick:
+            return True
+        if event_.type() == QEvent.MouseButtonRelease and event_.button() == Qt.LeftButton:
+            _state = Qt.Unchecked if index_.data(Qt.CheckStateRole) == Qt.Checked else Qt.Checked
+            return model_.setData(index_, _state, Qt.CheckStateRole)
+        return False
+
+
+class PriceAllThread(QThread):
+    """price all instruments in background, emit unit prices (None if cancelled) and error message"""
+    priced = pyqtSignal(object, str)
+
+    def __init__(self, inst_list_, mkt_, engine_, parent_=None):
+        super(PriceAllThread, self).__init__(parent_)
+        self._inst_list = inst_list_
+        self._mkt = mkt_
+        self._engine = engine_
+        self._cancel = False
+
+    def cancel(self):
+        """stop pricing at next evaluation step"""
+        self._cancel = True
+
+    def run(self):
+        """..."""
+        try:
+            self.priced.emit(Portfolio.price_legs(self._inst_list, self._mkt, self._engine, lambda: self._cancel), '')
+        except ValueError as e:
+            self.priced.emit(None, str(e))
+
+
+class InstTable(CustomTableView):
     """
-    instrument table widget to edit instrument info
+    instrument table view to edit instrument info
     all table columns should be defined above - table_col
+    clicking header of a boolean column checks or unchecks the whole column
     """
-    _seq = 0
 
     def __init__(self, parent_, *args, **kwargs):
-        super(InstTable, self).__init__(0, len(table_col), *args, **kwargs)
+        super(InstTable, self).__init__(*args, **kwargs)
         self._parent = parent_
-        self.setHorizontalHeaderLabels([_col[2] for _col in table_col])
+        self._model = InstModel(lambda: self._parent.env_data, self)
+        self.setModel(self._model)
         for _idx, _col in enumerate(table_col):
             self.setColumnWidth(_idx, _col[4])
+            if _col[0] in combo_col:
+                self.setItemDelegateForColumn(_idx, ComboDelegate(combo_col[_col[0]], self))
+            elif _col[1] == ColType.Boolean.value:
+                self.setItemDelegateForColumn(_idx, CheckDelegate(self))
         self._col_width = sum([_col[4] for _col in table_col])
+        # fixed row height keeps scrolling independent of number of rows
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(row_height)
         self.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.clicked.connect(self._on_click)
+        self.horizontalHeader().sectionClicked.connect(self._on_header_click)
         self.rightClicked.connect(self._price)
+        self._thread = None
+        self._progress = None
 
     def col_width(self):
         """return width sum of all columns"""
         return self._col_width
 
+    def rowCount(self):
+        """number of instruments"""
+        return self._model.rowCount()
+
     def add_row(self, data_=None):
         """add a new instrument with given or default data"""
-        self.setRowCount(self.rowCount() + 1)
-        _id = self._inst_id()
         _type = data_.get(InstParam.InstType.value, default_type) if data_ else default_type
+        _extra = {0: {InstParam.OptionExerciseTimes.value: list(data_[InstParam.OptionExerciseTimes.value])}} \
+            if data_ and data_.get(InstParam.OptionExerciseTimes.value) else None
+        self._model.append(array([self._model.default_record(_type, data_)], dtype=leg_dtype), _extra)
 
-        for _idx, _col in enumerate(table_col):
-            if _col[1] in [ColType.String.value, ColType.Number.value]:
-                _default = default_param[_type].get(_col[3], '-')
-                if _default == EnvParam.UdSpotForPrice.value:
-                    _default = self._parent.env_data.get(EnvParam.UdSpotForPrice.value, '-')
-                _content = data_.get(_col[3], _default) if data_ else _default
-                _wgt = QTableWidgetItem(str(_content))
-                _wgt.setTextAlignment(Qt.AlignCenter)
-                self.setItem(self.rowCount() - 1, _idx, _wgt)
+    def add_rows(self, data_list_):
+        """add new instruments of given data in one insertion, e.g. legs of a hedge"""
+        self._model.append(array([self._model.default_record(_data.get(InstParam.InstType.value, default_type), _data)
+                                  for _data in data_list_], dtype=leg_dtype))
 
-            elif _col[1] == ColType.Boolean.value:
-                _default = default_param[_type].get(_col[3], False)
-                _content = data_.get(_col[3], _default) if data_ else _default
-                _wgt = QTableWidgetItem()
-                _wgt.setCheckState(Qt.Checked if _content else Qt.Unchecked)
-                self.setItem(self.rowCount() - 1, _idx, _wgt)
-
-            elif _col[1] == ColType.Other.value:
-                if _col[0] == TableCol.Type.value:
-                    _wgt_name = '{}_type'.format(_id)
-                    _wgt = QTableWidgetItem(_wgt_name)
-                    _wgt._wgt = CustomComboBox(wgt_name_=_wgt_name)
-                    for _inst_type in [_t.value for _t in InstType]:
-                        _wgt._wgt.addItem(_inst_type)
-                    _wgt._wgt.setCurrentText(_type)
-                    _wgt._wgt.setFixedWidth(_col[4])
-                    self.__setattr__(_wgt_name, _wgt._wgt)
-                    _wgt._wgt.changed.connect(self._set_default)
-                    _wgt.setTextAlignment(Qt.AlignCenter)
-                    self.setItem(self.rowCount() - 1, _idx, _wgt)
-                    self.setCellWidget(self.rowCount() - 1, _idx, _wgt._wgt)
-                else:
-                    raise ValueError("invalid table column '{}'".format(_col[0]))
-
-            else:
-                raise ValueError("invalid column type '{}'".format(_col[1]))
+    def load(self, records_, extra_=None):
+        """replace all instruments with leg records"""
+        self._model.load(records_, extra_)
 
     def copy_row(self):
         """copy an existing instrument and create a new one"""
-        self.add_row()
-        _row = self.currentRow()
-        _raw_data = self._collect_row(_row)
-
-        for _idx, _col in enumerate(table_col):
-            if _col[1] in [ColType.String.value, ColType.Number.value]:
-                self.item(self.rowCount() - 1, _idx).setText(str(_raw_data[_col[3]]))
-
-            elif _col[1] == ColType.Boolean.value:
-                self.item(self.rowCount() - 1, _idx).setCheckState(Qt.Checked if _raw_data[_col[3]] else Qt.Unchecked)
-
-            elif _col[1] == ColType.Other.value:
-                if _col[0] == TableCol.Type.value:
-                    self.__getattribute__(
-                        self.item(self.rowCount() - 1, _idx).text()).setCurrentText(_raw_data[_col[3]])
-                else:
-                    raise ValueError("invalid table column '{}'".format(_col[0]))
+        _row = self.currentIndex().row()
+        if _row < 0:
+            return
+        _extra = {0: self._model.extra()[_row]} if _row in self._model.extra() else None
+        self._model.append(self._model.records()[_row:_row + 1].copy(), _extra)
 
     def delete_row(self):
         """delete an instrument"""
         if self.rowCount() == 1:
             QMessageBox.information(self, "Warning", "Only one option left, cannot be deleted.")
         else:
-            _row = self.currentRow()
-            self.removeRow(_row)
+            _row = self.currentIndex().row()
+            if _row >= 0:
+                self._model.remove(_row)
 
     def collect(self):
         """collect all instruments data"""
-        return [self._collect_row_full(_row) for _row in range(self.rowCount())]
+        return self._model.collect()
 
-    def _collect_row_full(self, row_):
-        _data_dict = self._collect_row(row_)
-        _type = _data_dict.get(InstParam.InstType.value)
-        if _type in option_type:
-            _data_dict[InstParam.OptionMaturity.value] = self._parent.env_data[EnvParam.PortMaturity.value]
-        return _data_dict
+    def instruments(self):
+        """instruments of all rows"""
+        return self._model.instruments()
 
-    def _collect_row(self, row_):
-        _data_dict = dict()
-        for _idx, _col in enumerate(table_col):
-            if _col[1] == ColType.String.value:
-                _data = self.item(row_, _idx).text()
-                _data_dict[_col[3]] = _data
-            elif _col[1] == ColType.Number.value:
-                _data = float_int(self.item(row_, _idx).text())
-                _data_dict[_col[3]] = _data
-            elif _col[1] == ColType.Boolean.value:
-                _data = self.item(row_, _idx).checkState() == Qt.Checked
-                _data_dict[_col[3]] = _data
-            elif _col[1] == ColType.Other.value:
-                if _col[0] == TableCol.Type.value:
-                    _data = self.__getattribute__(self.item(row_, _idx).text()).currentText()
-                    _data_dict[_col[3]] = _data
-                else:
-                    raise ValueError("invalid table column '{}'".format(_col[0]))
-        return _data_dict
-
-    def _set_default(self, wgt_name_):
-        _type = None
-        for _row in range(self.rowCount()):
-            for _idx, _col in enumerate(table_col):
-                if _col[0] == TableCol.Type.value and self.item(_row, _idx).text() == wgt_name_:
-                    _type = self.__getattribute__(self.item(_row, _idx).text()).currentText()
-                    break
-
-            if _type:
-                for _idx, _col in enumerate(table_col):
-                    if _col[1] in [ColType.String.value, ColType.Number.value]:
-                        _default = default_param[_type].get(_col[3], '-')
-                        if _default == EnvParam.UdSpotForPrice.value:
-                            _default = self._parent.env_data.get(EnvParam.UdSpotForPrice.value, '-')
-                        self.item(_row, _idx).setText(str(_default))
-                        self.item(_row, _idx).setFlags(Qt.ItemIsEnabled | Qt.ItemIsEditable | Qt.ItemIsSelectable)
-                    elif _col[1] == ColType.Boolean.value:
-                        _default = default_param[_type].get(_col[3], False)
-                        self.item(_row, _idx).setCheckState(Qt.Checked if _default else Qt.Unchecked)
-                        self.item(_row, _idx).setFlags(Qt.ItemIsEnabled | Qt.ItemIsEditable | Qt.ItemIsSelectable |
-                                                       Qt.ItemIsUserCheckable)
-                    elif _col[1] == ColType.Other.value:
-                        pass
-
-                if _type == InstType.Stock.value:
-                    for _idx, _col in enumerate(table_col):
-                        if _col[3] in [InstParam.OptionStrike.value]:
-                            self.item(_row, _idx).setText('-')
-                            self.item(_row, _idx).setFlags(Qt.ItemIsSelectable)
-                return
-        raise ValueError("missing default value of {}".format(wgt_name_))
-
-    def _set_header(self):
-        for _idx, _col in enumerate(table_col):
-            _wgt = QTableWidgetItem(_col[2])
-            if _col[1] in [ColType.String.value, ColType.Number.value]:
-                pass
-            elif _col[1] == ColType.Boolean.value:
-                _check = CustomCheckBox(str(_idx))
-                _check.setCheckState(Qt.Unchecked)
-                _check.changed.connect(self._on_check_all)
-            elif _col[1] == ColType.Other.value:
-                if _col[0] == TableCol.Type.value:
-                    pass
-                else:
-                    raise ValueError()
-            else:
-                raise ValueError()
-            self.setHorizontalHeaderItem(_idx, _wgt)
+    def revision(self):
+        """revision of the latest change in table"""
+        return self._model.revision()
+
+    def dirty(self, since_):
+        """rows changed after given revision, None if every row is changed"""
+        return self._model.dirty(since_)
+
+    def price_all(self):
+        """
+        fill premium of every option leg in background, european vanilla legs take one engine evaluation
+        table is locked by a modal progress dialog, which can cancel pricing
+        """
+        if self._thread is not None:
+            return
+        try:
+            _inst = self._model.instruments()
+        except ValueError as e:
+            QMessageBox.warning(self, "Price All", "Invalid instrument: {}".format(str(e)))
+            return
+        _mkt, _engine, _rounding = parse_env(self._parent.env_data)
+        self._thread = PriceAllThread(_inst, _mkt, _engine, self)
+        self._thread.priced.connect(lambda prices_, error_, revision_=self._model.revision(), rounding_=_rounding:
+                                    self._on_priced(prices_, error_, revision_, rounding_))
+        self._progress = QProgressDialog("Pricing {} instruments".format(len(_inst)), "Cancel", 0, 0, self)
+        self._progress.setWindowTitle("Price All")
+        self._progress.setWindowModality(Qt.WindowModal)
+        self._progress.canceled.connect(self._thread.cancel)
+        self._progress.show()
+        self._thread.start()
+
+    def _on_priced(self, prices_, error_, revision_, rounding_):
+        self._thread.wait()
+        self._thread = None
+        self._progress.close()
+        if error_:
+            QMessageBox.warning(self, "Price All", "An error occurred while pricing: {}".format(error_))
+        if prices_ is None:
+            return
+        _rows = flatnonzero(~isnan(prices_))
+        _changed = self._model.dirty(revision_)
+        if _changed is None:
+            return
+        self._model.set_prices(setdiff1d(_rows, _changed), prices_[setdiff1d(_rows, _changed)].round(rounding_))
+        _failed = (self._model.type_mask(option_type) & isnan(prices_)).sum()
+        if _failed:
+            QMessageBox.information(self, "Price All", "{} option legs cannot be priced by current engine".format(
+                _failed))
+
+    def _on_click(self, index_):
+        # combo columns open their editor on a single click
+        if table_col[index_.column()][0] in combo_col and self._model.flags(index_) & Qt.ItemIsEditable:
+            self.edit(index_)
+
+    def _on_header_click(self, column_):
+        if table_col[column_][1] == ColType.Boolean.value:
+            _name, _code, _index = record_col[table_col[column_][3]]
+            _all = self.rowCount() and (self._model.records()[_name] == _index[True]).all()
+            self._on_check_all(str(column_), Qt.Unchecked if _all else Qt.Checked)
 
     def _on_check_all(self, wgt_name_, check_state_):
-        _idx = int(wgt_name_)
-        for _row in range(self.rowCount()):
-            self.item(_row, _idx).setCheckState(check_state_)
+        self._model.set_column(int(wgt_name_), check_state_)
 
     def _price(self, row_):
         if row_ == -1:
             return
-        # prepare instrument data
-        _raw_data = self._collect_row_full(row_)
         # prepare pricing environment
         _mkt, _engine, _rounding = parse_env(self._parent.env_data)
         # do pricing
-        _inst = Instrument.get_inst(_raw_data)
-        _price = _inst.pv(_mkt, _engine, unit_=1)
+        try:
+            _estimate = self._model.instrument(row_).pv_estimate(_mkt, _engine, unit_=1)
+        except ValueError as e:
+            QMessageBox.warning(self, "Price", "An error occurred while pricing: {}".format(str(e)))
+            return
         for _idx, _col in enumerate(table_col):
             if _col[0] == TableCol.Premium.value:
-                self.item(row_, _idx).setText(str(round(_price, _rounding)))
-
-    def _inst_id(self):
-        self._seq += 1
-        return "Inst-{}".format(self._seq)
+                self._model.setData(self._model.index(row_, _idx), round(_estimate['pv'], _rounding))
+        if _estimate['paths']:
+            QToolTip.showText(QCursor.pos(), "standard error {:.6g} on {} paths".format(
+                _estimate['stderr'], _estimate['paths']), self)
@@ -16,6 +16,14 @@ class InstParam(Enum):
     OptionType = 'OptionType'
     OptionStrike = 'OptionStrike'
     OptionMaturity = 'OptionMaturity'
+    OptionExercise = 'OptionExercise'
+    OptionExerciseTimes = 'OptionExerciseTimes'
+    PathMonitor = 'PathMonitor'
+    BarrierType = 'BarrierType'
+    BarrierLevel = 'BarrierLevel'
+    BarrierRebate = 'BarrierRebate'
+    AverageType = 'AverageType'
+    LookbackType = 'LookbackType'
 
 
 class InstType(Enum):
@@ -23,9 +31,49 @@ class InstType(Enum):
     CallOption = 'CALL'
     PutOption = 'PUT'
     Stock = 'STOCK'
+    BarrierCall = 'BARRIER CALL'
+    BarrierPut = 'BARRIER PUT'
+    AsianCall = 'ASIAN CALL'
+    AsianPut = 'ASIAN PUT'
+    LookbackCall = 'LOOKBACK CALL'
+    LookbackPut = 'LOOKBACK PUT'
 
 
-option_type = [InstType.CallOption.value, InstType.PutOption.value]
+class ExerciseType(Enum):
+    """option exercise type"""
+    European = 'European'
+    American = 'American'
+    Bermudan = 'Bermudan'
+
+
+class BarrierType(Enum):
+    """barrier direction and knock type"""
+    UpIn = 'Up-In'
+    UpOut = 'Up-Out'
+    DownIn = 'Down-In'
+    DownOut = 'Down-Out'
+
+
+class AverageType(Enum):
+    """asian option averaging"""
+    Arithmetic = 'Arithmetic'
+    Geometric = 'Geometric'
+
+
+class LookbackType(Enum):
+    """lookback option strike type"""
+    Fixed = 'Fixed'
+    Floating = 'Floating'
+
+
+vanilla_type = [InstType.CallOption.value, InstType.PutOption.value]
+barrier_type = [InstType.BarrierCall.value, InstType.BarrierPut.value]
+asian_type = [InstType.AsianCall.value, InstType.AsianPut.value]
+lookback_type = [InstType.LookbackCall.value, InstType.LookbackPut.value]
+exotic_type = barrier_type + asian_type + lookback_type
+option_type = vanilla_type + exotic_type
+call_type = [InstType.CallOption.value, InstType.BarrierCall.value, InstType.AsianCall.value,
+             InstType.LookbackCall.value]
 
 
 class Instrument(object):
@@ -52,14 +100,32 @@ class Instrument(object):
     def get_inst(cls, inst_dict_):
         """get instrument through instrument dictionary"""
         type_ = inst_dict_.get(InstParam.InstType.value)
-        if type_ in option_type:
+        if type_ in vanilla_type:
             from instrument.option import Option
             return Option(inst_dict_)
+        elif type_ in barrier_type:
+            from instrument.exotic import BarrierOption
+            return BarrierOption(inst_dict_)
+        elif type_ in asian_type:
+            from instrument.exotic import AsianOption
+            return AsianOption(inst_dict_)
+        elif type_ in lookback_type:
+            from instrument.exotic import LookbackOption
+            return LookbackOption(inst_dict_)
         elif type_ == InstType.Stock.value:
             from instrument.stock import Stock
             return Stock(inst_dict_)
         if type_ is None:
             raise ValueError("instrument type not specified")
+        raise ValueError("invalid instrument type given: {}".format(type_))
+
+    def key_levels(self):
+        """spot levels where instrument payoff changes its shape"""
+        return []
+
+    def net_key(self):
+        """terms of instrument except unit and price, instruments with same key can be netted into one position"""
+        return self.type,
 
     def payoff(self, mkt_dict_):
         """get instrument payoff for given spot"""
@@ -72,6 +138,7 @@ class Instrument(object):
     def profit_discount(self, mkt_dict_, time_):
         """get instrument pnl for given spot"""
         _rate, _spot = tuple(self._load_market(mkt_dict_, [EnvParam.RiskFreeRate.value, EnvParam.UdSpotForPrice.value]))
+        _rate = self._term_rates(mkt_dict_, time_, _rate, 0)[0]
         return self.payoff(_spot) * exp(-_rate * time_) - self.unit * self.price
 
     def pnl(self, mkt_dict_, engine_):
@@ -82,6 +149,13 @@ class Instrument(object):
         """evaluate instrument PV on given market"""
         raise NotImplementedError("'pv' method need to be defined in sub-classes")
 
+    def pv_estimate(self, mkt_dict_, engine_, unit_=None):
+        """
+        evaluate instrument PV with its Monte-Carlo standard error and number of paths
+        :return: a dict with keys pv, stderr and paths, stderr and paths are 0 for deterministic evaluation
+        """
+        return dict(pv=self.pv(mkt_dict_, engine_, unit_), stderr=0., paths=0)
+
     def delta(self, mkt_dict_, engine_, unit_=None):
         """evaluate instrument DELTA with market data and engine"""
         raise NotImplementedError("'delta' method need to be defined in sub-classes")
@@ -90,6 +164,25 @@ class Instrument(object):
         """evaluate instrument GAMMA with market data and engine"""
         raise NotImplementedError("'gamma' method need to be defined in sub-classes")
 
+    def vega(self, mkt_dict_, engine_, unit_=None):
+        """evaluate instrument VEGA with market data and engine"""
+        return self.risk(mkt_dict_, engine_, unit_, ['vega'])['vega']
+
+    def theta(self, mkt_dict_, engine_, unit_=None):
+        """evaluate instrument THETA with market data and engine"""
+        return self.risk(mkt_dict_, engine_, unit_, ['theta'])['theta']
+
+    def rho(self, mkt_dict_, engine_, unit_=None):
+        """evaluate instrument RHO with market data and engine"""
+        return self.risk(mkt_dict_, engine_, unit_, ['rho'])['rho']
+
+    def risk(self, mkt_dict_, engine_, unit_=None, measures_=None):
+        """
+        evaluate instrument PV and all greeks in one pass, keyed by pv, delta, gamma, vega, theta, rho
+        :param measures_: measures required, all if not given, engines may skip work serving none of them
+        """
+        raise NotImplementedError("'risk' method need to be defined in sub-classes")
+
     @property
     def type(self):
         """instrument type"""
@@ -131,14 +224,34 @@ class Instrument(object):
                 raise ValueError("type <int> or <float> is required for price, not {}".format(type(price_)))
             self._price = price_
 
+    @staticmethod
+    def _term_rates(mkt_dict_, t_, rate_, div_):
+        """
+        rate and dividend yield (continuous) to maturities from market curves, flat ones are kept where not given
+        curves are cached by their quotes, so discount factors are built once for all legs and scenarios
+        """
+        _single = mkt_dict_.get(EnvParam.RateFormat.value) == RateFormat.Single.value
+        _res = []
+        for _param, _flat in [(EnvParam.RateCurve.value, rate_), (EnvParam.UdDivCurve.value, div_)]:
+            _quotes = mkt_dict_.get(_param)
+            if _quotes:
+                from utils.yield_curve import YieldCurve
+                _flat = YieldCurve.from_quotes(_quotes, _single).rate(t_)
+            _res.append(_flat)
+        return tuple(_res)
+
     @staticmethod
     def _load_market(mkt_dict_, load_param_):
         _res = []
         for _param in load_param_:
             _value = mkt_dict_.get(_param)
-            if _param in [EnvParam.RiskFreeRate.value, EnvParam.UdVolatility.value, EnvParam.UdDivYieldRatio.value]:
+            if _param in [EnvParam.RiskFreeRate.value, EnvParam.UdVolatility.value, EnvParam.UdDivYieldRatio.value,
+                          EnvParam.HestonKappa.value, EnvParam.HestonTheta.value, EnvParam.HestonVolOfVol.value,
+                          EnvParam.HestonCorr.value]:
                 if not isinstance(_value, (int, float)):
                     raise ValueError("type <int> or <float> is required for {}, not {}".format(_param, type(_value)))
+            if _param in [EnvParam.RiskFreeRate.value, EnvParam.UdVolatility.value, EnvParam.UdDivYieldRatio.value,
+                          EnvParam.HestonTheta.value, EnvParam.HestonVolOfVol.value]:
                 _value /= 100
             if _param in [EnvParam.RiskFreeRate.value, EnvParam.UdDivYieldRatio.value]:
                 _rate_format = mkt_dict_.get(EnvParam.RateFormat.value)
@@ -1,9 +1,9 @@
 # coding=utf-8
 """default value of all parameters"""
 
-from gui.plot import PlotParam
-from instrument import InstParam, InstType
-from instrument.env_param import EnvParam, EngineMethod, EngineParam, RateFormat
+from gui.figure import PlotParam
+from instrument import ExerciseType, InstParam, InstType
+from instrument.env_param import EnvParam, EngineMethod, EngineParam, FourierModel, LatticeTree, RateFormat
 
 
 default_param = {
@@ -11,12 +11,16 @@ default_param = {
         InstParam.InstUnit.value: 1,
         InstParam.InstCost.value: 0,
         InstParam.OptionStrike.value: EnvParam.UdSpotForPrice.value,
+        InstParam.OptionMaturity.value: EnvParam.PortMaturity.value,
+        InstParam.OptionExercise.value: ExerciseType.European.value,
         PlotParam.Show.value: False,
     },
     InstType.PutOption.value: {
         InstParam.InstUnit.value: 1,
         InstParam.InstCost.value: 0,
         InstParam.OptionStrike.value: EnvParam.UdSpotForPrice.value,
+        InstParam.OptionMaturity.value: EnvParam.PortMaturity.value,
+        InstParam.OptionExercise.value: ExerciseType.European.value,
         PlotParam.Show.value: False,
     },
     InstType.Stock.value: {
@@ -37,5 +41,20 @@ env_default_param = {
     EnvParam.CostRounding.value: 2,
     EnvParam.RateFormat.value: RateFormat.Single.value,
     EnvParam.PricingEngine.value: EngineMethod.BS.value,
+    EnvParam.HestonKappa.value: 2,
+    EnvParam.HestonTheta.value: 30,
+    EnvParam.HestonVolOfVol.value: 50,
+    EnvParam.HestonCorr.value: -0.7,
     EngineParam.MCIteration.value: 1000000,
+    EngineParam.MCPathStep.value: 50,
+    EngineParam.MCSeed.value: None,
+    EngineParam.MCTargetError.value: None,
+    EngineParam.MCRelTolerance.value: None,
+    EngineParam.LatticeStep.value: 200,
+    EngineParam.LatticeTree.value: LatticeTree.Binomial.value,
+    EngineParam.PDEGrid.value: 400,
+    EngineParam.PDEStep.value: 100,
+    EngineParam.HestonNodes.value: 256,
+    EngineParam.FourierGrid.value: 4096,
+    EngineParam.FourierModel.value: FourierModel.BS.value,
 }
@@ -14,6 +14,13 @@ class EnvParam(Enum):
     CostRounding = 'CostRounding'
     RateFormat = 'RateFormat'
     PricingEngine = 'PricingEngine'
+    HestonKappa = 'HestonKappa'
+    HestonTheta = 'HestonTheta'
+    HestonVolOfVol = 'HestonVolOfVol'
+    HestonCorr = 'HestonCorr'
+    UdVolSurface = 'UdVolSurface'
+    RateCurve = 'RateCurve'
+    UdDivCurve = 'UdDivCurve'
 
 
 class RateFormat(Enum):
@@ -26,8 +33,40 @@ class EngineMethod(Enum):
     """engine evaluation method"""
     BS = 'Black-Scholes'
     MC = 'Monte-Carlo'
+    Lattice = 'Lattice'
+    PDE = 'PDE'
+    Heston = 'Heston'
+    HestonMC = 'Heston MC'
+    Fourier = 'Fourier'
+
+
+mc_engine = [EngineMethod.MC.value, EngineMethod.HestonMC.value]
+heston_engine = [EngineMethod.Heston.value, EngineMethod.HestonMC.value]
 
 
 class EngineParam(Enum):
     """engine parameter"""
     MCIteration = 'MCIteration'
+    MCPathStep = 'MCPathStep'
+    MCSeed = 'MCSeed'
+    MCTargetError = 'MCTargetError'
+    MCRelTolerance = 'MCRelTolerance'
+    LatticeStep = 'LatticeStep'
+    LatticeTree = 'LatticeTree'
+    PDEGrid = 'PDEGrid'
+    PDEStep = 'PDEStep'
+    HestonNodes = 'HestonNodes'
+    FourierGrid = 'FourierGrid'
+    FourierModel = 'FourierModel'
+
+
+class LatticeTree(Enum):
+    """lattice tree type"""
+    Binomial = 'Binomial'
+    Trinomial = 'Trinomial'
+
+
+class FourierModel(Enum):
+    """model of characteristic function priced by fourier engine"""
+    BS = 'Black-Scholes'
+    Heston = 'Heston'
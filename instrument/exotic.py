@@ -0,0 +1,345 @@
+# coding=utf-8
+"""definition of path-dependent options (barrier, asian and lookback) for payoff estimation and pricing"""
+
+from instrument import AverageType, BarrierType, InstParam, LookbackType, asian_type, barrier_type, lookback_type
+from instrument.env_param import EngineMethod, EnvParam, mc_engine
+from instrument.option import Option
+from numpy import exp, log, maximum, minimum, ones, sqrt, where, zeros
+from numpy.random import randint
+from utils.black_scholes import BlackScholes
+
+
+class PathOption(Option):
+    """
+    path-dependent option base class
+    closed form is used with Black-Scholes engine where it exists, paths are simulated with Monte-Carlo engine
+    or Heston MC engine, the latter has no control variate for lack of closed form under stochastic volatility
+    payoff and net payoff assume the underlying stays flat at given spot until maturity
+    """
+    _name = "path option"
+    _monitor = 0
+
+    def __init__(self, inst_dict_):
+        super(PathOption, self).__init__(inst_dict_)
+        self.monitor = inst_dict_.get(InstParam.PathMonitor.value)
+
+    def net_key(self):
+        """option terms with monitoring"""
+        return super(PathOption, self).net_key() + (self.monitor, )
+
+    def pv(self, mkt_dict_, engine_, unit_=None):
+        """calculate option PV with market data and engine"""
+        _rate, _spot, _vol, _div, _method, _param, _sign, _strike, _t = self._prepare_risk_data(mkt_dict_, engine_)
+        return self._value(_method, _param, _sign, _spot, _rate, _div, _vol, _t,
+                           heston_=self._heston_model(_method, mkt_dict_)) * (unit_ or self.unit)
+
+    def risk(self, mkt_dict_, engine_, unit_=None, measures_=None):
+        """calculate option PV and greeks by bumping market, simulated paths are shared by all bumps"""
+        _rate, _spot, _vol, _div, _method, _param, _sign, _strike, _t = self._prepare_risk_data(mkt_dict_, engine_)
+        _unit = unit_ or self.unit
+        _heston = self._heston_model(_method, mkt_dict_)
+        _seed = self._mc_seed(_param)
+        _seed = randint(2 ** 31) if _seed is None else _seed
+
+        # bumps run fixed number of paths on common random numbers even if a target error is given
+        def _value(isp_=_spot, rate_=_rate, vol_=_vol, t_=_t):
+            return self._value(_method, _param, _sign, isp_, rate_, _div, vol_, t_, _seed, False, _heston)
+
+        _risk = self._bump_risk(_value, _spot, _rate, _vol, _t, measures_)
+        return {_key: _v * _unit for _key, _v in _risk.items()}
+
+    @property
+    def monitor(self):
+        """number of equally spaced monitoring dates, 0 for continuous monitoring"""
+        return self._monitor
+
+    @monitor.setter
+    def monitor(self, monitor_):
+        if monitor_ is not None:
+            if not isinstance(monitor_, int) or monitor_ < 0:
+                raise ValueError("non-negative <int> is required for monitoring dates, not {}".format(monitor_))
+            self._monitor = monitor_
+
+    def _value(self, method_, param_, sign_, isp_, rate_, div_, vol_, t_, seed_=None, target_=True, heston_=None):
+        if method_ == EngineMethod.BS.value:
+            _value = self._formula(sign_, isp_, rate_, div_, vol_, t_)
+            if _value is None:
+                raise ValueError("no closed form for {}, {} engine is required".format(self, EngineMethod.MC.value))
+            return _value
+
+        elif method_ in mc_engine:
+            return self._mc_estimate(param_, sign_, isp_, rate_, div_, vol_, t_, seed_, target_, heston_)['value']
+
+        raise ValueError("{} engine is not supported for {}".format(method_, self.type))
+
+    def _mc_estimate(self, param_, sign_, isp_, rate_, div_, vol_, t_, seed_=None, target_=True, heston_=None):
+        from utils.monte_carlo import MonteCarlo, mc_batch
+        if t_ <= 0:
+            _value = self._formula(sign_, isp_, rate_, div_, vol_, t_) if self._closed_form() else \
+                self.payoff({EnvParam.UdSpotForPrice.value: isp_}) / self.unit
+            return dict(value=_value, stderr=0., paths=0)
+        _step = self.monitor or self._path_step(param_)
+        _iteration = self._mc_iteration(param_)
+        _target = self._mc_target(param_) if target_ else dict()
+        # without target all paths are simulated in one batch, as paths advance step by step for every path
+
+        def _sample(size_, generator_):
+            return self._samples(size_, _step, generator_, sign_, isp_, rate_, div_, vol_, t_, heston_)
+
+        return MonteCarlo.estimate(_sample, _iteration, self._mc_seed(param_) if seed_ is None else seed_,
+                                   batch_=mc_batch if _target else _iteration, **_target)
+
+    def _closed_form(self):
+        return False
+
+    def _formula(self, sign_, isp_, rate_, div_, vol_, t_):
+        return None
+
+    def _samples(self, iteration_, step_, seed_, sign_, isp_, rate_, div_, vol_, t_, heston_=None):
+        """discounted payoff of every simulated path, seed may be a random generator"""
+        raise NotImplementedError("'_samples' method need to be defined in sub-classes")
+
+
+class BarrierOption(PathOption):
+    """
+    single barrier option with knock-in or knock-out, rebate is paid at maturity
+    continuous monitoring is simulated with brownian bridge crossing probability between path steps
+    """
+    _name = "barrier option"
+    _type_list = barrier_type
+    _barrier = None
+    _barrier_type = None
+    _rebate = 0
+
+    def __init__(self, inst_dict_):
+        super(BarrierOption, self).__init__(inst_dict_)
+        self.barrier = inst_dict_.get(InstParam.BarrierLevel.value)
+        self.barrier_type = inst_dict_.get(InstParam.BarrierType.value)
+        self.rebate = inst_dict_.get(InstParam.BarrierRebate.value)
+
+    def __str__(self):
+        return "{} * {} {}, {} {}, Maturity {}".format(
+            self.unit, self.strike, self.type, self.barrier_type, self.barrier, self.maturity)
+
+    def key_levels(self):
+        """strike and barrier level"""
+        return [self.strike, self.barrier]
+
+    def net_key(self):
+        """option terms with barrier"""
+        return super(BarrierOption, self).net_key() + (self.barrier_type, self.barrier, self.rebate)
+
+    def payoff(self, mkt_dict_):
+        """get option payoff for given spot, barrier is triggered if spot is beyond barrier"""
+        _spot = self._load_market(mkt_dict_, [EnvParam.UdSpotForPrice.value])[0]
+        _hit = _spot >= self.barrier if self._up() else _spot <= self.barrier
+        _vanilla = super(BarrierOption, self).payoff(mkt_dict_)
+        return _vanilla if _hit == self._knock_in() else self.rebate * self.unit
+
+    @property
+    def barrier(self):
+        """barrier level"""
+        if self._barrier is None:
+            raise ValueError("barrier level not specified")
+        return self._barrier
+
+    @barrier.setter
+    def barrier(self, barrier_):
+        if not isinstance(barrier_, (int, float)) or barrier_ <= 0:
+            raise ValueError("positive <int> or <float> is required for barrier level, not {}".format(barrier_))
+        self._barrier = barrier_
+
+    @property
+    def barrier_type(self):
+        """barrier type - Up-In, Up-Out, Down-In or Down-Out"""
+        if self._barrier_type is None:
+            raise ValueError("barrier type not specified")
+        return self._barrier_type
+
+    @barrier_type.setter
+    def barrier_type(self, barrier_type_):
+        if barrier_type_ not in [_b.value for _b in BarrierType]:
+            raise ValueError("invalid barrier type given: {}".format(barrier_type_))
+        self._barrier_type = barrier_type_
+
+    @property
+    def rebate(self):
+        """rebate paid at maturity when option is knocked out or never knocked in"""
+        return self._rebate
+
+    @rebate.setter
+    def rebate(self, rebate_):
+        if rebate_ is not None:
+            if not isinstance(rebate_, (int, float)):
+                raise ValueError("type <int> or <float> is required for rebate, not {}".format(type(rebate_)))
+            self._rebate = rebate_
+
+    def _up(self):
+        return self.barrier_type in [BarrierType.UpIn.value, BarrierType.UpOut.value]
+
+    def _knock_in(self):
+        return self.barrier_type in [BarrierType.UpIn.value, BarrierType.DownIn.value]
+
+    def _closed_form(self):
+        return True
+
+    def _formula(self, sign_, isp_, rate_, div_, vol_, t_):
+        return BlackScholes.barrier(sign=sign_, isp=isp_, strike=self.strike, rate=rate_, div=div_, vol=vol_, t=t_,
+                                    up=self._up(), knock_in=self._knock_in(), barrier=self.barrier,
+                                    rebate=self.rebate, monitor=self.monitor)
+
+    def _samples(self, iteration_, step_, seed_, sign_, isp_, rate_, div_, vol_, t_, heston_=None):
+        _up = self._up()
+        _alive = ones(iteration_)
+        _spot = None
+        for _prev, _spot, _var, _u in self._paths(iteration_, step_, seed_, isp_, rate_, div_, vol_, t_, heston_):
+            _alive *= (_spot < self.barrier) if _up else (_spot > self.barrier)
+            if not self.monitor:
+                _cross = exp(-2 * log(self.barrier / _prev) * log(self.barrier / _spot) / _var)
+                _alive *= 1 - minimum(_cross, 1)
+        _alive = _alive if (isp_ < self.barrier if _up else isp_ > self.barrier) else zeros(iteration_)
+        _hit = 1 - _alive if self._knock_in() else _alive
+        _payoff = maximum(sign_ * (_spot - self.strike), 0) * _hit + self.rebate * (1 - _hit)
+        return _payoff * exp(-rate_ * t_)
+
+
+class AsianOption(PathOption):
+    """
+    average price option with arithmetic or geometric averaging on equally spaced fixings
+    arithmetic average is simulated with geometric average as control variate
+    """
+    _name = "asian option"
+    _type_list = asian_type
+    _average_type = AverageType.Arithmetic.value
+
+    def __init__(self, inst_dict_):
+        super(AsianOption, self).__init__(inst_dict_)
+        self.average_type = inst_dict_.get(InstParam.AverageType.value)
+
+    def __str__(self):
+        return "{} * {} {} {}, Maturity {}".format(self.unit, self.strike, self.average_type, self.type,
+                                                   self.maturity)
+
+    def net_key(self):
+        """option terms with averaging"""
+        return super(AsianOption, self).net_key() + (self.average_type, )
+
+    @property
+    def average_type(self):
+        """averaging - Arithmetic or Geometric"""
+        return self._average_type
+
+    @average_type.setter
+    def average_type(self, average_type_):
+        if average_type_ is not None:
+            if average_type_ not in [_a.value for _a in AverageType]:
+                raise ValueError("invalid average type given: {}".format(average_type_))
+            self._average_type = average_type_
+
+    def _closed_form(self):
+        return self.average_type == AverageType.Geometric.value
+
+    def _formula(self, sign_, isp_, rate_, div_, vol_, t_, monitor_=None):
+        if self.average_type == AverageType.Geometric.value or monitor_ is not None:
+            return BlackScholes.geometric_asian(sign=sign_, isp=isp_, strike=self.strike, rate=rate_, div=div_,
+                                                vol=vol_, t=t_, monitor=self.monitor if monitor_ is None else monitor_)
+
+    def _samples(self, iteration_, step_, seed_, sign_, isp_, rate_, div_, vol_, t_, heston_=None):
+        _sum = zeros(iteration_)
+        _log_sum = zeros(iteration_)
+        for _prev, _spot, _var, _u in self._paths(iteration_, step_, seed_, isp_, rate_, div_, vol_, t_, heston_):
+            _sum += _spot
+            _log_sum += log(_spot)
+        _geometric = maximum(sign_ * (exp(_log_sum / step_) - self.strike), 0) * exp(-rate_ * t_)
+        if self.average_type == AverageType.Geometric.value:
+            return _geometric
+        _arithmetic = maximum(sign_ * (_sum / step_ - self.strike), 0) * exp(-rate_ * t_)
+        if heston_ is not None:
+            return _arithmetic
+        return _arithmetic - _geometric + self._formula(sign_, isp_, rate_, div_, vol_, t_, monitor_=step_)
+
+
+class LookbackOption(PathOption):
+    """
+    lookback option on running extreme of underlying since today
+    fixed strike pays max - K (call) or K - min (put), floating strike pays S_T - min (call) or max - S_T (put)
+    continuous monitoring is simulated by sampling extreme of brownian bridge between path steps
+    """
+    _name = "lookback option"
+    _type_list = lookback_type
+    _lookback_type = LookbackType.Fixed.value
+
+    def __init__(self, inst_dict_):
+        self.lookback_type = inst_dict_.get(InstParam.LookbackType.value)
+        super(LookbackOption, self).__init__(inst_dict_)
+
+    def __str__(self):
+        return "{} * {} {} {}, Maturity {}".format(self.unit, self._strike, self.lookback_type, self.type,
+                                                   self.maturity)
+
+    def key_levels(self):
+        """strike level of fixed strike lookback"""
+        return [self.strike] if self._fixed() else []
+
+    def net_key(self):
+        """option terms with strike type, strike is ignored for floating strike"""
+        return self.type, self.strike if self._fixed() else None, self.maturity, self.exercise, self.monitor, \
+            self.lookback_type
+
+    def payoff(self, mkt_dict_):
+        """get option payoff for given spot, floating strike lookback pays nothing on a flat path"""
+        if self._fixed():
+            return super(LookbackOption, self).payoff(mkt_dict_)
+        return 0 * self.unit
+
+    @property
+    def lookback_type(self):
+        """strike type - Fixed or Floating"""
+        return self._lookback_type
+
+    @lookback_type.setter
+    def lookback_type(self, lookback_type_):
+        if lookback_type_ is not None:
+            if lookback_type_ not in [_l.value for _l in LookbackType]:
+                raise ValueError("invalid lookback type given: {}".format(lookback_type_))
+            self._lookback_type = lookback_type_
+
+    @property
+    def strike(self):
+        """strike level of fixed strike lookback, not used by floating strike lookback"""
+        if self._strike is None and self._fixed():
+            raise ValueError("strike level not specified")
+        return self._strike
+
+    @strike.setter
+    def strike(self, strike_):
+        if strike_ is not None or self._fixed():
+            Option.strike.fset(self, strike_)
+
+    def _fixed(self):
+        return self.lookback_type == LookbackType.Fixed.value
+
+    def _closed_form(self):
+        return not self.monitor
+
+    def _formula(self, sign_, isp_, rate_, div_, vol_, t_):
+        if not self.monitor:
+            return BlackScholes.lookback(sign=sign_, isp=isp_, strike=self.strike or 0, rate=rate_, div=div_,
+                                         vol=vol_, t=t_, floating=not self._fixed())
+
+    def _samples(self, iteration_, step_, seed_, sign_, isp_, rate_, div_, vol_, t_, heston_=None):
+        # the extreme needed - max for fixed call and floating put, min otherwise
+        _max = (sign_ > 0) == self._fixed()
+        _extreme = zeros(iteration_) + isp_
+        _spot = None
+        for _prev, _spot, _var, _u in self._paths(iteration_, step_, seed_, isp_, rate_, div_, vol_, t_, heston_,
+                                                  not self.monitor):
+            if self.monitor:
+                _step_extreme = _spot
+            else:
+                _gap = log(_spot / _prev)
+                _spread = sqrt(_gap ** 2 - 2 * _var * log(_u))
+                _step_extreme = _prev * exp((_gap + _spread) / 2 if _max else (_gap - _spread) / 2)
+            _extreme = maximum(_extreme, _step_extreme) if _max else minimum(_extreme, _step_extreme)
+        _payoff = maximum(sign_ * (_extreme - self.strike), 0) if self._fixed() else sign_ * (_spot - _extreme)
+        return where(_payoff > 0, _payoff, 0) * exp(-rate_ * t_)
@@ -0,0 +1,165 @@
+# coding=utf-8
+"""least-squares delta/gamma and pnl hedge of portfolio over spot range or scenario set"""
+
+from instrument import InstParam, InstType, Instrument
+from instrument.portfolio import risk_measure
+from numpy import argmax, asarray, broadcast_to, concatenate, diag, eye, inf, maximum, ones, sqrt, where, zeros
+from numpy.linalg import solve
+from scipy.optimize import lsq_linear
+from scipy.sparse import csr_matrix, diags, vstack
+
+# exposures a hedge can neutralize, pnl is the variance of pv across spots
+hedge_measure = ['pnl'] + risk_measure[1:]
+# units below are dropped from hedge legs
+hedge_min_unit = 10 ** -4
+
+
+class HedgeSolver(object):
+    """
+    least-squares hedge engine
+    exposures of portfolio and of every candidate are evaluated on all spots in one pass of the portfolio engine,
+    units of candidates minimize weighted squared residual exposures within bounds (bounded-variable least squares)
+    every measure is scaled by exposure of portfolio, so delta and gamma weigh alike whatever their units
+    the ridge problem is solved in closed form on the smaller of spots and candidates, bounds only fall back to lsq
+    """
+    def __init__(self, portfolio_):
+        self._portfolio = portfolio_
+
+    @staticmethod
+    def listed(strikes_, maturities_, types_=None, stock_=True):
+        """
+        candidate instruments of stock and every listed type, strike and maturity, in unit of 1
+        :param types_: option types, calls and puts if not given
+        """
+        _res = [Instrument.get_inst({InstParam.InstType.value: InstType.Stock.value, InstParam.InstUnit.value: 1})] \
+            if stock_ else []
+        for _type in types_ or [InstType.CallOption.value, InstType.PutOption.value]:
+            for _maturity in maturities_:
+                for _strike in strikes_:
+                    _res.append(Instrument.get_inst({
+                        InstParam.InstType.value: _type, InstParam.OptionStrike.value: float(_strike),
+                        InstParam.OptionMaturity.value: float(_maturity), InstParam.InstUnit.value: 1}))
+        return _res
+
+    def run(self, candidates_, measures_=('delta', 'gamma'), spots_=None, weights_=None, bounds_=(-inf, inf),
+            penalty_=10 ** -6, max_legs_=None):
+        """
+        find units of candidates hedging portfolio
+        :param candidates_: hedge instruments, unit of each is ignored
+        :param measures_: exposures to neutralize, any of hedge_measure
+        :param spots_: spot range or scenario set, plotting spots of portfolio if not given
+        :param weights_: weight (e.g. probability) of every spot, equal if not given
+        :param bounds_: (lower, upper) units, one pair for all candidates or a pair of arrays
+        :param penalty_: ridge weight on scaled units, prefers small hedges among equally good ones
+        :param max_legs_: most candidates kept, picked greedily by matching pursuit, others get 0 unit
+        :return: a dict consists with units of candidates, rms residual of every measure before and after hedge
+            (in units of the measure), and spots
+        """
+        for _measure in measures_:
+            if _measure not in hedge_measure:
+                raise ValueError("invalid hedge measure given: {}".format(_measure))
+        if not candidates_:
+            raise ValueError("hedge candidates not specified")
+        if max_legs_ is not None and (not isinstance(max_legs_, int) or max_legs_ < 1):
+            raise ValueError("positive <int> is required for max hedge legs, not {}".format(max_legs_))
+        _spots = self._portfolio.x_range() if spots_ is None else asarray(spots_, dtype=float).ravel()
+        _weights = ones(_spots.size) if weights_ is None else asarray(weights_, dtype=float).ravel()
+        if _weights.shape != _spots.shape or (_weights < 0).any() or not _weights.sum() > 0:
+            raise ValueError("one non-negative weight per spot is required for hedge")
+        _weights = _weights / _weights.sum()
+        _measures = list(measures_)
+        _required = [_m for _m in risk_measure if _m in _measures or (_m == 'pv' and 'pnl' in _measures)]
+
+        _target = self._portfolio.evaluate(_spots, self._portfolio_columns(), _required)
+        _exposure = self._portfolio.leg_risk(_spots, list(candidates_), _required)
+        _rows, _rhs, _scale = [], [], {}
+        for _measure in _measures:
+            _b, _a = self._centered(_measure, _target, _weights)[:, 0], self._centered(_measure, _exposure, _weights)
+            _scale[_measure] = self._rms(_b, _weights) or self._rms(_a, _weights[:, None]) or 1.
+            _rows.append(_a * sqrt(_weights)[:, None] / _scale[_measure])
+            _rhs.append(-_b * sqrt(_weights) / _scale[_measure])
+        _matrix, _rhs = concatenate(_rows), concatenate(_rhs)
+        _lower, _upper = [broadcast_to(asarray(_bound, dtype=float), (len(candidates_),)) for _bound in bounds_]
+        if max_legs_ is not None and max_legs_ < len(candidates_):
+            _keep = self._screen(_matrix, _rhs, _lower, _upper, penalty_, max_legs_)
+            _units = zeros(len(candidates_))
+            _units[_keep] = self._solve(_matrix[:, _keep], _rhs, _lower[_keep], _upper[_keep], penalty_)
+        else:
+            _units = self._solve(_matrix, _rhs, _lower, _upper, penalty_)
+        _residual = {}
+        for _measure in _measures:
+            _b = self._centered(_measure, _target, _weights)[:, 0]
+            _hedged = _b + self._centered(_measure, _exposure, _weights) @ _units
+            _residual[_measure] = (self._rms(_b, _weights), self._rms(_hedged, _weights))
+        return dict(units=_units, residual=_residual, spots=_spots)
+
+    @staticmethod
+    def hedge_legs(candidates_, units_, min_unit_=hedge_min_unit):
+        """candidates with their hedge units as instrument dicts, units below min unit are dropped"""
+        _res = []
+        for _inst, _unit in zip(candidates_, units_):
+            if abs(_unit) >= min_unit_:
+                _leg = {InstParam.InstType.value: _inst.type, InstParam.InstUnit.value: float(_unit)}
+                if _inst.type != InstType.Stock.value:
+                    _leg[InstParam.OptionStrike.value] = _inst.strike
+                    _leg[InstParam.OptionMaturity.value] = _inst.maturity
+                    _leg[InstParam.OptionExercise.value] = _inst.exercise
+                _res.append(_leg)
+        return _res
+
+    @staticmethod
+    def _solve(matrix_, rhs_, lower_, upper_, penalty_):
+        """
+        units minimizing |matrix @ units - rhs| ** 2 + penalty * |column norm * units| ** 2 within bounds
+        unbounded optimum is solved on the smaller gram matrix, lsq only runs when it breaks the bounds
+        """
+        _column = sqrt((matrix_ ** 2).sum(axis=0))
+        _column[_column == 0] = 1.
+        _scaled = matrix_ / _column
+        _rows, _cols = _scaled.shape
+        if _rows <= _cols:
+            # dual form, candidates far beyond spots only cost a (spot x spot) system
+            _units = _scaled.T @ solve(_scaled @ _scaled.T + penalty_ * eye(_rows), rhs_) / _column
+        else:
+            _units = solve(_scaled.T @ _scaled + penalty_ * eye(_cols), _scaled.T @ rhs_) / _column
+        if ((_units >= lower_) & (_units <= upper_)).all():
+            return _units
+        # ridge rows keep the problem well posed with many more candidates than spots
+        _ridge = concatenate([rhs_, zeros(_cols)])
+        if _rows >= _cols:
+            return lsq_linear(concatenate([matrix_, diag(sqrt(penalty_) * _column)]), _ridge, bounds=(lower_, upper_),
+                              lsq_solver='exact').x
+        _system = vstack([csr_matrix(matrix_), diags(sqrt(penalty_) * _column)]).tocsr()
+        return lsq_linear(_system, _ridge, bounds=(lower_, upper_), lsq_solver='lsmr', lsmr_tol='auto').x
+
+    @classmethod
+    def _screen(cls, matrix_, rhs_, lower_, upper_, penalty_, count_):
+        """
+        indices of count candidates picked by orthogonal matching pursuit
+        every step takes the candidate most correlated with residual in a direction its bounds allow, then refits
+        """
+        _column = sqrt((matrix_ ** 2).sum(axis=0))
+        _column[_column == 0] = 1.
+        _keep, _residual = [], rhs_
+        for _ in range(count_):
+            _corr = matrix_.T @ _residual / _column
+            _score = maximum(where(upper_ > 0, _corr, 0), where(lower_ < 0, -_corr, 0))
+            _score[_keep] = -1
+            _keep.append(int(argmax(_score)))
+            _residual = rhs_ - matrix_[:, _keep] @ cls._solve(matrix_[:, _keep], rhs_, -inf, inf, penalty_)
+        return _keep
+
+    def _portfolio_columns(self):
+        _legs = self._portfolio.legs()
+        return _legs, asarray([[_leg.unit] for _leg in _legs], dtype=float).reshape(len(_legs), 1), zeros(1)
+
+    @staticmethod
+    def _centered(measure_, risk_, weights_):
+        """exposure of measure in shape of (spot, line), pv is centered by its weighted mean for pnl variance"""
+        if measure_ != 'pnl':
+            return risk_[measure_]
+        return risk_['pv'] - weights_ @ risk_['pv']
+
+    @staticmethod
+    def _rms(value_, weights_):
+        return float(sqrt((weights_ * value_ ** 2).sum() / max(value_.size // weights_.size, 1)))
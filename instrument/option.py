@@ -1,36 +1,55 @@
 # coding=utf-8
 """definition of option for payoff estimation and pricing"""
 
-from instrument import InstParam, InstType, Instrument, option_type
-from instrument.env_param import EngineMethod, EngineParam, EnvParam
-from numpy import average, pi
-from numpy.ma import exp, log, sqrt
-from scipy.stats import norm
+from instrument import ExerciseType, InstParam, InstType, Instrument, call_type, vanilla_type
+from instrument.env_param import EngineMethod, EngineParam, EnvParam, FourierModel, LatticeTree, heston_engine, \
+    mc_engine
+from numpy import maximum
+from numpy.ma import exp
+from numpy.random import randint
+from utils.black_scholes import BlackScholes
 
 
 class Option(Instrument):
     """
     option class with basic parameters
-    only vanilla option is available (barrier is not supported)
+    vanilla option only, path-dependent options are defined in instrument.exotic
+    european, american and bermudan exercise are supported, early exercise requires lattice engine
+    heston engines price european options under stochastic volatility, semi-analytically or on simulated paths
+    fourier engine prices european options of a maturity on one FFT strike grid
     can estimate option payoff under different level of spot
     can evaluate option price under different market using different evaluation engine
     """
     _name = "option"
+    _type_list = vanilla_type
     _strike = None
     _maturity = None
+    _exercise = ExerciseType.European.value
+    _exercise_times = ()
 
     def __init__(self, inst_dict_):
         super(Option, self).__init__(inst_dict_)
         self.strike = inst_dict_.get(InstParam.OptionStrike.value)
         self.maturity = inst_dict_.get(InstParam.OptionMaturity.value)
+        self.exercise = inst_dict_.get(InstParam.OptionExercise.value)
+        self.exercise_times = inst_dict_.get(InstParam.OptionExerciseTimes.value)
 
     def __str__(self):
         return "{} * {} {}, Maturity {}".format(self.unit, self.strike, self.type, self.maturity)
 
+    def key_levels(self):
+        """strike level"""
+        return [self.strike]
+
+    def net_key(self):
+        """type, strike, maturity and exercise"""
+        return self.type, self.strike, self.maturity, self.exercise, \
+            self.exercise_times if self.exercise == ExerciseType.Bermudan.value else ()
+
     def payoff(self, mkt_dict_):
         """get option payoff for given spot"""
         _spot = self._load_market(mkt_dict_, [EnvParam.UdSpotForPrice.value])[0]
-        _reference = _spot - self.strike if self.type == InstType.CallOption.value else self.strike - _spot
+        _reference = _spot - self.strike if self.type in call_type else self.strike - _spot
         return max([_reference, 0]) * self.unit
 
     def pv(self, mkt_dict_, engine_, unit_=None):
@@ -39,67 +58,104 @@ class Option(Instrument):
         _unit = unit_ or self.unit
 
         if _method == EngineMethod.BS.value:
-            _d1 = (log(_spot / _strike) + (_rate - _div + _vol ** 2 / 2) * _t) / _vol / sqrt(_t)
-            _d2 = _d1 - _vol * sqrt(_t)
-            return _sign * (_spot * exp(-_div * _t) * norm.cdf(_sign * _d1) -
-                            _strike * exp(-_rate * _t) * norm.cdf(_sign * _d2)) * _unit
-
-        elif _method == EngineMethod.MC.value:
-            from utils.monte_carlo import MonteCarlo
-            _iteration = _param.get(EngineParam.MCIteration.value)
-            if not _iteration:
-                raise ValueError("iteration not specified")
-            if not isinstance(_iteration, int):
-                raise ValueError("type <int> is required for iteration, not {}".format(type(_iteration)))
-            _spot = MonteCarlo.stock_price(_iteration, isp=_spot, rate=_rate, div=_div, vol=_vol, t=_t)
-            _price = [max(_sign * (_s - _strike), 0) for _s in _spot]
-            return average(_price) * exp(-_rate * _t) * _unit
-
-    def delta(self, mkt_dict_, engine_, unit_=None):
-        """calculate option DELTA with market data and engine"""
+            return BlackScholes.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol,
+                                      t=_t) * _unit
+
+        elif _method == EngineMethod.Lattice.value:
+            from utils.lattice import Lattice
+            return Lattice.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t,
+                                 **self._lattice_param(_param)) * _unit
+
+        elif _method == EngineMethod.PDE.value:
+            from utils.finite_difference import FiniteDifference
+            return FiniteDifference.risk(isp=_spot, sign=_sign, strike=_strike, rate=_rate, div=_div, vol=_vol,
+                                         t=_t, **self._pde_param(_param))['pv'][0, 0] * _unit
+
+        elif _method == EngineMethod.Heston.value:
+            from utils.heston import Heston
+            return Heston.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t,
+                                nodes=self._heston_nodes(_param), **self._heston_param(mkt_dict_)) * _unit
+
+        elif _method == EngineMethod.Fourier.value:
+            from utils.fourier import Fourier
+            return Fourier.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t,
+                                 **self._fourier_param(_param, mkt_dict_)) * _unit
+
+        elif _method in mc_engine:
+            return self._mc_estimate(_param, _sign, _spot, _rate, _div, _vol, _t,
+                                     heston_=self._heston_model(_method, mkt_dict_))['value'] * _unit
+
+    def pv_estimate(self, mkt_dict_, engine_, unit_=None):
+        """calculate option PV with Monte-Carlo standard error and number of paths, error is 0 for other engines"""
         _rate, _spot, _vol, _div, _method, _param, _sign, _strike, _t = self._prepare_risk_data(mkt_dict_, engine_)
+        if _method not in mc_engine:
+            return super(Option, self).pv_estimate(mkt_dict_, engine_, unit_)
         _unit = unit_ or self.unit
+        _res = self._mc_estimate(_param, _sign, _spot, _rate, _div, _vol, _t,
+                                 heston_=self._heston_model(_method, mkt_dict_))
+        return dict(pv=_res['value'] * _unit, stderr=_res['stderr'] * abs(_unit), paths=_res['paths'])
 
-        if _method == EngineMethod.BS.value:
-            _d1 = (log(_spot / _strike) + (_rate + _vol ** 2 / 2) * _t) / _vol / sqrt(_t)
-            return _sign * norm.cdf(_sign * _d1) * exp(-_div * _t) * _unit
-
-        elif _method == EngineMethod.MC.value:
-            from utils.monte_carlo import MonteCarlo
-            _iteration = _param.get(EngineParam.MCIteration.value)
-            if not _iteration:
-                raise ValueError("iteration not specified")
-            if not isinstance(_iteration, int):
-                raise ValueError("type <int> is required for iteration, not {}".format(type(_iteration)))
-            _spot = MonteCarlo.stock_price(_iteration, isp=_spot, rate=_rate, div=_div, vol=_vol, t=_t)
-            _step = 0.01
-            _delta = [(max(_sign * (_s + _step - _strike), 0) - max(_sign * (_s - _step - _strike), 0)) /
-                      (_step * 2) for _s in _spot]
-            return average(_delta) * exp(-_rate * _t) * _unit
+    def delta(self, mkt_dict_, engine_, unit_=None):
+        """calculate option DELTA with market data and engine"""
+        return self.risk(mkt_dict_, engine_, unit_, ['delta'])['delta']
 
     def gamma(self, mkt_dict_, engine_, unit_=None):
         """calculate option GAMMA with market data and engine"""
+        return self.risk(mkt_dict_, engine_, unit_, ['gamma'])['gamma']
+
+    def risk(self, mkt_dict_, engine_, unit_=None, measures_=None):
+        """
+        calculate option PV, DELTA, GAMMA, VEGA, THETA and RHO from shared intermediates
+        :param measures_: measures required, all if not given, bumps serving none of them are skipped
+        """
         _rate, _spot, _vol, _div, _method, _param, _sign, _strike, _t = self._prepare_risk_data(mkt_dict_, engine_)
         _unit = unit_ or self.unit
+        _greeks = measures_ is None or bool(set(measures_) & {'vega', 'rho'})
 
         if _method == EngineMethod.BS.value:
-            _d1 = (log(_spot / _strike) + (_rate + _vol ** 2 / 2) * _t) / _vol / sqrt(_t)
-            return exp(-_d1 ** 2 / 2) / sqrt(2 * pi) / _spot / _vol / sqrt(_t) * exp(-_div * _t) * _unit
+            _risk = BlackScholes.risk(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t)
+
+        elif _method == EngineMethod.Lattice.value:
+            from utils.lattice import Lattice
+            _risk = Lattice.risk(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t,
+                                 greeks_=_greeks, **self._lattice_param(_param))
+
+        elif _method == EngineMethod.PDE.value:
+            from utils.finite_difference import FiniteDifference
+            _risk = FiniteDifference.risk(isp=_spot, sign=_sign, strike=_strike, rate=_rate, div=_div, vol=_vol,
+                                          t=_t, greeks_=_greeks, **self._pde_param(_param))
+            _risk = {_key: _value[0, 0] for _key, _value in _risk.items()}
 
         elif _method == EngineMethod.MC.value:
             from utils.monte_carlo import MonteCarlo
-            _iteration = _param.get(EngineParam.MCIteration.value)
-            if not _iteration:
-                raise ValueError("iteration not specified")
-            if not isinstance(_iteration, int):
-                raise ValueError("type <int> is required for iteration, not {}".format(type(_iteration)))
-            _spot = MonteCarlo.stock_price(_iteration, isp=_spot, rate=_rate, div=_div, vol=_vol, t=_t)
-            _step = 0.01
-            _gamma = [((max(_sign * (_s + 2 * _step - _strike), 0) - max(_sign * (_s - _strike), 0)) -
-                      (max(_sign * (_s - _strike), 0) - max(_sign * (_s - 2 * _step - _strike), 0))) /
-                      (4 * _step ** 2)
-                      for _s in _spot]
-            return average(_gamma) * exp(-_rate * _t) * _unit
+            _iteration = self._mc_iteration(_param)
+            _risk = MonteCarlo.option_risk(_iteration, measures_, sign=_sign, isp=_spot, strike=_strike, rate=_rate,
+                                           div=_div, vol=_vol, t=_t,
+                                           rand=MonteCarlo.normal(_iteration, self._mc_seed(_param)))
+
+        elif _method == EngineMethod.Heston.value:
+            from utils.heston import Heston
+            _risk = Heston.risk(measures_, sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol,
+                                t=_t, nodes=self._heston_nodes(_param), **self._heston_param(mkt_dict_))
+
+        elif _method == EngineMethod.Fourier.value:
+            from utils.fourier import Fourier
+            _risk = Fourier.risk(measures_=measures_, sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div,
+                                 vol=_vol, t=_t, **self._fourier_param(_param, mkt_dict_))
+
+        elif _method == EngineMethod.HestonMC.value:
+            _heston = self._heston_param(mkt_dict_)
+            _seed = self._mc_seed(_param)
+            _seed = randint(2 ** 31) if _seed is None else _seed
+
+            def _value(isp_=_spot, rate_=_rate, vol_=_vol, t_=_t):
+                return self._mc_estimate(_param, _sign, isp_, rate_, _div, vol_, t_, _seed, False, _heston)['value']
+
+            _risk = self._bump_risk(_value, _spot, _rate, _vol, _t, measures_)
+
+        else:
+            raise ValueError("invalid evaluation engine given: {}".format(_method))
+        return {_key: _value * _unit for _key, _value in _risk.items()}
 
     @property
     def type(self):
@@ -110,7 +166,7 @@ class Option(Instrument):
 
     @type.setter
     def type(self, type_):
-        if type_ not in option_type:
+        if type_ not in self._type_list:
             raise ValueError("invalid {} type given".format(self._name))
         self._type = type_
 
@@ -143,6 +199,52 @@ class Option(Instrument):
                 raise ValueError("non-negative value is required for maturity, not {}".format(maturity_))
             self._maturity = maturity_
 
+    @property
+    def exercise(self):
+        """exercise type - European, American or Bermudan"""
+        return self._exercise
+
+    @exercise.setter
+    def exercise(self, exercise_):
+        if exercise_ is not None:
+            if exercise_ not in [_e.value for _e in ExerciseType]:
+                raise ValueError("invalid exercise type given: {}".format(exercise_))
+            self._exercise = exercise_
+
+    @property
+    def exercise_times(self):
+        """early exercise times of bermudan option - year"""
+        return self._exercise_times
+
+    @exercise_times.setter
+    def exercise_times(self, exercise_times_):
+        if exercise_times_ is not None:
+            if not all([isinstance(_e, (int, float)) for _e in exercise_times_]):
+                raise ValueError("type <int> or <float> is required for all exercise times")
+            self._exercise_times = tuple(sorted(exercise_times_))
+
+    @staticmethod
+    def _pde_param(param_):
+        _res = dict()
+        for _key, _param in [('grid_', EngineParam.PDEGrid.value), ('step_', EngineParam.PDEStep.value)]:
+            _value = param_.get(_param)
+            if not _value:
+                raise ValueError("{} not specified".format(_param))
+            if not isinstance(_value, int):
+                raise ValueError("type <int> is required for {}, not {}".format(_param, type(_value)))
+            _res[_key] = _value
+        return _res
+
+    def _lattice_param(self, param_):
+        _step = param_.get(EngineParam.LatticeStep.value)
+        if not _step:
+            raise ValueError("lattice step not specified")
+        if not isinstance(_step, int):
+            raise ValueError("type <int> is required for lattice step, not {}".format(type(_step)))
+        return dict(step_=_step, tree_=param_.get(EngineParam.LatticeTree.value, LatticeTree.Binomial.value),
+                    american_=self.exercise == ExerciseType.American.value,
+                    exercise_=self.exercise_times if self.exercise == ExerciseType.Bermudan.value else ())
+
     @staticmethod
     def _load_engine(engine_):
         _method = engine_.get('engine')
@@ -151,12 +253,162 @@ class Option(Instrument):
         _param = engine_.get('param', {})
         return _method, _param
 
+    @staticmethod
+    def _mc_iteration(param_):
+        _iteration = param_.get(EngineParam.MCIteration.value)
+        if not _iteration:
+            raise ValueError("iteration not specified")
+        if not isinstance(_iteration, int):
+            raise ValueError("type <int> is required for iteration, not {}".format(type(_iteration)))
+        return _iteration
+
+    def _mc_estimate(self, param_, sign_, isp_, rate_, div_, vol_, t_, seed_=None, target_=True, heston_=None):
+        from utils.monte_carlo import MonteCarlo
+        if t_ <= 0:
+            return dict(value=max(sign_ * (isp_ - self.strike), 0), stderr=0., paths=0)
+        _step = self._path_step(param_) if heston_ else 1
+
+        def _sample(size_, generator_):
+            if heston_ is None:
+                _spot = MonteCarlo.stock_price(size_, isp=isp_, rate=rate_, div=div_, vol=vol_, t=t_,
+                                               rand=generator_.standard_normal(size_))
+            else:
+                _spot = self._terminal(size_, _step, generator_, isp_, rate_, div_, vol_, t_, heston_)
+            return maximum(sign_ * (_spot - self.strike), 0) * exp(-rate_ * t_)
+
+        return MonteCarlo.estimate(_sample, self._mc_iteration(param_), self._mc_seed(param_) if seed_ is None else
+                                   seed_, **(self._mc_target(param_) if target_ else dict()))
+
+    @staticmethod
+    def _paths(iteration_, step_, seed_, isp_, rate_, div_, vol_, t_, heston_=None, bridge_=False):
+        """simulated path steps under Black-Scholes, or under Heston model if its parameters are given"""
+        if heston_ is None:
+            from utils.monte_carlo import MonteCarlo
+            return MonteCarlo.stock_path(iteration_, step_, seed_, isp=isp_, rate=rate_, div=div_, vol=vol_, t=t_,
+                                         bridge=bridge_)
+        from utils.heston import Heston
+        return Heston.stock_path(iteration_, step_, seed_, isp=isp_, rate=rate_, div=div_, vol=vol_, t=t_,
+                                 bridge=bridge_, **heston_)
+
+    @classmethod
+    def _terminal(cls, iteration_, step_, seed_, isp_, rate_, div_, vol_, t_, heston_=None):
+        _spot = None
+        for _prev, _spot, _var, _u in cls._paths(iteration_, step_, seed_, isp_, rate_, div_, vol_, t_, heston_):
+            pass
+        return _spot
+
+    @staticmethod
+    def _bump_risk(value_, isp_, rate_, vol_, t_, measures_=None):
+        """PV and greeks by bumping market of value function, which takes isp_, rate_, vol_ and t_ as keywords"""
+        from utils.monte_carlo import MonteCarlo
+        return MonteCarlo.bump_risk(value_, isp_, rate_, vol_, t_, measures_)
+
+    @staticmethod
+    def _heston_param(mkt_dict_):
+        """variance process of Heston model as keywords of Heston engine, long-run variance from long-run vol"""
+        _kappa, _theta, _sigma, _corr = Instrument._load_market(mkt_dict_, [
+            EnvParam.HestonKappa.value, EnvParam.HestonTheta.value, EnvParam.HestonVolOfVol.value,
+            EnvParam.HestonCorr.value])
+        if _kappa <= 0:
+            raise ValueError("positive value is required for {}, not {}".format(EnvParam.HestonKappa.value, _kappa))
+        if _theta < 0:
+            raise ValueError("non-negative value is required for {}, not {}".format(EnvParam.HestonTheta.value,
+                                                                                    _theta))
+        if _sigma <= 0:
+            raise ValueError("positive value is required for {}, not {}".format(EnvParam.HestonVolOfVol.value,
+                                                                                _sigma))
+        if not -1 <= _corr <= 1:
+            raise ValueError("value within [-1, 1] is required for {}, not {}".format(EnvParam.HestonCorr.value,
+                                                                                      _corr))
+        return dict(kappa=_kappa, theta=_theta ** 2, sigma=_sigma, corr=_corr)
+
+    def _heston_model(self, method_, mkt_dict_):
+        """Heston parameters for simulation with Heston engine, None for Black-Scholes dynamics"""
+        return self._heston_param(mkt_dict_) if method_ in heston_engine else None
+
+    @staticmethod
+    def _heston_nodes(param_):
+        _nodes = param_.get(EngineParam.HestonNodes.value)
+        if not _nodes:
+            raise ValueError("quadrature nodes not specified")
+        if not isinstance(_nodes, int):
+            raise ValueError("type <int> is required for quadrature nodes, not {}".format(type(_nodes)))
+        return _nodes
+
+    @classmethod
+    def _fourier_param(cls, param_, mkt_dict_):
+        """grid size and model of fourier engine, with model parameters beyond market"""
+        _grid = param_.get(EngineParam.FourierGrid.value)
+        if not _grid:
+            raise ValueError("fourier grid not specified")
+        if not isinstance(_grid, int):
+            raise ValueError("type <int> is required for fourier grid, not {}".format(type(_grid)))
+        _model = param_.get(EngineParam.FourierModel.value) or FourierModel.BS.value
+        if _model not in [_m.value for _m in FourierModel]:
+            raise ValueError("invalid fourier model given: {}".format(_model))
+        _res = dict(grid_=_grid, model_=_model)
+        if _model == FourierModel.Heston.value:
+            _res.update(cls._heston_param(mkt_dict_))
+        return _res
+
+    @staticmethod
+    def _smile(mkt_dict_, method_, param_):
+        """vol surface of market, None without one or for Heston models which make their own smile"""
+        _quotes = mkt_dict_.get(EnvParam.UdVolSurface.value)
+        if not _quotes or method_ in heston_engine or (
+                method_ == EngineMethod.Fourier.value and
+                param_.get(EngineParam.FourierModel.value) == FourierModel.Heston.value):
+            return None
+        from utils.vol_surface import VolSurface
+        return VolSurface.from_quotes(_quotes)
+
+    def _smile_vol(self, mkt_dict_, vol_, spot_, method_, param_):
+        """vol of option on market surface at its strike (spot if floating) and maturity, flat vol without one"""
+        _surface = self._smile(mkt_dict_, method_, param_)
+        if _surface is None:
+            return vol_
+        return float(_surface.vol(spot_ if self.strike is None else self.strike, self.maturity))
+
+    @staticmethod
+    def _path_step(param_):
+        _step = param_.get(EngineParam.MCPathStep.value)
+        if not _step:
+            raise ValueError("path step not specified")
+        if not isinstance(_step, int):
+            raise ValueError("type <int> is required for path step, not {}".format(type(_step)))
+        return _step
+
+    @staticmethod
+    def _mc_target(param_):
+        """target standard error and relative tolerance, iteration becomes the path cap once either is given"""
+        _res = dict()
+        for _key, _param in [('target_error_', EngineParam.MCTargetError.value),
+                             ('rel_tolerance_', EngineParam.MCRelTolerance.value)]:
+            _value = param_.get(_param)
+            if _value is not None:
+                if not isinstance(_value, (int, float)) or _value <= 0:
+                    raise ValueError("positive <int> or <float> is required for {}, not {}".format(_param, _value))
+                _res[_key] = _value
+        return _res
+
+    @staticmethod
+    def _mc_seed(param_):
+        _seed = param_.get(EngineParam.MCSeed.value)
+        if _seed is not None and not isinstance(_seed, int):
+            raise ValueError("type <int> is required for random seed, not {}".format(type(_seed)))
+        return _seed
+
     def _prepare_risk_data(self, mkt_dict_, engine_):
         _load_param = [EnvParam.RiskFreeRate.value, EnvParam.UdSpotForPrice.value, EnvParam.UdVolatility.value,
                        EnvParam.UdDivYieldRatio.value]
         _rate, _spot, _vol, _div = tuple(self._load_market(mkt_dict_, _load_param))
         _method, _param = self._load_engine(engine_)
-        _sign = 1 if self.type == InstType.CallOption.value else -1
+        if self.exercise != ExerciseType.European.value and _method != EngineMethod.Lattice.value:
+            raise ValueError("{} exercise requires {} engine, not {}".format(
+                self.exercise, EngineMethod.Lattice.value, _method))
+        _vol = self._smile_vol(mkt_dict_, _vol, _spot, _method, _param)
+        _rate, _div = self._term_rates(mkt_dict_, self.maturity, _rate, _div)
+        _sign = 1 if self.type in call_type else -1
         return _rate, _spot, _vol, _div, _method, _param, _sign, self.strike, self.maturity
 
 
@@ -1,12 +1,22 @@
 # coding=utf-8
 """definition of portfolio for payoff estimation"""
 
-from copy import deepcopy
+from copy import copy, deepcopy
 from enum import Enum
-from instrument import InstType, option_type
+from instrument import ExerciseType, InstType, Instrument, call_type, option_type, vanilla_type
 from instrument.default_param import env_default_param
-from instrument.env_param import EnvParam
-from numpy import arange, transpose
+from instrument.env_param import EngineMethod, EnvParam, mc_engine
+from numpy import arange, array, asarray, concatenate, exp, eye, isnan, linspace, maximum, nan, ones, repeat, \
+    searchsorted, tile, transpose, unique, zeros
+from numpy.random import randint
+from utils.black_scholes import BlackScholes, DAY_PER_YEAR
+from utils.piecewise_linear import PiecewiseLinear
+
+# engines evaluating vanilla legs on all spots in one broadcast call
+analytic_engine = [EngineMethod.BS.value, EngineMethod.Heston.value, EngineMethod.Fourier.value]
+# number of elapsed times in decay cube from today to the last maturity, fewer if portfolio is aged time by time
+decay_frames = 61
+decay_frames_aged = 13
 
 
 class CurveType(Enum):
@@ -17,15 +27,24 @@ class CurveType(Enum):
     PV = 'PV'
     Delta = 'Delta'
     Gamma = 'Gamma'
+    Vega = 'Vega'
+    Theta = 'Theta'
+    Rho = 'Rho'
+
+
+risk_measure = ['pv', 'delta', 'gamma', 'vega', 'theta', 'rho']
 
 
 class Portfolio(object):
     """
     portfolio class
     can estimate all components total payoff
+    components may have different maturities (calendar spreads, rolls)
+    components with identical terms are netted into one leg before evaluation
     """
     def __init__(self, inst_list_):
         self._components = inst_list_
+        self._legs, self._attribution, self._cash = self.compile(inst_list_)
         self._components_show = []
         self._mkt_data = None
         self._engine = None
@@ -39,10 +58,24 @@ class Portfolio(object):
             CurveType.PV.value: ('pv', True),
             CurveType.Delta.value: ('delta', True),
             CurveType.Gamma.value: ('gamma', True),
+            CurveType.Vega.value: ('vega', True),
+            CurveType.Theta.value: ('theta', True),
+            CurveType.Rho.value: ('rho', True),
         }
 
-    def gen_curve(self, type_, margin_=20, step_=1, full_=False):
-        """generate x (spot / ISP) and y (payoff or) for portfolio payoff curve"""
+    def gen_curve(self, type_, margin_=20, step_=1, full_=False, cache_=None):
+        """
+        generate x (spot / ISP) and y (payoff or) for portfolio payoff curve
+        :param cache_: DiskCache for curves needing pricing engine, keyed by legs, market, engine and curve setting
+        """
+        if cache_ is not None and self._func_map[type_][1]:
+            _key = cache_.key(self._cache_content(full_), self.mkt_data, self.engine, type_, margin_, step_)
+            _res = cache_.get(_key)
+            if _res is None:
+                _res = self.gen_curve(type_, margin_, step_, full_)
+                cache_.put(_key, _res)
+            return _res
+
         _curve_func = [self._comp_sum(type_)]
         _engine = self._func_map[type_][1]
         if full_:
@@ -50,6 +83,19 @@ class Portfolio(object):
                 _curve_func.append(_comp.__getattribute__(self._func_map[type_][0]))
 
         _x = self._x_range(margin_, step_)
+        if type_ in [CurveType.Payoff.value, CurveType.NetPayoff.value] and self._vanilla_only(full_):
+            _net = type_ == CurveType.NetPayoff.value
+            _profile = [self.payoff_profile(_net)] + [self._profile([_comp], 0 if _net else None)
+                                                      for _comp in (self._components_show if full_ else [])]
+            return _x, array([_p(_x) for _p in _profile])
+        if _engine and self.engine.get('engine') in analytic_engine and self._vanilla_only(full_):
+            _columns = self._columns(full_)
+            return _x, self._finish_leg_curve(type_, _columns, self._analytic_risk(_x, _columns)[self._measure(type_)])
+        if _engine and self.engine.get('engine') == EngineMethod.PDE.value and self._vanilla_only(full_):
+            return _x, self._grid_curve(type_, _x, self._columns(full_))
+        if _engine and self.engine.get('engine') in mc_engine and self._vanilla_only(full_):
+            return _x, self._path_curve(type_, _x, self._columns(full_))
+
         _y = []
         for _spot in _x:
             _mkt = deepcopy(self.mkt_data)
@@ -59,6 +105,165 @@ class Portfolio(object):
         _y = transpose(_y)
         return _x, _y
 
+    @staticmethod
+    def gen_curves(portfolios_, type_, margin_=20, step_=1):
+        """
+        generate curves of many portfolios, one (x, y) per portfolio as gen_curve without shown components
+        portfolios of vanilla legs on the same market and PDE or simulation engine are evaluated in one pass,
+        one weight column per portfolio on the union of their spots
+        """
+        if not portfolios_:
+            return []
+        _head = portfolios_[0]
+        _method = _head.engine.get('engine')
+        if not _head._func_map[type_][1] or _method not in [EngineMethod.PDE.value] + mc_engine or \
+                not all([_p._vanilla_only(False) and _p.mkt_data == _head.mkt_data and _p.engine == _head.engine
+                         for _p in portfolios_]):
+            return [_p.gen_curve(type_, margin_, step_) for _p in portfolios_]
+
+        _x_list = [_p._x_range(margin_, step_) for _p in portfolios_]
+        _x = unique(concatenate(_x_list))
+        _legs = [_leg for _p in portfolios_ for _leg in _p._legs]
+        _weight = zeros((len(_legs), len(portfolios_)))
+        _start = 0
+        for _idx, _p in enumerate(portfolios_):
+            _weight[_start:_start + len(_p._legs), _idx] = [_leg.unit for _leg in _p._legs]
+            _start += len(_p._legs)
+        _columns = (_legs, _weight, array([nan if _p._cash is None else _p._cash for _p in portfolios_], dtype=float))
+        _y = _head._grid_curve(type_, _x, _columns) if _method == EngineMethod.PDE.value else \
+            _head._path_curve(type_, _x, _columns)
+        return [(_x_p, _y[_idx:_idx + 1, searchsorted(_x, _x_p)]) for _idx, _x_p in enumerate(_x_list)]
+
+    def gen_all_curves(self, margin_=20, step_=1, full_=False, cache_=None, types_=None):
+        """
+        generate every curve type in one pass, all engine curves share one risk evaluation on the spot range
+        net payoff and PnL are left out unless every leg is priced, other curves never read prices
+        :param cache_: DiskCache, all curves are cached together
+        :param types_: curve types required, only their measures are evaluated and missing prices raise,
+            every type if not given
+        :return: dict of curve type to (x, y) as gen_curve
+        """
+        if cache_ is not None:
+            _key = cache_.key(self._cache_content(full_), self.mkt_data, self.engine,
+                              'all' if types_ is None else sorted(types_), margin_, step_)
+            _res = cache_.get(_key)
+            if _res is None:
+                _res = self.gen_all_curves(margin_, step_, full_, types_=types_)
+                cache_.put(_key, _res)
+            return _res
+
+        _priced = types_ is not None or self._priced(full_)
+        _types = [_type for _type in (self._func_map if types_ is None else types_)
+                  if _priced or _type not in [CurveType.NetPayoff.value, CurveType.PnL.value]]
+        _res = {_type: self.gen_curve(_type, margin_, step_, full_) for _type in _types
+                if not self._func_map[_type][1]}
+        _engine_types = [_type for _type in _types if self._func_map[_type][1]]
+        if _engine_types:
+            _x = self._x_range(margin_, step_)
+            _columns = self._columns(full_)
+            _measures = set([self._measure(_type) for _type in _engine_types])
+            _risk = self.evaluate(_x, _columns, [_m for _m in risk_measure if _m in _measures])
+            for _type in _engine_types:
+                _res[_type] = (_x, self._finish_leg_curve(_type, _columns, _risk[self._measure(_type)]))
+        return _res
+
+    def gen_decay_cube(self, margin_=20, step_=1, full_=False, cache_=None, frames_=None):
+        """
+        generate every engine curve on a spot x elapsed time grid, market stays as today while legs age
+        PnL is left out unless every leg is priced, as in gen_all_curves
+        vanilla legs under analytic engines are evaluated for all spots and times in one broadcast call,
+        otherwise the portfolio is aged and evaluated time by time
+        :param cache_: DiskCache, the whole cube is cached together
+        :param frames_: number of elapsed times, decay_frames or decay_frames_aged by default
+        :return: a dict consists with x (spot), elapsed (year) and curves, which maps curve type to an array
+            in shape of (elapsed, line, spot)
+        """
+        if cache_ is not None:
+            _key = cache_.key(self._cache_content(full_), self.mkt_data, self.engine, 'decay', margin_, step_, frames_)
+            _res = cache_.get(_key)
+            if _res is None:
+                _res = self.gen_decay_cube(margin_, step_, full_, frames_=frames_)
+                cache_.put(_key, _res)
+            return _res
+
+        _broadcast = self._vanilla_only(full_) and self.engine.get('engine') in analytic_engine
+        if frames_ is None:
+            frames_ = decay_frames if _broadcast else decay_frames_aged
+        _x = self._x_range(margin_, step_)
+        _elapsed = linspace(0, self._maturity[-1], frames_) if self._maturity else zeros(1)
+        _priced = self._priced(full_)
+        _types = [_type for _type, (_func, _engine) in self._func_map.items()
+                  if _engine and (_priced or _type != CurveType.PnL.value)]
+        if _broadcast:
+            _columns = self._columns(full_)
+            _risk = self._analytic_risk(tile(_x, _elapsed.size), _columns, repeat(_elapsed, _x.size))
+            _curves = {_type: array([self._finish_leg_curve(_type, _columns, _y) for _y in _risk[
+                self._measure(_type)].reshape(_elapsed.size, _x.size, -1)]) for _type in _types}
+        else:
+            _frames = [self._aged(_time).gen_all_curves(margin_, step_, full_) for _time in _elapsed]
+            _curves = {_type: array([_frame[_type][1] for _frame in _frames]) for _type in _types}
+        return dict(x=_x, elapsed=_elapsed, curves=_curves)
+
+    @staticmethod
+    def price_legs(inst_list_, mkt_data_, engine_, cancel_=None):
+        """
+        unit price of every instrument, nan for stocks and for options the engine cannot price
+        european vanilla options are priced together in one Black-Scholes, Heston or Fourier call or on one set
+        of Monte-Carlo paths per smile vol,
+        other options are priced one by one
+        :param cancel_: callable polled between evaluation steps, pricing stops once it returns True
+        :return: array of unit price in order of instruments, or None if cancelled
+        """
+        from instrument.option import Option
+        _method, _param = engine_.get('engine'), engine_.get('param', {})
+        _res = zeros(len(inst_list_)) + nan
+        _option = [_i for _i, _inst in enumerate(inst_list_) if _inst.type in option_type]
+        _batch = [_i for _i in _option if inst_list_[_i].type in vanilla_type
+                  and inst_list_[_i].exercise == ExerciseType.European.value] \
+            if _method in analytic_engine + [EngineMethod.MC.value] else []
+        if _batch:
+            _rate, _spot, _vol, _div = tuple(Instrument._load_market(mkt_data_, [
+                EnvParam.RiskFreeRate.value, EnvParam.UdSpotForPrice.value, EnvParam.UdVolatility.value,
+                EnvParam.UdDivYieldRatio.value]))
+            _sign = array([1 if inst_list_[_i].type in call_type else -1 for _i in _batch])
+            _strike = array([inst_list_[_i].strike for _i in _batch], dtype=float)
+            _t = array([inst_list_[_i].maturity for _i in _batch], dtype=float)
+            _rate, _div = tuple(zeros(len(_batch)) + _r for _r in Instrument._term_rates(mkt_data_, _t, _rate, _div))
+            _surface = Option._smile(mkt_data_, _method, _param)
+            _vol = _vol if _surface is None else _surface.vol(_strike, _t)
+            if _method == EngineMethod.BS.value:
+                _price = BlackScholes.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol,
+                                            t=_t)
+            elif _method == EngineMethod.Heston.value:
+                from utils.heston import Heston
+                _price = Heston.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t,
+                                      nodes=Option._heston_nodes(_param), **Option._heston_param(mkt_data_))
+            elif _method == EngineMethod.Fourier.value:
+                from utils.fourier import Fourier
+                _price = Fourier.price(sign=_sign, isp=_spot, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t,
+                                       **Option._fourier_param(_param, mkt_data_))
+            else:
+                from utils.monte_carlo import MonteCarlo
+                _vol, _price = zeros(len(_batch)) + _vol, zeros(len(_batch))
+                for _leg_vol in unique(_vol):
+                    _mask = _vol == _leg_vol
+                    _part = MonteCarlo.vanilla_prices(Option._mc_iteration(_param), _sign[_mask], _strike[_mask],
+                                                      _t[_mask], Option._mc_seed(_param), cancel_, isp=_spot,
+                                                      rate=_rate[_mask], div=_div[_mask], vol=_leg_vol)
+                    if _part is None:
+                        return None
+                    _price[_mask] = _part
+            _res[_batch] = _price
+
+        for _i in sorted(set(_option) - set(_batch)):
+            if cancel_ is not None and cancel_():
+                return None
+            try:
+                _res[_i] = inst_list_[_i].pv(mkt_data_, engine_, unit_=1)
+            except ValueError:
+                pass
+        return _res
+
     def set_show(self, inst_show_):
         """set components that be plotted with portfolio"""
         self._components_show = list(set(inst_show_) - set(self._components))
@@ -71,8 +276,68 @@ class Portfolio(object):
         """set pricing engine"""
         self.engine = engine_
 
+    @staticmethod
+    def compile(inst_list_):
+        """
+        net instruments with identical terms into one leg and drop legs of zero net unit
+        the net leg is priced at unit weighted average cost, premium of dropped legs is kept as cash
+        prices are only needed for net payoff and pnl, so a net leg of any unpriced source is left unpriced
+        :return: net legs, source instruments of every net leg, cash paid for dropped legs (None if unpriced)
+        """
+        _group = {}
+        for _inst in inst_list_:
+            _group.setdefault(_inst.net_key(), []).append(_inst)
+        _legs, _attribution, _cash = [], [], 0
+        for _source in _group.values():
+            _unit = sum([_inst.unit for _inst in _source])
+            _cost = sum([_inst.unit * _inst.price for _inst in _source]) \
+                if all([_inst._price is not None for _inst in _source]) else None
+            if _unit == 0:
+                _cash = None if _cash is None or _cost is None else _cash + _cost
+                continue
+            if len(_source) == 1:
+                _leg = _source[0]
+            else:
+                _leg = copy(_source[0])
+                _leg.unit = _unit
+                _leg._price = None if _cost is None else _cost / _unit
+            _legs.append(_leg)
+            _attribution.append(_source)
+        return _legs, _attribution, _cash
+
+    def payoff_profile(self, net_=False):
+        """
+        exact payoff (or net payoff) as piecewise linear function of spot with kinks at strikes
+        break-even points, max profit and max loss follow from roots, maximum and minimum of the function
+        :return: PiecewiseLinear, or None if portfolio holds path-dependent options
+        """
+        return self._profile(self._legs, self._net_cash() if net_ else None)
+
+    def components(self):
+        """return all components of portfolio"""
+        return self._components
+
+    def legs(self):
+        """return net legs of portfolio used for evaluation"""
+        return self._legs
+
+    def attribution(self):
+        """
+        return pairs of net leg and its source components
+        values are linear in unit, so share of a source component is its unit over unit of the net leg
+        """
+        return list(zip(self._legs, self._attribution))
+
+    def cash(self):
+        """return premium paid for components netted to zero unit, None if any of them is unpriced"""
+        return self._cash
+
     def maturity(self):
-        """return common maturity of portfolio"""
+        """return longest maturity of portfolio"""
+        return self._maturity[-1] if self._maturity else 0
+
+    def maturities(self):
+        """return all distinct maturities of portfolio in increasing order"""
         return self._maturity
 
     def center(self):
@@ -106,23 +371,343 @@ class Portfolio(object):
         self._engine = engine_
 
     def _comp_sum(self, value_type_):
+        _cash = self._net_cash() if value_type_ in [CurveType.NetPayoff.value, CurveType.PnL.value] else 0
+
         def _sum_func(*args):
-            return sum([_comp.__getattribute__(self._func_map[value_type_][0])(*args) for _comp in self._components])
+            return sum([_leg.__getattribute__(self._func_map[value_type_][0])(*args) for _leg in self._legs]) - _cash
         return _sum_func
 
+    def evaluate(self, x_, columns_, measures_=None):
+        """
+        evaluate risk of every line on given spots in the fastest pass the engine and legs allow
+        :param columns_: legs, leg x line weight matrix and cash of every line, legs need not be of portfolio
+        :param measures_: risk measures required, all if not given
+        :return: dict of risk measure to array in shape of (spot, line)
+        """
+        _vanilla = all([_leg.type in vanilla_type or _leg.type == InstType.Stock.value for _leg in columns_[0]])
+        _method = self.engine.get('engine')
+        if _vanilla and _method in analytic_engine:
+            return self._analytic_risk(x_, columns_)
+        if _vanilla and _method == EngineMethod.PDE.value:
+            return self._grid_risk(x_, columns_, measures_ is None or bool(set(measures_) & {'vega', 'rho'}))
+        if _vanilla and _method in mc_engine:
+            return self._path_risk(x_, columns_, measures_ or risk_measure)
+        return self._spot_risk(x_, columns_, measures_)
+
+    def leg_risk(self, x_, legs_, measures_=None):
+        """
+        evaluate risk of every given leg in unit of 1 on given spots, legs need not be of portfolio
+        vanilla legs under analytic engines skip the weight matrix, so thousands of legs cost one broadcast call
+        :return: dict of risk measure to array in shape of (spot, leg)
+        """
+        _vanilla = all([_leg.type in vanilla_type or _leg.type == InstType.Stock.value for _leg in legs_])
+        if not (_vanilla and self.engine.get('engine') in analytic_engine):
+            return self.evaluate(x_, (legs_, eye(len(legs_)), zeros(len(legs_))), measures_)
+        _res = {_key: zeros((x_.size, len(legs_))) for _key in risk_measure}
+        _stock = [_i for _i, _leg in enumerate(legs_) if _leg.type == InstType.Stock.value]
+        _res['pv'][:, _stock] = x_[:, None]
+        _res['delta'][:, _stock] = 1
+        _idx = [_i for _i, _leg in enumerate(legs_) if _leg.type in option_type]
+        for _key, _value in self._analytic_leg_risk(x_, legs_, _idx).items():
+            _res[_key][:, _idx] = _value
+        return _res
+
+    def x_range(self, margin_=20, step_=1):
+        """spots of portfolio curves, covering all key levels with margin around center"""
+        return self._x_range(margin_, step_)
+
+    def _grid_curve(self, type_, x_, columns_):
+        """solve all legs of one maturity together on the PDE grid, one column per plotted line"""
+        _measure = self._measure(type_)
+        return self._finish_leg_curve(type_, columns_, self._grid_risk(x_, columns_, _measure in ['vega', 'rho'])[
+            _measure])
+
+    def _path_curve(self, type_, x_, columns_):
+        """value every leg off the time slice of its maturity from one shared multi-step simulation"""
+        _measure = self._measure(type_)
+        return self._finish_leg_curve(type_, columns_, self._path_risk(x_, columns_, [_measure])[_measure])
+
+    def _grid_risk(self, x_, columns_, greeks_):
+        from instrument.option import Option
+        from utils.finite_difference import FiniteDifference
+        _legs, _weight, _cash = columns_
+        _rate, _vol, _div = self._market()
+        _param = Option._pde_param(self.engine.get('param', {}))
+        _res = self._stock_risk(x_, columns_)
+        _vols = zeros(len(_legs)) + self._leg_vols(_legs, _vol)
+        # one grid per maturity and vol, legs on a smile only share it with legs of the same vol
+        for _maturity, _leg_vol in set([(_leg.maturity, _vols[_i]) for _i, _leg in enumerate(_legs)
+                                        if _leg.type in option_type]):
+            _idx = [_i for _i, _leg in enumerate(_legs) if _leg.type in option_type and _leg.maturity == _maturity
+                    and _vols[_i] == _leg_vol]
+            self._check_exercise(_legs, _idx)
+            _leg_rate, _leg_div = Instrument._term_rates(self.mkt_data, _maturity, _rate, _div)
+            _risk = FiniteDifference.risk(
+                isp=x_, sign=[1 if _legs[_i].type == InstType.CallOption.value else -1 for _i in _idx],
+                strike=[_legs[_i].strike for _i in _idx], weight=_weight[_idx], rate=_leg_rate, div=_leg_div,
+                vol=_leg_vol, t=_maturity, greeks_=greeks_, **_param)
+            for _key, _value in _risk.items():
+                _res[_key] += _value
+        return _res
+
+    def _path_risk(self, x_, columns_, measures_):
+        """
+        value legs on simulated growth factors of spot 1, which scale to any spot under both Black-Scholes and
+        Heston dynamics, every bump reuses the same random numbers
+        legs on a smile are valued on growth factors of their own vol, on rate curves paths grow at forward rates
+        """
+        from instrument.option import Option
+        from utils.monte_carlo import MonteCarlo
+        _legs, _weight, _cash = columns_
+        _rate, _vol, _div = self._market()
+        _param = self.engine.get('param', {})
+        _iteration = Option._mc_iteration(_param)
+        _option = [_i for _i, _leg in enumerate(_legs) if _leg.type in option_type]
+        self._check_exercise(_legs, _option)
+        _times = sorted(set([_legs[_i].maturity for _i in _option]))
+        if self.engine.get('engine') == EngineMethod.HestonMC.value:
+            from utils.heston import Heston
+            _heston, _step = Option._heston_param(self.mkt_data), Option._path_step(_param)
+            _seed = Option._mc_seed(_param)
+            _seed = randint(2 ** 31) if _seed is None else _seed
+
+            def _slices(times_, rate_, div_, vol_):
+                return Heston.stock_slices(_iteration, times_, _step, _seed, isp=1, rate=rate_, div=div_, vol=vol_,
+                                           **_heston)
+        else:
+            _rand = MonteCarlo.normal((len(_times), _iteration), Option._mc_seed(_param))
+
+            def _slices(times_, rate_, div_, vol_):
+                return MonteCarlo.stock_slices(_iteration, times_, isp=1, rate=rate_, div=div_, vol=vol_, rand=_rand)
+
+        _vols = zeros(len(_legs)) + self._leg_vols(_legs, _vol)
+
+        def _value(isp_, drate_=0., dvol_=0., shift_=0.):
+            _res = zeros((isp_.size, _weight.shape[1]))
+            _shifted = array([max(_t - shift_, 0) for _t in _times])
+            _rates, _divs = Instrument._term_rates(self.mkt_data, _shifted, _rate, _div)
+            _rates = _rates + drate_
+            _discount = exp(-(zeros(len(_times)) + _rates) * _shifted)
+            for _leg_vol in sorted(set(_vols[_option].tolist())):
+                _growth = _slices(_shifted, _rates, _divs, max(_leg_vol + dvol_, 0))
+                for _slice, _t in enumerate(_times):
+                    _idx = [_i for _i in _option if _legs[_i].maturity == _t and _vols[_i] == _leg_vol]
+                    if not _idx:
+                        continue
+                    _payoff = MonteCarlo.vanilla_value(
+                        _growth[_slice], isp_,
+                        [1 if _legs[_i].type == InstType.CallOption.value else -1 for _i in _idx],
+                        [_legs[_i].strike for _i in _idx])
+                    _res += _payoff @ _weight[_idx] * _discount[_slice]
+            return _res
+
+        _res = self._stock_risk(x_, columns_)
+        if _times:
+            _up, _down = x_ + maximum(x_, 1) * 0.01, maximum(x_ - maximum(x_, 1) * 0.01, 0)
+            _mid = _value(x_) if set(measures_) & {'pv', 'gamma', 'theta'} else None
+            _shift = (_value(_up), _value(_down)) if set(measures_) & {'delta', 'gamma'} else None
+            for _measure in measures_:
+                if _measure == 'pv':
+                    _res['pv'] += _mid
+                elif _measure == 'delta':
+                    _res['delta'] += (_shift[0] - _shift[1]) / (_up - _down)[:, None]
+                elif _measure == 'gamma':
+                    _res['gamma'] += ((_shift[0] - _mid) / (_up - x_)[:, None] - (_mid - _shift[1]) / maximum(
+                        x_ - _down, 10 ** -8)[:, None] * (x_ > _down)[:, None]) / (_up - _down)[:, None] * 2
+                elif _measure == 'vega':
+                    _res['vega'] += (_value(x_, dvol_=0.01) - _value(x_, dvol_=-0.01)) / 2
+                elif _measure == 'theta':
+                    _res['theta'] += _value(x_, shift_=1 / DAY_PER_YEAR) - _mid
+                elif _measure == 'rho':
+                    _res['rho'] += (_value(x_, drate_=0.01) - _value(x_, drate_=-0.01)) / 2
+        return _res
+
+    def _analytic_risk(self, x_, columns_, elapsed_=0.):
+        """
+        evaluate all legs on all spots in one broadcast call of Black-Scholes, Heston or Fourier engine
+        :param elapsed_: time passed since today, for all spots or one per spot
+        """
+        _legs, _weight, _cash = columns_
+        _res = self._stock_risk(x_, columns_)
+        _idx = [_i for _i, _leg in enumerate(_legs) if _leg.type in option_type]
+        for _key, _value in self._analytic_leg_risk(x_, _legs, _idx, elapsed_).items():
+            _res[_key] += _value @ _weight[_idx]
+        return _res
+
+    def _analytic_leg_risk(self, x_, legs_, idx_, elapsed_=0.):
+        """risk of option legs of given indices in unit of 1, in shape of (spot, leg)"""
+        _rate, _vol, _div = self._market()
+        _risk_func, _kwargs = self._analytic_engine(legs_, idx_)
+        if not idx_:
+            return {}
+        # smile and curves are looked up at remaining maturity of every spot and elapsed time, as aged legs are
+        _t = maximum(array([legs_[_i].maturity for _i in idx_], dtype=float)[None, :] -
+                     (zeros(x_.shape) + elapsed_)[:, None], 0)
+        _rate, _div = Instrument._term_rates(self.mkt_data, _t, _rate, _div)
+        return _risk_func(
+            sign=array([1 if legs_[_i].type in call_type else -1 for _i in idx_])[None, :], isp=x_[:, None],
+            strike=array([legs_[_i].strike for _i in idx_], dtype=float)[None, :], rate=_rate, div=_div,
+            vol=self._leg_vols([legs_[_i] for _i in idx_], _vol, _t), t=_t, **_kwargs)
+
+    def _analytic_engine(self, legs_, option_idx_):
+        """risk function and its engine keywords, early exercise requires lattice engine as Option.pv does"""
+        from instrument.option import Option
+        _method, _param = self.engine.get('engine'), self.engine.get('param', {})
+        self._check_exercise(legs_, option_idx_)
+        if _method == EngineMethod.BS.value:
+            return BlackScholes.risk, dict()
+        if _method == EngineMethod.Heston.value:
+            from utils.heston import Heston
+            return Heston.risk, dict(nodes=Option._heston_nodes(_param), **Option._heston_param(self.mkt_data))
+        from utils.fourier import Fourier
+        return Fourier.risk, Option._fourier_param(_param, self.mkt_data)
+
+    def _check_exercise(self, legs_, option_idx_):
+        """engines solving legs together price european exercise only, early exercise requires lattice engine"""
+        for _i in option_idx_:
+            if legs_[_i].exercise != ExerciseType.European.value:
+                raise ValueError("{} exercise requires {} engine, not {}".format(
+                    legs_[_i].exercise, EngineMethod.Lattice.value, self.engine.get('engine')))
+
+    def _leg_vols(self, legs_, vol_, t_=None):
+        """
+        vol of every leg on market smile at its strike and maturity, looked up for the whole book at once
+        vols are sticky strike so all spots of a curve share them, flat vol is returned as it is without a smile
+        :param t_: remaining maturities in shape of (..., leg) to look smile up at, maturities of legs if not given
+        """
+        from instrument.option import Option
+        _engine = self._engine or {}
+        _surface = Option._smile(self.mkt_data, _engine.get('engine'), _engine.get('param', {}))
+        if _surface is None:
+            return vol_
+        _idx = [_i for _i, _leg in enumerate(legs_) if _leg.type in option_type]
+        _t = array([_leg.maturity or 0 for _leg in legs_], dtype=float) if t_ is None else asarray(t_, dtype=float)
+        _res = zeros(_t.shape) + vol_
+        _res[..., _idx] = _surface.vol(
+            array([self._center if legs_[_i].strike is None else legs_[_i].strike for _i in _idx], dtype=float),
+            _t[..., _idx])
+        return _res
+
+    def _spot_risk(self, x_, columns_, measures_=None):
+        _legs, _weight, _cash = columns_
+        _measures = measures_ or risk_measure
+        _res = {_key: zeros((x_.size, _weight.shape[1])) for _key in risk_measure}
+        for _row, _spot in enumerate(x_):
+            _mkt = deepcopy(self.mkt_data)
+            _mkt[EnvParam.UdSpotForPrice.value] = _spot
+            _risk = [_leg.risk(_mkt, self.engine, unit_=1, measures_=_measures) for _leg in _legs]
+            for _key in _measures:
+                _res[_key][_row] = array([_r[_key] for _r in _risk]) @ _weight
+        return _res
+
+    def _aged(self, elapsed_):
+        """copy of portfolio after given time, every option leg and shown component is closer to its maturity"""
+        def _age(inst_):
+            if inst_.type not in option_type:
+                return inst_
+            _inst = copy(inst_)
+            _inst.maturity = max(inst_.maturity - elapsed_, 0)
+            return _inst
+
+        _res = copy(self)
+        _res._legs = [_age(_leg) for _leg in self._legs]
+        _res._components_show = [_age(_comp) for _comp in self._components_show]
+        return _res
+
+    def _columns(self, full_):
+        """legs, leg x line weight matrix and cash of every line (portfolio, then shown components)"""
+        _show = self._components_show if full_ else []
+        _legs = self._legs + _show
+        _weight = zeros((len(_legs), 1 + len(_show)))
+        _weight[:len(self._legs), 0] = [_leg.unit for _leg in self._legs]
+        for _idx, _comp in enumerate(_show):
+            _weight[len(self._legs) + _idx, 1 + _idx] = _comp.unit
+        _cash = zeros(_weight.shape[1])
+        _cash[0] = nan if self._cash is None else self._cash
+        return _legs, _weight, _cash
+
+    def _net_cash(self):
+        if self._cash is None:
+            raise ValueError("price of components netted to zero unit not specified")
+        return self._cash
+
+    def check_price(self, full_=False):
+        """raise ValueError if a leg or shown component misses the price that net payoff and PnL curves need"""
+        _missing = [_leg for _leg in self._legs + (self._components_show if full_ else []) if _leg._price is None]
+        if _missing:
+            raise ValueError("{} price not specified".format(_missing[0]._name))
+        self._net_cash()
+
+    def _priced(self, full_):
+        try:
+            self.check_price(full_)
+        except ValueError:
+            return False
+        return True
+
+    def _measure(self, type_):
+        return 'pv' if type_ == CurveType.PnL.value else self._func_map[type_][0]
+
+    def _market(self):
+        _load_param = [EnvParam.RiskFreeRate.value, EnvParam.UdVolatility.value, EnvParam.UdDivYieldRatio.value]
+        return tuple(Instrument._load_market(self.mkt_data, _load_param))
+
+    @staticmethod
+    def _stock_risk(x_, columns_):
+        _legs, _weight, _cash = columns_
+        _res = {_key: zeros((x_.size, _weight.shape[1])) for _key in risk_measure}
+        _stock = array([_leg.type == InstType.Stock.value for _leg in _legs], dtype=bool)
+        if _stock.any():
+            _unit = _weight[_stock].sum(axis=0, keepdims=True)
+            _res['pv'] += x_[:, None] @ _unit
+            _res['delta'] += ones((x_.size, 1)) @ _unit
+        return _res
+
+    @staticmethod
+    def _finish_leg_curve(type_, columns_, y_):
+        _legs, _weight, _cash = columns_
+        if type_ == CurveType.PnL.value:
+            if isnan(_cash).any():
+                raise ValueError("price of components netted to zero unit not specified")
+            if _legs:
+                y_ = y_ - array([_leg.price for _leg in _legs]) @ _weight
+            y_ = y_ - _cash
+        return transpose(y_)
+
+    @staticmethod
+    def _profile(legs_, cash_=None):
+        if not all([_leg.type in vanilla_type or _leg.type == InstType.Stock.value for _leg in legs_]):
+            return None
+        _option = [_leg for _leg in legs_ if _leg.type in vanilla_type]
+        _unit = array([_leg.unit for _leg in _option], dtype=float)
+        _strike = array([_leg.strike for _leg in _option], dtype=float)
+        _put = array([_leg.type not in call_type for _leg in _option], dtype=bool)
+        _stock = sum([_leg.unit for _leg in legs_ if _leg.type == InstType.Stock.value])
+        _profile = PiecewiseLinear.from_kinks(
+            (_unit * _strike)[_put].sum(), _stock - _unit[_put].sum(), _strike, _unit)
+        if cash_ is not None:
+            _profile = _profile.shift(-sum([_leg.unit * _leg.price for _leg in legs_]) - cash_)
+        return _profile
+
+    def _cache_content(self, full_):
+        _legs = [(_leg.net_key(), _leg.unit, _leg._price) for _leg in self._legs]
+        _show = [(_comp.net_key(), _comp.unit, _comp._price) for _comp in (self._components_show if full_ else [])]
+        return _legs, _show, self._cash
+
+    def _vanilla_only(self, full_):
+        _legs = self._legs + (self._components_show if full_ else [])
+        return all([_leg.type in vanilla_type or _leg.type == InstType.Stock.value for _leg in _legs])
+
     def _x_range(self, margin_, step_):
-        _strike_list = [_comp.strike for _comp in self._components if _comp.type in option_type]
-        _min = min(_strike_list) if _strike_list else self._center
-        _max = max(_strike_list) if _strike_list else self._center
+        _level_list = [_level for _comp in self._components for _level in _comp.key_levels()]
+        _min = min(_level_list) if _level_list else self._center
+        _max = max(_level_list) if _level_list else self._center
         _dist = max([self._center - _min, _max - self._center])
         _x = arange(max(self._center - _dist - margin_, 0), self._center + _dist + margin_ + step_, step_)
         return _x
 
     def _check_maturity(self):
-        _maturity = set([_comp.maturity for _comp in self._components if _comp.type in option_type])
-        if len(_maturity) > 1:
-            raise ValueError("maturity of all components should be same")
-        return _maturity.pop() if len(_maturity) == 1 else 0
+        return sorted(set([_comp.maturity for _comp in self._components if _comp.type in option_type]))
 
     def _check_stock(self):
         return len(list(filter(lambda x: x.type == InstType.Stock.value, self._components))) > 0
@@ -34,3 +34,10 @@ class Stock(Instrument):
         """no gamma calc needed for stock"""
         _unit = unit_ or self.unit
         return 0 * _unit
+
+    def risk(self, mkt_dict_, engine_, unit_=None, measures_=None):
+        """stock risk is linear in spot"""
+        _unit = unit_ or self.unit
+        _spot = self._load_market(mkt_dict_, [EnvParam.UdSpotForPrice.value])[0]
+        return dict(pv=_spot * _unit, delta=1 * _unit, gamma=0 * _unit, vega=0 * _unit, theta=0 * _unit,
+                    rho=0 * _unit)
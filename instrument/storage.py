@@ -0,0 +1,306 @@
+# coding=utf-8
+"""
+compact binary portfolio file (book)
+a small json header (env, columns, curves) followed by 64-byte aligned leg records and curve arrays
+leg records and curves are memory-mapped on loading, so nothing is read or copied until used
+json portfolio files can be streamed leg by leg into leg records as well
+"""
+
+from gui.figure import PlotParam
+from instrument import AverageType, BarrierType, ExerciseType, InstParam, InstType, LookbackType
+from json import JSONDecodeError, JSONDecoder, dumps, loads
+from numpy import dtype, empty, isnan, memmap, nan, prod
+from os import stat
+from re import compile as re_compile
+from struct import calcsize, pack, unpack
+
+book_magic = b'OPTBOOK1'
+book_align = 64
+no_code = 255
+json_space = re_compile(r'\s*')
+# characters a json number may go on with, a number cut at buffer end may decode from a valid prefix
+json_number_char = re_compile(r'[0-9.eE+-]*')
+
+# (column, dtype, instrument parameter, code table for enum parameters)
+book_col = [
+    ('type', 'u1', InstParam.InstType.value, [_t.value for _t in InstType]),
+    ('unit', '<f8', InstParam.InstUnit.value, None),
+    ('price', '<f8', InstParam.InstCost.value, None),
+    ('strike', '<f8', InstParam.OptionStrike.value, None),
+    ('maturity', '<f8', InstParam.OptionMaturity.value, None),
+    ('exercise', 'u1', InstParam.OptionExercise.value, [_e.value for _e in ExerciseType]),
+    ('monitor', '<f8', InstParam.PathMonitor.value, None),
+    ('barrier_type', 'u1', InstParam.BarrierType.value, [_b.value for _b in BarrierType]),
+    ('barrier', '<f8', InstParam.BarrierLevel.value, None),
+    ('rebate', '<f8', InstParam.BarrierRebate.value, None),
+    ('average_type', 'u1', InstParam.AverageType.value, [_a.value for _a in AverageType]),
+    ('lookback_type', 'u1', InstParam.LookbackType.value, [_l.value for _l in LookbackType]),
+    ('show', 'u1', PlotParam.Show.value, [False, True]),
+]
+
+leg_dtype = dtype([(_col[0], _col[1]) for _col in book_col])
+code_index = [None if _col[3] is None else {_value: _idx for _idx, _value in enumerate(_col[3])} for _col in book_col]
+
+
+def to_records(data_):
+    """convert leg dicts of json schema into structured leg records"""
+    _records = empty(len(data_), dtype=leg_dtype)
+    for (_name, _type, _param, _code), _index in zip(book_col, code_index):
+        _column = [_leg.get(_param) for _leg in data_]
+        if _index is None:
+            _records[_name] = [nan if _value is None else _value for _value in _column]
+        else:
+            _records[_name] = [no_code if _value is None else _index[_value] for _value in _column]
+    return _records
+
+
+def to_record(leg_):
+    """convert one leg dict of json schema into a tuple of leg record fields"""
+    return tuple([(nan if _value is None else _value) if _index is None else
+                  (no_code if _value is None else _index[_value])
+                  for _value, _index in zip([leg_.get(_col[2]) for _col in book_col], code_index)])
+
+
+def from_records(records_, extra_=None):
+    """
+    convert structured leg records back into leg dicts of json schema, one leg at a time
+    :param extra_: dict of row index to parameters not held in columns (e.g. bermudan exercise times)
+    """
+    _columns = [(records_[_name], _param, _code) for _name, _type, _param, _code in book_col]
+    for _row in range(len(records_)):
+        _leg = dict()
+        for _column, _param, _code in _columns:
+            _value = _column[_row]
+            if _code is None:
+                if not isnan(_value):
+                    _leg[_param] = int(_value) if _value % 1 == 0 else float(_value)
+            elif _value != no_code:
+                _leg[_param] = _code[_value]
+        _leg.update((extra_ or {}).get(_row, {}))
+        yield _leg
+
+
+def save_book(file_path_, data_, env_, curves_=None, extra_=None):
+    """
+    write legs (json schema dicts or leg records), env and optional computed curves into a book file
+    :param curves_: dict of curve name to 2-d float array, e.g. stacked x and y of a generated curve
+    :param extra_: parameters not held in columns for leg records, taken from leg dicts otherwise
+    """
+    if getattr(data_, 'dtype', None) == leg_dtype:
+        _records, _extra = data_, extra_ or {}
+    else:
+        _records = to_records(data_)
+        _extra = {_row: {InstParam.OptionExerciseTimes.value: list(_leg[InstParam.OptionExerciseTimes.value])}
+                  for _row, _leg in enumerate(data_) if _leg.get(InstParam.OptionExerciseTimes.value)}
+    _blocks = [_records.tobytes()]
+    _curves = []
+    for _name, _curve in (curves_ or {}).items():
+        _curve = _curve.astype('<f8')
+        _curves.append(dict(name=_name, shape=list(_curve.shape)))
+        _blocks.append(_curve.tobytes())
+
+    _header = dict(env=env_, dtype=leg_dtype.descr, count=len(_records), offset=0, curves=_curves,
+                   extra={str(_row): _value for _row, _value in _extra.items()})
+    # every offset written into header later takes less than one alignment block
+    _offset = _align(len(book_magic) + calcsize('<Q') + len(dumps(_header)) + book_align * len(_blocks))
+    _offsets = []
+    for _block in _blocks:
+        _offsets.append(_offset)
+        _offset = _align(_offset + len(_block))
+    _header['offset'] = _offsets[0]
+    for _curve, _position in zip(_curves, _offsets[1:]):
+        _curve['offset'] = _position
+    _text = dumps(_header).encode()
+
+    with open(file_path_, 'wb') as f:
+        f.write(book_magic + pack('<Q', len(_text)) + _text)
+        for _block, _position in zip(_blocks, _offsets):
+            f.seek(_position)
+            f.write(_block)
+
+
+def load_book(file_path_):
+    """
+    open a book file without reading legs and curves into memory
+    :return: leg records (memory-mapped), env, curves (dict of memory-mapped arrays), extra leg parameters
+    """
+    with open(file_path_, 'rb') as f:
+        if f.read(len(book_magic)) != book_magic:
+            raise ValueError("{} is not a portfolio book file".format(file_path_))
+        _size = unpack('<Q', f.read(calcsize('<Q')))[0]
+        _header = loads(f.read(_size).decode())
+
+    _dtype = dtype([tuple(_field) for _field in _header['dtype']])
+    if _dtype != leg_dtype:
+        raise ValueError("unsupported leg columns in {}".format(file_path_))
+    _records = _map(file_path_, leg_dtype, _header['offset'], (_header['count'], ))
+    _curves = {_c['name']: _map(file_path_, dtype('<f8'), _c['offset'], tuple(_c['shape'])) for _c in _header['curves']}
+    _extra = {int(_row): _value for _row, _value in _header['extra'].items()}
+    return _records, _header['env'], _curves, _extra
+
+
+def json_to_book(json_path_, book_path_):
+    """
+    convert a json portfolio file into a book file, legs are streamed and invalid legs are skipped
+    :return: row index and error message of every skipped leg
+    """
+    _reader = JsonPortfolioReader(json_path_)
+    _builder = BookBuilder()
+    for _leg in _reader.legs():
+        _builder.add(_leg)
+    save_book(book_path_, _builder.records(), _reader.header.get('env'), extra_=_builder.extra())
+    return _builder.errors()
+
+
+def book_to_json(book_path_, json_path_):
+    """convert a book file into a json portfolio file"""
+    _records, _env, _curves, _extra = load_book(book_path_)
+    with open(json_path_, 'w') as f:
+        f.write(dumps(dict(data=list(from_records(_records, _extra)), env=_env), indent=4))
+
+
+def _map(file_path_, dtype_, offset_, shape_):
+    if not prod(shape_):
+        return empty(shape_, dtype=dtype_)
+    return memmap(file_path_, dtype=dtype_, mode='r', offset=offset_, shape=shape_)
+
+
+def _align(offset_):
+    return -(-offset_ // book_align) * book_align
+
+
+class BookBuilder(object):
+    """
+    collect legs one at a time into growing leg records
+    every leg is validated on its own, invalid legs are skipped and reported with their row index
+    """
+    def __init__(self, capacity_=1024):
+        self._records = empty(capacity_, dtype=leg_dtype)
+        self._size = 0
+        self._extra = {}
+        self._errors = []
+        self._row = 0
+
+    def add(self, leg_):
+        """validate and append one leg dict of json schema, return if the leg is accepted"""
+        from instrument import Instrument
+        _row = self._row
+        self._row += 1
+        try:
+            if not isinstance(leg_, dict):
+                raise ValueError("leg should be a dict, not {}".format(type(leg_)))
+            Instrument.get_inst(leg_)
+            _record = to_record(leg_)
+        except (ValueError, KeyError, TypeError) as e:
+            self._errors.append((_row, str(e)))
+            return False
+
+        if self._size == self._records.size:
+            _records = empty(self._records.size * 2, dtype=leg_dtype)
+            _records[:self._size] = self._records
+            self._records = _records
+        self._records[self._size] = _record
+        if leg_.get(InstParam.OptionExerciseTimes.value):
+            self._extra[self._size] = {
+                InstParam.OptionExerciseTimes.value: list(leg_[InstParam.OptionExerciseTimes.value])}
+        self._size += 1
+        return True
+
+    def records(self):
+        """accepted legs as leg records"""
+        return self._records[:self._size]
+
+    def extra(self):
+        """parameters of accepted legs not held in columns"""
+        return self._extra
+
+    def errors(self):
+        """row index and error message of every rejected leg"""
+        return self._errors
+
+
+class JsonPortfolioReader(object):
+    """
+    stream a json portfolio file ({"data": [leg, ...], "env": {...}}) chunk by chunk
+    legs of the data array are decoded and yielded one at a time, other top-level values are kept in header
+    """
+    def __init__(self, file_path_, chunk_=2 ** 16):
+        self._file_path = file_path_
+        self._chunk = chunk_
+        self._total = stat(file_path_).st_size
+        self._read = 0
+        self.header = dict()
+
+    def progress(self):
+        """fraction of file read so far"""
+        return self._read / self._total if self._total else 1.
+
+    def legs(self):
+        """generator of leg dicts in file order"""
+        _decoder = JSONDecoder()
+        with open(self._file_path) as f:
+            _stream = _TextStream(f, self._chunk, self._count)
+            _stream.expect('{')
+            while not _stream.accept('}'):
+                _key = _stream.decode(_decoder)
+                _stream.expect(':')
+                if _key == 'data' and _stream.accept('['):
+                    while not _stream.accept(']'):
+                        yield _stream.decode(_decoder)
+                        _stream.accept(',')
+                else:
+                    self.header[_key] = _stream.decode(_decoder)
+                _stream.accept(',')
+
+    def _count(self, size_):
+        self._read += size_
+
+
+class _TextStream(object):
+    def __init__(self, file_, chunk_, callback_):
+        self._file = file_
+        self._chunk = chunk_
+        self._callback = callback_
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        _text = self._file.read(self._chunk)
+        self._callback(len(_text))
+        self._buffer = self._buffer[self._pos:] + _text
+        self._pos = 0
+        self._eof = not _text
+
+    def _peek(self):
+        while True:
+            self._pos = json_space.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos:self._pos + 1]
+            self._fill()
+
+    def accept(self, char_):
+        if self._peek() == char_:
+            self._pos += 1
+            return True
+        return False
+
+    def expect(self, char_):
+        if not self.accept(char_):
+            raise ValueError("invalid json portfolio: '{}' expected, not '{}'".format(char_, self._peek()))
+
+    def decode(self, decoder_):
+        self._peek()
+        while True:
+            try:
+                _value, _end = decoder_.raw_decode(self._buffer, self._pos)
+                # a number cut at buffer end still decodes, e.g. '1.' as 1, so it needs a following character
+                _tail = json_number_char.match(self._buffer, _end).end() \
+                    if isinstance(_value, (int, float)) and not isinstance(_value, bool) else _end
+                if _tail < len(self._buffer) or self._eof:
+                    self._pos = _end
+                    return _value
+            except JSONDecodeError:
+                if self._eof:
+                    raise ValueError("invalid json portfolio: truncated or malformed value")
+            self._fill()
@@ -0,0 +1,98 @@
+# coding=utf-8
+"""horizon value-at-risk and expected shortfall of portfolio through full revaluation"""
+
+from instrument import ExerciseType, InstType, Instrument, exotic_type, option_type
+from instrument.env_param import EnvParam
+from numpy import array, asarray, bincount, ceil, empty, floor, partition, sqrt, unique, zeros
+from scipy.stats import norm
+from utils.black_scholes import BlackScholes
+from utils.monte_carlo import MonteCarlo
+
+cell_budget = 2 ** 22
+
+
+class ValueAtRisk(object):
+    """
+    monte-carlo value-at-risk engine
+    simulates underlying to risk horizon, fully revalues every leg on each state, and estimates loss quantiles
+    option legs sharing type and maturity are revalued together as one strike vector (same strikes merged)
+    legs on a smile take its vol at their strike and remaining maturity, as aged portfolio curves do
+    """
+    def __init__(self, portfolio_):
+        self._portfolio = portfolio_
+        self._stock_unit = 0
+        self._groups = {}
+        for _comp in portfolio_.legs():
+            if _comp.type == InstType.Stock.value:
+                self._stock_unit += _comp.unit
+            elif _comp.type in exotic_type:
+                raise ValueError("path-dependent option is not supported by value-at-risk: {}".format(_comp))
+            elif _comp.type in option_type and _comp.exercise != ExerciseType.European.value:
+                raise ValueError("{} exercise is not supported by value-at-risk: {}".format(_comp.exercise, _comp))
+            elif _comp.type in option_type:
+                _key = (1 if _comp.type == InstType.CallOption.value else -1, _comp.maturity)
+                self._groups.setdefault(_key, ([], [], []))
+                self._groups[_key][0].append(_comp.strike)
+                self._groups[_key][1].append(_comp.unit)
+                self._groups[_key][2].append(_comp)
+        for _key, (_strike, _unit, _legs) in self._groups.items():
+            _strike, _first, _index = unique(array(_strike, dtype=float), return_index=True, return_inverse=True)
+            # one leg per merged strike, for smile lookup
+            self._groups[_key] = (_strike, bincount(_index, weights=_unit), [_legs[_i] for _i in _first])
+
+    def run(self, horizon_, confidence_=0.99, iteration_=1000000, seed_=None, interval_=0.95, drift_=None):
+        """
+        estimate horizon VaR and ES with confidence intervals
+        :param horizon_: risk horizon in years
+        :param confidence_: quantile level of loss distribution
+        :param iteration_: number of simulated scenarios
+        :param seed_: random seed for reproducible scenarios
+        :param interval_: confidence level of the estimation intervals
+        :param drift_: real-world drift (%) of underlying, risk free rate is used if not given
+        :return: a dict consists with var, es, their intervals and number of scenarios
+        """
+        if not 0 < confidence_ < 1:
+            raise ValueError("confidence level should be in (0, 1), not {}".format(confidence_))
+        if horizon_ < 0:
+            raise ValueError("non-negative value is required for horizon, not {}".format(horizon_))
+        _load_param = [EnvParam.RiskFreeRate.value, EnvParam.UdSpotForPrice.value, EnvParam.UdVolatility.value,
+                       EnvParam.UdDivYieldRatio.value]
+        _rate, _spot, _vol, _div = tuple(Instrument._load_market(self._portfolio.mkt_data, _load_param))
+        _horizon_rate, _horizon_div = Instrument._term_rates(self._portfolio.mkt_data, horizon_, _rate, _div)
+        _drift = _horizon_rate if drift_ is None else drift_ / 100
+
+        _value = self._revalue(array([_spot]), 0, _rate, _div, _vol)[0]
+        _loss = empty(iteration_)
+        _start = 0
+        for _scenario in MonteCarlo.stock_price_chunks(
+                iteration_, self._chunk(), seed_, isp=_spot, rate=_drift, div=_horizon_div, vol=_vol, t=horizon_):
+            _loss[_start:_start + _scenario.size] = _value - self._revalue(_scenario, horizon_, _rate, _div, _vol)
+            _start += _scenario.size
+
+        _z = norm.ppf((1 + interval_) / 2)
+        _rank = int(floor(iteration_ * confidence_))
+        _spread = _z * sqrt(iteration_ * confidence_ * (1 - confidence_))
+        _low, _high = max(int(floor(_rank - _spread)), 0), min(int(ceil(_rank + _spread)), iteration_ - 1)
+        _loss = partition(_loss, sorted({_low, _rank, _high}))
+        _var = _loss[_rank]
+        _tail = _loss[_rank:]
+        _es = _tail.mean()
+        _es_error = _z * _tail.std() / sqrt(_tail.size)
+        return dict(var=_var, var_interval=(_loss[_low], _loss[_high]), es=_es,
+                    es_interval=(_es - _es_error, _es + _es_error), scenario=iteration_)
+
+    def _chunk(self):
+        return max(cell_budget // max(max([_s.size for _s, _u, _l in self._groups.values()] or [1]), 1), 1)
+
+    def _revalue(self, spot_, time_, rate_, div_, vol_):
+        spot_ = asarray(spot_)
+        _value = spot_ * self._stock_unit
+        for (_sign, _maturity), (_strike, _unit, _legs) in self._groups.items():
+            # rate curves and smile keep their shape over the horizon, so legs look them up on remaining maturity
+            _t = max(_maturity - time_, 0)
+            _rate, _div = Instrument._term_rates(self._portfolio.mkt_data, _t, rate_, div_)
+            _vol = zeros(_strike.size) + self._portfolio._leg_vols(_legs, vol_, zeros(_strike.size) + _t)
+            _price = BlackScholes.price(sign=_sign, isp=spot_[None, :], strike=_strike[:, None], rate=_rate,
+                                        div=_div, vol=_vol[:, None], t=_t)
+            _value = _value + _unit @ _price
+        return _value
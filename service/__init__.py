@@ -0,0 +1,2 @@
+# coding=utf-8
+"""local pricing service without gui"""
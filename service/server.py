@@ -0,0 +1,227 @@
+# coding=utf-8
+"""
+local json-over-http pricing service
+requests arriving together are coalesced into batches evaluated in a process pool
+a bounded queue rejects requests with 503 when the engines cannot keep up
+"""
+
+from asyncio import IncompleteReadError, Queue, Semaphore, TimeoutError as AsyncTimeout, get_running_loop, run, \
+    start_server, wait_for
+from concurrent.futures import ProcessPoolExecutor
+from json import dumps, loads
+from os import cpu_count
+from sys import path as sys_path
+from time import monotonic
+sys_path.append("{}/..".format(sys_path[0]))
+
+from instrument import Instrument
+from instrument.default_param import env_default_param
+from instrument.env_param import EnvParam
+from instrument.portfolio import CurveType, Portfolio
+from numpy import array, zeros
+
+http_reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}
+risk_keys = ['pv', 'delta', 'gamma', 'vega', 'theta', 'rho']
+
+
+class ServiceRoute(object):
+    """supported routes"""
+    Curve = '/curve'
+    Price = '/price'
+    Health = '/health'
+
+
+def evaluate_batch(route_, env_, payloads_):
+    """
+    evaluate payloads sharing route and env in one call, runs in worker process
+    price payloads are evaluated together at spot as lines of one leg x payload weight matrix
+    curve payloads sharing curve settings are evaluated together through Portfolio.gen_curves
+    a batch failing as a whole is evaluated again payload by payload, so one invalid payload fails alone
+    :return: one result dict per payload, with key error if the payload is invalid
+    """
+    from gui.pricing_env import parse_env
+    _mkt, _engine, _rounding = parse_env(dict(env_default_param, **env_))
+    _res = [None] * len(payloads_)
+    _group = {}
+    for _idx, _payload in enumerate(payloads_):
+        try:
+            _portfolio = Portfolio([Instrument.get_inst(_leg) for _leg in _payload.get('data', [])])
+            _portfolio.set_mkt(_mkt)
+            _portfolio.set_engine(_engine)
+            if route_ == ServiceRoute.Price:
+                _group.setdefault(None, []).append((_idx, _portfolio))
+            else:
+                _curve = _payload.get('curve', CurveType.PV.value)
+                if _curve not in [_c.value for _c in CurveType]:
+                    raise ValueError("invalid curve type given: {}".format(_curve))
+                _key = (_curve, _payload.get('margin', 20), _payload.get('step', 1))
+                _group.setdefault(_key, []).append((_idx, _portfolio))
+        except Exception as e:
+            _res[_idx] = dict(error=str(e))
+
+    for _key, _items in _group.items():
+        try:
+            _values = _evaluate_group(_key, [_p for _i, _p in _items])
+        except Exception:
+            _values = [_evaluate_alone(_key, _p) for _i, _p in _items]
+        for (_idx, _p), _value in zip(_items, _values):
+            _res[_idx] = _value
+    return _res
+
+
+def _evaluate_alone(key_, portfolio_):
+    try:
+        return _evaluate_group(key_, [portfolio_])[0]
+    except Exception as e:
+        return dict(error=str(e))
+
+
+def _evaluate_group(key_, portfolios_):
+    """results of portfolios sharing env, risk at spot if key is None, otherwise curves of (curve, margin, step)"""
+    if key_ is not None:
+        return [dict(x=_x.tolist(), y=_y[0].tolist()) for _x, _y in Portfolio.gen_curves(portfolios_, *key_)]
+    _head = portfolios_[0]
+    _legs = [_leg for _p in portfolios_ for _leg in _p.legs()]
+    _weight = zeros((len(_legs), len(portfolios_)))
+    _start = 0
+    for _idx, _p in enumerate(portfolios_):
+        _weight[_start:_start + len(_p.legs()), _idx] = [_leg.unit for _leg in _p.legs()]
+        _start += len(_p.legs())
+    _risk = _head.evaluate(array([_head.mkt_data[EnvParam.UdSpotForPrice.value]], dtype=float),
+                           (_legs, _weight, zeros(len(portfolios_))))
+    return [{_key: float(_risk[_key][0, _idx]) for _key in risk_keys} for _idx in range(len(portfolios_))]
+
+
+class PricingService(object):
+    """
+    asyncio http server for portfolio pricing
+    payloads follow the portfolio save format ({"data": [...], "env": {...}}) plus curve settings
+    """
+    def __init__(self, host_='127.0.0.1', port_=8765, worker_=None, batch_size_=64, batch_window_=0.005,
+                 queue_size_=1024):
+        """
+        :param worker_: number of worker processes, default to number of cpus
+        :param batch_size_: most requests evaluated in one batch
+        :param batch_window_: seconds to wait for more requests once one arrives
+        :param queue_size_: most pending requests, further requests are rejected with 503
+        """
+        self._host = host_
+        self._port = port_
+        self._worker = worker_
+        self._batch_size = batch_size_
+        self._batch_window = batch_window_
+        self._queue_size = queue_size_
+        self._queue = None
+        self._pool = None
+        self._slot = None
+
+    def run(self):
+        """serve until interrupted"""
+        run(self.serve())
+
+    async def serve(self):
+        """start workers, batcher and server"""
+        self._queue = Queue(self._queue_size)
+        _worker = self._worker or cpu_count() or 1
+        self._pool = ProcessPoolExecutor(_worker)
+        self._slot = Semaphore(_worker)
+        _loop = get_running_loop()
+        # workers are forked before any connection is open, so they never hold a client socket open
+        await _loop.run_in_executor(self._pool, cpu_count)
+        _batcher = _loop.create_task(self._batch())
+        _server = await start_server(self._handle, self._host, self._port)
+        try:
+            async with _server:
+                await _server.serve_forever()
+        finally:
+            _batcher.cancel()
+            self._pool.shutdown(cancel_futures=True)
+
+    async def _handle(self, reader_, writer_):
+        try:
+            _status, _body = await self._respond(reader_)
+        except (ValueError, KeyError, IncompleteReadError) as e:
+            _status, _body = 400, dict(error=str(e))
+        _text = dumps(_body).encode()
+        writer_.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                      "Connection: close\r\n{}\r\n".format(_status, http_reason[_status], len(_text),
+                                                         "Retry-After: 1\r\n" if _status == 503 else "").encode())
+        writer_.write(_text)
+        try:
+            await writer_.drain()
+        finally:
+            writer_.close()
+
+    async def _respond(self, reader_):
+        _method, _route, _version = (await reader_.readline()).decode().split()
+        _length = 0
+        while True:
+            _line = (await reader_.readline()).decode().strip()
+            if not _line:
+                break
+            _name, _value = _line.split(':', 1)
+            if _name.strip().lower() == 'content-length':
+                _length = int(_value)
+
+        if _route == ServiceRoute.Health:
+            return 200, dict(status='ok', pending=self._queue.qsize())
+        if _route not in [ServiceRoute.Curve, ServiceRoute.Price]:
+            return 404, dict(error="unknown route {}".format(_route))
+        if _method != 'POST':
+            return 405, dict(error="POST is required for {}".format(_route))
+
+        _payload = loads((await reader_.readexactly(_length)).decode())
+        if not isinstance(_payload, dict):
+            raise ValueError("json object is required")
+        if self._queue.full():
+            return 503, dict(error="service busy")
+        _future = get_running_loop().create_future()
+        self._queue.put_nowait((_route, _payload, _future))
+        _res = await _future
+        return (400 if 'error' in _res else 200), _res
+
+    async def _batch(self):
+        _loop = get_running_loop()
+        while True:
+            _items = [await self._queue.get()]
+            _deadline = monotonic() + self._batch_window
+            while len(_items) < self._batch_size:
+                _left = _deadline - monotonic()
+                if _left <= 0:
+                    break
+                try:
+                    _items.append(await wait_for(self._queue.get(), _left))
+                except AsyncTimeout:
+                    break
+
+            _group = {}
+            for _route, _payload, _future in _items:
+                _key = (_route, dumps(_payload.get('env', {}), sort_keys=True))
+                _group.setdefault(_key, []).append((_payload, _future))
+            for (_route, _env), _members in _group.items():
+                # waiting for a free worker stops the batcher, so the queue fills up and pushes back on clients
+                await self._slot.acquire()
+                _task = _loop.run_in_executor(self._pool, evaluate_batch, _route, loads(_env),
+                                              [_p for _p, _f in _members])
+                _task.add_done_callback(lambda task_, members_=_members: self._deliver(task_, members_))
+
+    def _deliver(self, task_, members_):
+        self._slot.release()
+        try:
+            _res = task_.result()
+        except Exception as e:
+            _res = [dict(error=str(e))] * len(members_)
+        for (_payload, _future), _r in zip(members_, _res):
+            if not _future.done():
+                _future.set_result(_r)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    _parser = ArgumentParser(description="local portfolio pricing service")
+    _parser.add_argument('--host', default='127.0.0.1')
+    _parser.add_argument('--port', type=int, default=8765)
+    _parser.add_argument('--worker', type=int, default=None)
+    _args = _parser.parse_args()
+    PricingService(_args.host, _args.port, _args.worker).run()
@@ -1,6 +1,7 @@
 # coding=utf-8
 """common utility functions"""
 
+from numpy import asarray, concatenate, diff, where, zeros
 from numpy.ma import log
 
 PRECISION_ZERO = 10 ** -3
@@ -20,6 +21,19 @@ def to_continuous_rate(rate_):
     return log(1 + rate_)
 
 
+def forward_rates(times_, rates_):
+    """
+    continuous forward rates of intervals between increasing times, starting from 0
+    :param rates_: continuous zero rates to the times, a flat rate gives itself
+    """
+    _t = asarray(times_, dtype=float)
+    if asarray(rates_).ndim == 0:
+        return zeros(_t.shape) + rates_
+    _growth = concatenate([[0], (zeros(_t.shape) + rates_) * _t])
+    _dt = diff(concatenate([[0], _t]))
+    return where(_dt > 0, diff(_growth) / where(_dt > 0, _dt, 1), zeros(_t.shape) + rates_)
+
+
 def parse_kwargs(kwargs_, parse_list_, alternative_=None):
     """parse kwargs with given parse keys"""
     return tuple([kwargs_.get(_key, alternative_) for _key in parse_list_])
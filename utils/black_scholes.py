@@ -0,0 +1,163 @@
+# coding=utf-8
+"""Black-Scholes engine"""
+
+from numpy import errstate, exp, log, maximum, minimum, sqrt, where, zeros_like
+from scipy.stats import norm
+from utils import parse_kwargs
+
+DAY_PER_YEAR = 365
+BGK_BETA = 0.5826
+
+
+class BlackScholes(object):
+    """
+    Black-Scholes Engine
+    all inputs are broadcast against each other, so one call can price a whole book on a whole spot grid
+    """
+
+    @classmethod
+    def price(cls, **kwargs):
+        """evaluate vanilla option price, sign is 1 for call and -1 for put"""
+        _sign, _isp, _strike, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't'], 0)
+        with errstate(divide='ignore', invalid='ignore'):
+            _std = _vol * sqrt(_t)
+            _d1 = (log(_isp / _strike) + (_rate - _div) * _t) / _std + _std / 2
+            _d2 = _d1 - _std
+            _price = _sign * (_isp * exp(-_div * _t) * norm.cdf(_sign * _d1) -
+                              _strike * exp(-_rate * _t) * norm.cdf(_sign * _d2))
+        return where(_std > 0, _price, maximum(_sign * (_isp - _strike), 0))[()]
+
+    @classmethod
+    def risk(cls, **kwargs):
+        """
+        evaluate vanilla option price and greeks from shared intermediates
+        vega and rho are per 1% move of volatility and rate, theta is per calendar day
+        :return: a dict with keys pv, delta, gamma, vega, theta, rho
+        """
+        _sign, _isp, _strike, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't'], 0)
+        with errstate(divide='ignore', invalid='ignore'):
+            _sqrt_t = sqrt(_t)
+            _std = _vol * _sqrt_t
+            _d1 = (log(_isp / _strike) + (_rate - _div) * _t) / _std + _std / 2
+            _d2 = _d1 - _std
+            _fwd_df = _isp * exp(-_div * _t)
+            _strike_df = _strike * exp(-_rate * _t)
+            _n1 = norm.cdf(_sign * _d1)
+            _n2 = norm.cdf(_sign * _d2)
+            _pdf = norm.pdf(_d1) * _fwd_df
+            _risk = dict(
+                pv=_sign * (_fwd_df * _n1 - _strike_df * _n2),
+                delta=_sign * _n1 * _fwd_df / _isp,
+                gamma=_pdf / _isp ** 2 / _std,
+                vega=_pdf * _sqrt_t / 100,
+                theta=(-_pdf * _vol / 2 / _sqrt_t - _sign * _rate * _strike_df * _n2 +
+                       _sign * _div * _fwd_df * _n1) / DAY_PER_YEAR,
+                rho=_sign * _strike_df * _n2 * _t / 100,
+            )
+        _live = _std > 0
+        _intrinsic = dict(pv=maximum(_sign * (_isp - _strike), 0), delta=_sign * (_sign * (_isp - _strike) > 0))
+        return {_key: where(_live, _value, _intrinsic.get(_key, zeros_like(_value)))[()]
+                for _key, _value in _risk.items()}
+
+    @classmethod
+    def barrier(cls, **kwargs):
+        """
+        evaluate single barrier option price (Reiner-Rubinstein), rebate is paid at maturity in both knock types
+        discrete monitoring is approximated by shifting barrier away from spot (Broadie-Glasserman-Kou)
+        kwargs:
+            up, knock_in: barrier direction and knock type (bool)
+            barrier, rebate: barrier level and rebate
+            monitor: number of equally spaced monitoring dates, 0 for continuous monitoring
+        """
+        _sign, _isp, _strike, _rate, _div, _vol, _t, _barrier, _rebate, _monitor = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't', 'barrier', 'rebate', 'monitor'], 0)
+        _up, _knock_in = bool(kwargs.get('up')), bool(kwargs.get('knock_in'))
+        _eta = -1 if _up else 1
+        if _monitor:
+            _barrier = _barrier * exp(-_eta * BGK_BETA * _vol * sqrt(_t / _monitor))
+        _vanilla = cls.price(sign=_sign, isp=_isp, strike=_strike, rate=_rate, div=_div, vol=_vol, t=_t)
+        _df = exp(-_rate * _t)
+
+        with errstate(divide='ignore', invalid='ignore'):
+            _std = _vol * sqrt(_t)
+            _mu = (_rate - _div - _vol ** 2 / 2) / _vol ** 2
+            _ratio = _barrier / _isp
+            _x1 = log(_isp / _strike) / _std + (1 + _mu) * _std
+            _x2 = log(_isp / _barrier) / _std + (1 + _mu) * _std
+            _y1 = log(_barrier ** 2 / _isp / _strike) / _std + (1 + _mu) * _std
+            _y2 = log(_barrier / _isp) / _std + (1 + _mu) * _std
+            _fwd_df = _isp * exp(-_div * _t)
+
+            def _term(x_, power_, sign_):
+                return _sign * _fwd_df * _ratio ** (2 * (_mu + 1) * power_) * norm.cdf(sign_ * x_) - \
+                    _sign * _strike * _df * _ratio ** (2 * _mu * power_) * norm.cdf(sign_ * (x_ - _std))
+
+            _a, _b = _term(_x1, 0, _sign), _term(_x2, 0, _sign)
+            _c, _d = _term(_y1, 1, _eta), _term(_y2, 1, _eta)
+            _no_hit = norm.cdf(_eta * (_x2 - _std)) - _ratio ** (2 * _mu) * norm.cdf(_eta * (_y2 - _std))
+            _above = _strike > _barrier
+            _call = _sign > 0
+            if _up == _call:
+                _out = where(_above, 0, _a - _b + _c - _d) if _call else where(_above, _a - _b + _c - _d, 0)
+            else:
+                _out = where(_above, _a - _c, _b - _d) if _call else where(_above, _b - _d, _a - _c)
+            _value = where(_knock_in, _vanilla - _out + _rebate * _df * _no_hit,
+                           _out + _rebate * _df * (1 - _no_hit))
+        _hit = _isp >= _barrier if _up else _isp <= _barrier
+        _value = where(_hit, _vanilla if _knock_in else _rebate * _df, _value)
+        return where(_std > 0, _value, where(_hit == _knock_in, maximum(_sign * (_isp - _strike), 0),
+                                             _rebate))[()]
+
+    @classmethod
+    def geometric_asian(cls, **kwargs):
+        """
+        evaluate geometric average price option (Kemna-Vorst)
+        kwargs:
+            monitor: number of equally spaced fixings ending at maturity, 0 for continuous averaging
+        """
+        _sign, _isp, _strike, _rate, _div, _vol, _t, _monitor = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't', 'monitor'], 0)
+        if _monitor:
+            _time = _t * (_monitor + 1) / 2 / _monitor
+            _var = _vol ** 2 * _t * (_monitor + 1) * (2 * _monitor + 1) / 6 / _monitor ** 2
+        else:
+            _time, _var = _t / 2, _vol ** 2 * _t / 3
+        _adj_vol = sqrt(_var / _t) if _t > 0 else _vol
+        _fwd = _isp * exp((_rate - _div - _vol ** 2 / 2) * _time + _var / 2)
+        return (cls.price(sign=_sign, isp=_fwd, strike=_strike, rate=0, div=0, vol=_adj_vol, t=_t) *
+                exp(-_rate * _t))[()]
+
+    @classmethod
+    def lookback(cls, **kwargs):
+        """
+        evaluate lookback option with continuous monitoring started today
+        floating strike (Goldman-Sosin-Gatto) pays S_T - min or max - S_T
+        fixed strike (Conze-Viswanathan) pays max - K or K - min
+        kwargs:
+            floating: if strike is floating (bool), strike is ignored for floating lookback
+        """
+        _sign, _isp, _strike, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't'], 0)
+        _carry = _rate - _div
+        _carry = where(abs(_carry) < 10 ** -4, 10 ** -4, _carry)
+        _df = exp(-_rate * _t)
+        _level = _isp if kwargs.get('floating') else \
+            (maximum(_strike, _isp) if _sign > 0 else minimum(_strike, _isp))
+
+        with errstate(divide='ignore', invalid='ignore'):
+            _std = _vol * sqrt(_t)
+            _d1 = (log(_isp / _level) + (_carry + _vol ** 2 / 2) * _t) / _std
+            _d2 = _d1 - _std
+            # floating strike mirrors the reflection term of fixed strike formula
+            _reflect = -_sign if kwargs.get('floating') else _sign
+            _skew = _isp * _df * _vol ** 2 / 2 / _carry * _reflect * (
+                exp(_carry * _t) * norm.cdf(_reflect * _d1) -
+                (_isp / _level) ** (-2 * _carry / _vol ** 2) * norm.cdf(_reflect * (_d1 - 2 * _carry * _t / _std)))
+            _value = _sign * (_isp * exp(-_div * _t) * norm.cdf(_sign * _d1) -
+                              _level * _df * norm.cdf(_sign * _d2)) + _skew
+            if not kwargs.get('floating'):
+                _value = _value + _df * maximum(_sign * (_isp - _strike), 0)
+        _intrinsic = 0 if kwargs.get('floating') else maximum(_sign * (_isp - _strike), 0)
+        return where(_std > 0, _value, _intrinsic)[()]
@@ -0,0 +1,128 @@
+# coding=utf-8
+"""persistent content-addressed cache of pricing results"""
+
+from hashlib import sha256
+from json import dumps
+from os import environ, getpid, listdir, makedirs, path as os_path, remove, replace, stat, utime
+from pickle import HIGHEST_PROTOCOL, UnpicklingError, dump, load
+from shutil import rmtree
+
+try:
+    from fcntl import LOCK_EX, LOCK_UN, flock
+except ImportError:  # no inter-process lock on windows, writes stay atomic through replace
+    flock = None
+
+cache_version = 1
+cache_env_dir = 'OPTION_PAYOFF_CACHE'
+default_cache_dir = os_path.join(os_path.expanduser('~'), '.option_payoff_cache')
+default_cache_size = 2 ** 30
+
+
+class DiskCache(object):
+    """
+    disk cache keyed by sha256 of the canonical json of all inputs
+    every entry is one pickle file written atomically, so readers never see a partial entry
+    least recently used entries are evicted once total size exceeds the limit
+    """
+    def __init__(self, directory_=None, max_size_=default_cache_size):
+        self._dir = directory_ or environ.get(cache_env_dir, default_cache_dir)
+        self._max_size = max_size_
+        makedirs(self._dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts_):
+        """canonical hash of json-serializable inputs, tuples and lists are treated the same"""
+        _text = dumps([cache_version, parts_], sort_keys=True, separators=(',', ':'), default=repr)
+        return sha256(_text.encode()).hexdigest()
+
+    def get(self, key_):
+        """
+        return cached value or None, a hit refreshes the entry for eviction
+        an entry that fails to unpickle, such as one written against an older class layout, is removed as a miss
+        """
+        _path = self._path(key_)
+        try:
+            with open(_path, 'rb') as f:
+                _value = load(f)
+            utime(_path)
+            return _value
+        except OSError:
+            return None
+        except (UnpicklingError, EOFError, ValueError, AttributeError, ImportError, IndexError, TypeError):
+            try:
+                remove(_path)
+            except OSError:
+                pass
+            return None
+
+    def put(self, key_, value_):
+        """store value under key, then evict old entries if cache is over size"""
+        _path = self._path(key_)
+        makedirs(os_path.dirname(_path), exist_ok=True)
+        _temp = "{}.{}.tmp".format(_path, getpid())
+        with open(_temp, 'wb') as f:
+            dump(value_, f, protocol=HIGHEST_PROTOCOL)
+        replace(_temp, _path)
+        self._evict()
+
+    def clear(self):
+        """invalidate the whole cache"""
+        with self._lock():
+            for _name in listdir(self._dir):
+                _path = os_path.join(self._dir, _name)
+                if os_path.isdir(_path):
+                    rmtree(_path, ignore_errors=True)
+
+    def size(self):
+        """total size of cached entries in bytes"""
+        return sum([_s.st_size for _p, _s in self._entries()])
+
+    def _path(self, key_):
+        return os_path.join(self._dir, key_[:2], key_ + '.pkl')
+
+    def _entries(self):
+        _res = []
+        for _sub in listdir(self._dir):
+            _sub_dir = os_path.join(self._dir, _sub)
+            if not os_path.isdir(_sub_dir):
+                continue
+            for _name in listdir(_sub_dir):
+                if _name.endswith('.pkl'):
+                    try:
+                        _res.append((os_path.join(_sub_dir, _name), stat(os_path.join(_sub_dir, _name))))
+                    except OSError:
+                        pass
+        return _res
+
+    def _evict(self):
+        with self._lock():
+            _entries = self._entries()
+            _total = sum([_s.st_size for _p, _s in _entries])
+            for _path, _stat in sorted(_entries, key=lambda x: x[1].st_mtime):
+                if _total <= self._max_size:
+                    break
+                try:
+                    remove(_path)
+                except OSError:
+                    pass
+                _total -= _stat.st_size
+
+    def _lock(self):
+        return _FileLock(os_path.join(self._dir, '.lock'))
+
+
+class _FileLock(object):
+    def __init__(self, path_):
+        self._path = path_
+        self._file = None
+
+    def __enter__(self):
+        if flock is not None:
+            self._file = open(self._path, 'a')
+            flock(self._file, LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self._file is not None:
+            flock(self._file, LOCK_UN)
+            self._file.close()
@@ -0,0 +1,121 @@
+# coding=utf-8
+"""finite difference (Crank-Nicolson) engine"""
+
+from numpy import arange, asarray, atleast_1d, errstate, exp, interp, maximum, zeros
+from scipy.linalg import solve_banded
+from utils import parse_kwargs
+from utils.black_scholes import BlackScholes, DAY_PER_YEAR
+
+
+class FiniteDifference(object):
+    """
+    Finite Difference Engine
+    solves Black-Scholes PDE on a uniform spot grid with Crank-Nicolson and Rannacher start-up
+    every column of the weight matrix is a portfolio of vanilla legs and all columns are solved together
+    """
+
+    @classmethod
+    def risk(cls, grid_=400, step_=100, smoothing_=2, greeks_=False, **kwargs):
+        """
+        evaluate PV, DELTA, GAMMA and THETA of portfolios on given spots in one solve
+        :param grid_: number of spot intervals of the grid
+        :param step_: number of time steps
+        :param smoothing_: number of leading time steps replaced by two implicit half steps each
+        :param greeks_: if VEGA and RHO are required, each of them costs two more solves
+        kwargs:
+            isp: spots where results are interpolated
+            sign, strike: leg arrays (1 for call, -1 for put)
+            weight: leg x portfolio matrix of units, default to one portfolio of unit legs
+            rate, div, vol, t: market and common maturity of all legs
+        :return: a dict with keys pv, delta, gamma, theta (vega, rho), each array in shape of (spot, portfolio)
+        """
+        if parse_kwargs(kwargs, ['t'], 0)[0] <= 0:
+            return cls._expiry(greeks_, **kwargs)
+        _risk = cls._solve(grid_, step_, smoothing_, **kwargs)
+        if greeks_:
+            _vol, _rate = parse_kwargs(kwargs, ['vol', 'rate'], 0)
+            _risk['vega'] = (cls._solve(grid_, step_, smoothing_, **dict(kwargs, vol=_vol + 0.01))['pv'] -
+                             cls._solve(grid_, step_, smoothing_, **dict(kwargs, vol=max(_vol - 0.01, 0)))['pv']) / 2
+            _risk['rho'] = (cls._solve(grid_, step_, smoothing_, **dict(kwargs, rate=_rate + 0.01))['pv'] -
+                            cls._solve(grid_, step_, smoothing_, **dict(kwargs, rate=_rate - 0.01))['pv']) / 2
+        return _risk
+
+    @classmethod
+    def _solve(cls, grid_, step_, smoothing_, **kwargs):
+        _isp, _sign, _strike, _weight, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['isp', 'sign', 'strike', 'weight', 'rate', 'div', 'vol', 't'], 0)
+        _isp = atleast_1d(asarray(_isp, dtype=float))
+        _sign = atleast_1d(asarray(_sign, dtype=float))
+        _strike = atleast_1d(asarray(_strike, dtype=float))
+        _weight = asarray(_weight, dtype=float) if kwargs.get('weight') is not None else \
+            asarray([[1]] * _strike.size, dtype=float)
+
+        _spot = cls._spot_grid(grid_, _isp, _strike, _vol, _t)
+        _ds = _spot[1] - _spot[0]
+        _value = maximum(_sign * (_spot[:, None] - _strike), 0) @ _weight
+        _last = _value
+
+        if _t > 0:
+            _j = arange(1, grid_)
+            _lower = (_vol ** 2 * _j ** 2 - (_rate - _div) * _j) / 2
+            _diag = -(_vol ** 2 * _j ** 2 + _rate)
+            _upper = (_vol ** 2 * _j ** 2 + (_rate - _div) * _j) / 2
+            _dt = _t / step_
+            _smoothing = min(smoothing_, step_)
+            _schedule = [(_dt / 2, 1.)] * (2 * _smoothing) + [(_dt, .5)] * (step_ - _smoothing)
+            _tau = 0
+            for _h, _theta in _schedule:
+                _last = _value
+                _tau += _h
+                _bound = cls._boundary(_spot[[0, -1]], _sign, _strike, _weight, _rate, _div, _vol, _tau)
+                _rhs = _last[1:-1] + (1 - _theta) * _h * (
+                    _lower[:, None] * _last[:-2] + _diag[:, None] * _last[1:-1] + _upper[:, None] * _last[2:])
+                _rhs[0] += _theta * _h * _lower[0] * _bound[0]
+                _rhs[-1] += _theta * _h * _upper[-1] * _bound[1]
+                _band = zeros((3, grid_ - 1))
+                _band[0, 1:] = -_theta * _h * _upper[:-1]
+                _band[1] = 1 - _theta * _h * _diag
+                _band[2, :-1] = -_theta * _h * _lower[1:]
+                _value = zeros(_value.shape)
+                _value[[0, -1]] = _bound
+                _value[1:-1] = solve_banded((1, 1), _band, _rhs)
+            _theta_grid = (_last - _value) / _h / DAY_PER_YEAR
+        else:
+            _theta_grid = zeros(_value.shape)
+
+        _delta = zeros(_value.shape)
+        _gamma = zeros(_value.shape)
+        _delta[1:-1] = (_value[2:] - _value[:-2]) / 2 / _ds
+        _delta[[0, -1]] = _delta[[1, -2]]
+        _gamma[1:-1] = (_value[2:] - 2 * _value[1:-1] + _value[:-2]) / _ds ** 2
+        _gamma[[0, -1]] = _gamma[[1, -2]]
+        return {_key: cls._interpolate(_isp, _spot, _grid) for _key, _grid in
+                dict(pv=_value, delta=_delta, gamma=_gamma, theta=_theta_grid).items()}
+
+    @staticmethod
+    def _expiry(greeks_, **kwargs):
+        """payoff on given spots and zero greeks of expired legs, no grid interpolation across the strikes"""
+        _isp, _sign, _strike, _weight = parse_kwargs(kwargs, ['isp', 'sign', 'strike', 'weight'], 0)
+        _isp = atleast_1d(asarray(_isp, dtype=float))
+        _strike = atleast_1d(asarray(_strike, dtype=float))
+        _weight = asarray(_weight, dtype=float) if kwargs.get('weight') is not None else \
+            asarray([[1]] * _strike.size, dtype=float)
+        _pv = maximum(atleast_1d(asarray(_sign, dtype=float)) * (_isp[:, None] - _strike), 0) @ _weight
+        _keys = ['delta', 'gamma', 'theta'] + (['vega', 'rho'] if greeks_ else [])
+        return dict(pv=_pv, **{_key: zeros(_pv.shape) for _key in _keys})
+
+    @staticmethod
+    def _spot_grid(grid_, isp_, strike_, vol_, t_):
+        _top = max(isp_.max(), strike_.max() if strike_.size else 0) * exp(4 * vol_ * t_ ** .5)
+        return arange(grid_ + 1) * (max(_top, 2 * isp_.max()) / grid_)
+
+    @staticmethod
+    def _boundary(spot_, sign_, strike_, weight_, rate_, div_, vol_, tau_):
+        with errstate(divide='ignore'):
+            _price = BlackScholes.price(sign=sign_, isp=spot_[:, None], strike=strike_, rate=rate_, div=div_,
+                                        vol=vol_, t=tau_)
+        return _price @ weight_
+
+    @staticmethod
+    def _interpolate(isp_, spot_, grid_):
+        return asarray([interp(isp_, spot_, _column) for _column in grid_.T]).T
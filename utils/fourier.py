@@ -0,0 +1,142 @@
+# coding=utf-8
+"""Fourier (Carr-Madan FFT) engine"""
+
+from instrument.env_param import FourierModel
+from numpy import arange, asarray, broadcast_arrays, errstate, exp, log, maximum, pi, where, zeros
+from numpy.fft import fft
+from scipy.interpolate import CubicSpline
+from utils import parse_kwargs
+from utils.black_scholes import DAY_PER_YEAR
+from utils.heston import Heston
+
+# damping exponent of call price in log strike
+fourier_damping = 1.5
+# spacing of integration grid, log strike grid spans 2 * pi / spacing
+fourier_spacing = 0.25
+# log moneyness range interpolated from the grid, calls beyond are worth their bounds
+fourier_window = 3
+
+
+def _black_scholes(u_, **kwargs):
+    _vol, _t = parse_kwargs(kwargs, ['vol', 't'], 0)
+    return exp(-(1j * u_ + u_ ** 2) * _vol ** 2 * _t / 2)
+
+
+# characteristic function of log(S_T / F_T) of every model, a new model only needs an entry here
+model_char_func = {
+    FourierModel.BS.value: _black_scholes,
+    FourierModel.Heston.value: Heston.char_func,
+}
+
+
+class Fourier(object):
+    """
+    Fourier Engine
+    one FFT prices calls of spot 1 on a whole log strike grid for one maturity, legs are interpolated from it
+    legs with their own vols or rates share a grid only with legs of the same maturity, vol and rates
+    prices are homogeneous in spot and strike, so every spot of a curve reuses the same grid
+    """
+
+    @classmethod
+    def price(cls, grid_=4096, model_=FourierModel.BS.value, **kwargs):
+        """evaluate vanilla option prices, all strikes and spots of one maturity share one FFT"""
+        return cls.risk(grid_, model_, ['pv'], **kwargs)['pv']
+
+    @classmethod
+    def risk(cls, grid_=4096, model_=FourierModel.BS.value, measures_=None, **kwargs):
+        """
+        evaluate vanilla option price and greeks, spot greeks reuse the grid and other greeks bump it
+        :param grid_: number of FFT points
+        :param model_: model of characteristic function, parameters other than market are passed by kwargs
+        :param measures_: measures required besides pv, all if not given, only required bumps are run
+        kwargs:
+            sign, isp, strike, rate, div, vol, t: as BlackScholes, all broadcast against each other
+        :return: a dict with keys pv and required ones of delta, gamma, vega, theta, rho, in same units as
+            BlackScholes.risk
+        """
+        if model_ not in model_char_func:
+            raise ValueError("invalid fourier model given: {}".format(model_))
+        if not isinstance(grid_, int) or grid_ < 16:
+            raise ValueError("<int> of at least 16 is required for fourier grid, not {}".format(grid_))
+        _sign, _isp, _strike, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't'], 0)
+        _model = {_key: _value for _key, _value in kwargs.items()
+                  if _key not in ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't']}
+        _sign, _isp, _strike, _t, _vols, _rates, _divs = broadcast_arrays(
+            asarray(_sign), asarray(_isp, dtype=float), asarray(_strike, dtype=float), asarray(_t, dtype=float),
+            asarray(_vol, dtype=float), asarray(_rate, dtype=float), asarray(_div, dtype=float))
+        _keys = [_key for _key in ['pv', 'delta', 'gamma', 'vega', 'theta', 'rho']
+                 if _key == 'pv' or measures_ is None or _key in measures_]
+        _res = {_key: zeros(_t.shape) for _key in _keys}
+
+        # one grid per maturity, volatility and rates, a smile or curves give legs their own vols and rates
+        for _time, _vol, _rate, _div in set(zip(_t.ravel().tolist(), _vols.ravel().tolist(),
+                                                _rates.ravel().tolist(), _divs.ravel().tolist())):
+            _mask = (_t == _time) & (_vols == _vol) & (_rates == _rate) & (_divs == _div)
+            _s, _k, _w = _sign[_mask], _strike[_mask], _isp[_mask]
+            # spot bumps reuse the grid of the group, other bumps need their own
+            _grid = cls._unit_grid(grid_, model_, _rate, _div, _vol, _time, _model)
+
+            def _value(isp_=_w, rate_=_rate, vol_=_vol, t_=_time, div_=_div, unit_grid_=None):
+                _unit = cls._unit_grid(grid_, model_, rate_, div_, vol_, t_, _model) if unit_grid_ is None \
+                    else unit_grid_
+                return cls._interpolate(_unit, _s, isp_, _k, rate_, div_, t_)
+
+            _pv = _value(unit_grid_=_grid)
+            _res['pv'][_mask] = _pv
+            if 'delta' in _res or 'gamma' in _res:
+                _ds = maximum(_w, 1) * 0.01
+                _low = maximum(_w - _ds, 0)
+                _up, _down = _value(isp_=_w + _ds, unit_grid_=_grid), _value(isp_=_low, unit_grid_=_grid)
+                if 'delta' in _res:
+                    _res['delta'][_mask] = (_up - _down) / (_w + _ds - _low)
+                if 'gamma' in _res:
+                    _res['gamma'][_mask] = ((_up - _pv) / _ds - (_pv - _down) / maximum(_w - _low, 10 ** -8)) / \
+                        (_w + _ds - _low) * 2
+            if 'vega' in _res:
+                _res['vega'][_mask] = (_value(vol_=_vol + 0.01) - _value(vol_=max(_vol - 0.01, 0))) / 2
+            if 'theta' in _res:
+                _res['theta'][_mask] = _value(t_=max(_time - 1 / DAY_PER_YEAR, 0)) - _pv
+            if 'rho' in _res:
+                _res['rho'][_mask] = (_value(rate_=_rate + 0.01) - _value(rate_=_rate - 0.01)) / 2
+        return {_key: _value[()] for _key, _value in _res.items()}
+
+    @classmethod
+    def call_grid(cls, grid_, model_, rate_, div_, t_, **kwargs):
+        """
+        call prices of spot 1 on log strike grid by one FFT with simpson weights (Carr-Madan)
+        :return: increasing log strikes and call prices
+        """
+        _step = 2 * pi / grid_ / fourier_spacing
+        _v = arange(grid_) * fourier_spacing
+        _k = -grid_ * _step / 2 + arange(grid_) * _step
+        _alpha = fourier_damping
+        _u = _v - (_alpha + 1) * 1j
+        _phi = exp(1j * _u * (rate_ - div_) * t_) * model_char_func[model_](_u, t=t_, **kwargs)
+        _psi = exp(-rate_ * t_) * _phi / (_alpha ** 2 + _alpha - _v ** 2 + 1j * (2 * _alpha + 1) * _v)
+        _simpson = (3 + (-1) ** (arange(grid_) + 1)) / 3.
+        _simpson[0] = 1 / 3.
+        _call = exp(-_alpha * _k) / pi * fft(exp(-1j * _v * _k[0]) * _psi * fourier_spacing * _simpson).real
+        return _k, _call
+
+    @classmethod
+    def _unit_grid(cls, grid_, model_, rate_, div_, vol_, t_, model_param_):
+        """spline of call prices of spot 1 in log strike over the window, None if expired"""
+        if not t_ > 0:
+            return None
+        _k, _call = cls.call_grid(grid_, model_, rate_, div_, t_, vol=vol_, **model_param_)
+        _window = abs(_k) <= fourier_window + 2 * _k[1] - 2 * _k[0]
+        return CubicSpline(_k[_window], _call[_window])
+
+    @staticmethod
+    def _interpolate(unit_grid_, sign_, isp_, strike_, rate_, div_, t_):
+        _fwd_df, _df = exp(-div_ * t_), exp(-rate_ * t_)
+        with errstate(divide='ignore', invalid='ignore'):
+            _log = log(strike_ / isp_)
+            _spline = 0 if unit_grid_ is None else unit_grid_(_log.clip(-fourier_window, fourier_window))
+            # calls beyond the window are worth their bounds, forward less strike or nothing
+            _unit_call = where(_log < -fourier_window, _fwd_df - exp(_log) * _df,
+                               where(_log > fourier_window, 0, maximum(_spline, 0)))
+            _unit_call = where(t_ > 0, _unit_call, maximum(1 - exp(_log), 0))
+            _call = where(isp_ > 0, isp_ * _unit_call, 0)
+        return where(sign_ > 0, _call, _call - isp_ * _fwd_df + strike_ * _df)
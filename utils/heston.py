@@ -0,0 +1,209 @@
+# coding=utf-8
+"""Heston stochastic volatility engine"""
+
+from numpy import asarray, broadcast_arrays, ceil, concatenate, diff, errstate, exp, log, maximum, pi, sqrt, stack, \
+    unique, where, zeros
+from numpy.polynomial.legendre import leggauss
+from numpy.random import default_rng
+from scipy.special import ndtr
+from utils import forward_rates, parse_kwargs
+from utils.black_scholes import DAY_PER_YEAR
+
+# log of integrand decay at the end of the truncated fourier range
+heston_truncation = 36
+# switching level of QE scheme between quadratic and exponential variance sampling
+qe_switch = 1.5
+
+_node_cache = {}
+
+
+class Heston(object):
+    """
+    Heston Engine
+    variance follows dv = kappa * (theta - v) * dt + sigma * sqrt(v) * dW, correlated with spot by corr
+    initial variance is the square of vol, all inputs are broadcast against each other as BlackScholes
+    vanilla options are priced semi-analytically, paths are simulated with Andersen quadratic exponential scheme
+    """
+
+    @staticmethod
+    def nodes(count_):
+        """gauss-legendre nodes and weights on [0, 1], cached by number of nodes"""
+        if count_ not in _node_cache:
+            if not isinstance(count_, int) or count_ < 2:
+                raise ValueError("<int> of at least 2 is required for quadrature nodes, not {}".format(count_))
+            _x, _w = leggauss(count_)
+            _node_cache[count_] = ((_x + 1) / 2, _w / 2)
+        return _node_cache[count_]
+
+    @staticmethod
+    def char_func(u_, **kwargs):
+        """
+        characteristic function of log(S_T / F_T) in its numerically stable form (Albrecher et al.)
+        :param u_: real or complex argument
+        """
+        _vol, _t, _kappa, _theta, _sigma, _corr = parse_kwargs(
+            kwargs, ['vol', 't', 'kappa', 'theta', 'sigma', 'corr'], 0)
+        _iu = 1j * u_
+        _beta = _kappa - _corr * _sigma * _iu
+        _d = sqrt(_beta ** 2 + _sigma ** 2 * (_iu + u_ ** 2))
+        _g = (_beta - _d) / (_beta + _d)
+        _decay = exp(-_d * _t)
+        _c = _kappa * _theta / _sigma ** 2 * ((_beta - _d) * _t - 2 * log((1 - _g * _decay) / (1 - _g)))
+        _dv = (_beta - _d) / _sigma ** 2 * (1 - _decay) / (1 - _g * _decay)
+        return exp(_c + _dv * _vol ** 2)
+
+    @classmethod
+    def price(cls, **kwargs):
+        """
+        evaluate vanilla option price by a single fourier integral (Lewis) on cached gauss-legendre nodes
+        the integral is truncated where integrand decays below exp(-heston_truncation)
+        characteristic function is evaluated once per distinct maturity and vol, shared by all spots and strikes
+        kwargs:
+            sign, isp, strike, rate, div, vol, t: as BlackScholes, vol is the initial volatility
+            kappa, theta, sigma, corr: mean reversion speed, long-run variance, vol of variance and correlation
+            nodes: number of quadrature nodes, default to 256
+        """
+        _sign, _isp, _strike, _rate, _div, _vol, _t, _kappa, _theta, _sigma, _corr = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't', 'kappa', 'theta', 'sigma', 'corr'], 0)
+        _x, _w = cls.nodes(kwargs.get('nodes') or 256)
+        _isp, _strike, _t = asarray(_isp, dtype=float), asarray(_strike, dtype=float), asarray(_t, dtype=float)
+        _live = (_t > 0) & (_isp > 0) & (_strike > 0)
+        with errstate(divide='ignore', invalid='ignore', over='ignore'):
+            _time = where(_live, _t, 1.)
+            _time, _vols = broadcast_arrays(_time, asarray(_vol, dtype=float))
+            _pair, _inverse = unique(stack([_time.ravel(), _vols.ravel()], axis=1), axis=0, return_inverse=True)
+            _inverse = _inverse.reshape(_time.shape)
+            _pair_t, _pair_vol = _pair[:, 0], _pair[:, 1]
+            _mean = cls._mean_variance(_pair_vol, _pair_t, _kappa, _theta)
+            # gaussian decay of the body and linear decay of the tail of characteristic function
+            _bound = maximum(sqrt(2 * heston_truncation / maximum(_mean * _pair_t, 10 ** -8)),
+                             heston_truncation * _sigma / maximum(sqrt(1 - _corr ** 2), 0.1) /
+                             maximum(_pair_vol ** 2 + _kappa * _theta * _pair_t, 10 ** -8))
+            _z = _bound[:, None] * _x
+            _phi = cls.char_func(_z - 0.5j, vol=_pair_vol[:, None], t=_pair_t[:, None], kappa=_kappa, theta=_theta,
+                                 sigma=_sigma, corr=_corr) / (_z ** 2 + 0.25) * _w
+            _log_moneyness = log(where(_live, _isp / _strike, 1.)) + (_rate - _div) * _time
+            _integral = (exp(1j * _z[_inverse] * _log_moneyness[..., None]) * _phi[_inverse]).real.sum(axis=-1) * \
+                _bound[_inverse]
+            _call = _isp * exp(-_div * _time) - sqrt(_isp * _strike) * exp(-(_rate + _div) * _time / 2) * \
+                _integral / pi
+            _price = where(asarray(_sign) > 0, _call,
+                           _call - _isp * exp(-_div * _time) + _strike * exp(-_rate * _time))
+        return where(_live, maximum(_price, 0), maximum(_sign * (_isp - _strike), 0))[()]
+
+    @classmethod
+    def risk(cls, measures_=None, **kwargs):
+        """
+        evaluate vanilla option price and greeks by bumping inputs of the semi-analytic price
+        vega is per 1% move of initial volatility, other units are same as BlackScholes.risk
+        :param measures_: measures required, all if not given, only required bumps are run
+        :return: a dict with required ones of keys pv, delta, gamma, vega, theta, rho
+        """
+        _isp, _rate, _vol, _t = parse_kwargs(kwargs, ['isp', 'rate', 'vol', 't'], 0)
+        _isp, _t = asarray(_isp, dtype=float), asarray(_t, dtype=float)
+        _measures = measures_ or ['pv', 'delta', 'gamma', 'vega', 'theta', 'rho']
+
+        def _value(**bump_):
+            return cls.price(**dict(kwargs, **bump_))
+
+        _res = dict()
+        _pv = _value() if set(_measures) & {'pv', 'gamma', 'theta'} else None
+        if 'pv' in _measures:
+            _res['pv'] = _pv
+        if 'delta' in _measures or 'gamma' in _measures:
+            _ds = maximum(_isp, 1) * 0.01
+            _up, _down = _value(isp=_isp + _ds), _value(isp=maximum(_isp - _ds, 0))
+            _width = _isp + _ds - maximum(_isp - _ds, 0)
+            if 'delta' in _measures:
+                _res['delta'] = (_up - _down) / _width
+            if 'gamma' in _measures:
+                _res['gamma'] = ((_up - _pv) / _ds - (_pv - _down) / maximum(_isp - maximum(_isp - _ds, 0),
+                                                                              10 ** -8)) / _width * 2
+        if 'vega' in _measures:
+            _res['vega'] = (_value(vol=_vol + 0.01) - _value(vol=max(_vol - 0.01, 0))) / 2
+        if 'theta' in _measures:
+            _res['theta'] = _value(t=maximum(_t - 1 / DAY_PER_YEAR, 0)) - _pv
+        if 'rho' in _measures:
+            _res['rho'] = (_value(rate=_rate + 0.01) - _value(rate=_rate - 0.01)) / 2
+        return _res
+
+    @classmethod
+    def stock_path(cls, iteration_, step_, seed_=None, **kwargs):
+        """
+        generate stock paths step by step on equally spaced dates as MonteCarlo.stock_path
+        variance is sampled with quadratic exponential scheme, log spot with its exact conditional drift (Andersen)
+        kwargs:
+            isp, rate, div, vol, t: market and maturity, vol is the initial volatility
+            kappa, theta, sigma, corr: variance process
+            bridge: if uniform randoms for brownian bridge sampling between steps are required
+        :return: generator of (previous spot, current spot, integrated variance, uniform random or None) per step
+        """
+        _isp, _t = parse_kwargs(kwargs, ['isp', 't'], 0)
+        _generator = default_rng(seed_)
+        _spot = zeros(iteration_) + _isp
+        _var = zeros(iteration_) + kwargs.get('vol', 0) ** 2
+        for _ in range(step_):
+            _next, _next_var = cls._step(_spot, _var, _t / step_, _generator, **kwargs)
+            yield _spot, _next, (_var + _next_var) / 2 * _t / step_, \
+                _generator.random(iteration_) if kwargs.get('bridge', False) else None
+            _spot, _var = _next, _next_var
+
+    @classmethod
+    def stock_slices(cls, iteration_, times_, step_, seed_=None, **kwargs):
+        """
+        generate stock spot on increasing time slices as MonteCarlo.stock_slices
+        every interval between slices is split into steps in proportion to its length
+        :param step_: number of steps over the last slice time
+        kwargs:
+            rate, div: flat, or zero rates to every slice time, paths grow at forward rates between slices
+        :return: array in shape of (slice, iteration)
+        """
+        _generator = default_rng(seed_)
+        _res = zeros((len(times_), iteration_))
+        _rate, _div = forward_rates(times_, kwargs.get('rate', 0)), forward_rates(times_, kwargs.get('div', 0))
+        _spot = zeros(iteration_) + kwargs.get('isp', 0)
+        _var = zeros(iteration_) + kwargs.get('vol', 0) ** 2
+        _span = max(times_) if len(times_) else 0
+        for _idx, _dt in enumerate(diff(concatenate([[0], times_]))):
+            _count = int(ceil(step_ * _dt / _span)) if _dt > 0 else 0
+            for _ in range(_count):
+                _spot, _var = cls._step(_spot, _var, _dt / _count, _generator,
+                                        **dict(kwargs, rate=_rate[_idx], div=_div[_idx]))
+            _res[_idx] = _spot
+        return _res
+
+    @staticmethod
+    def _step(spot_, var_, dt_, generator_, **kwargs):
+        _rate, _div, _kappa, _theta, _sigma, _corr = parse_kwargs(
+            kwargs, ['rate', 'div', 'kappa', 'theta', 'sigma', 'corr'], 0)
+        _z_var = generator_.standard_normal(spot_.size)
+        _z_spot = generator_.standard_normal(spot_.size)
+        _decay = exp(-_kappa * dt_)
+        _mean = _theta + (var_ - _theta) * _decay
+        _square = var_ * _sigma ** 2 * _decay / _kappa * (1 - _decay) + \
+            _theta * _sigma ** 2 / 2 / _kappa * (1 - _decay) ** 2
+        with errstate(divide='ignore', invalid='ignore'):
+            _psi = _square / _mean ** 2
+            # quadratic sampling for low dispersion, exponential with a mass at zero otherwise
+            _b2 = maximum(2 / _psi - 1 + sqrt(2 / _psi) * sqrt(maximum(2 / _psi - 1, 0)), 0)
+            _quadratic = _mean / (1 + _b2) * (sqrt(_b2) + _z_var) ** 2
+            _p = (_psi - 1) / (_psi + 1)
+            _u = ndtr(_z_var)
+            _exponential = where(_u <= _p, 0, log(maximum((1 - _p) / maximum(1 - _u, 10 ** -300), 1)) * _mean /
+                                 (1 - _p))
+        _next = where(_psi <= qe_switch, _quadratic, _exponential)
+        _next = where(_mean > 0, _next, 0)
+        _k1 = dt_ / 2 * (_kappa * _corr / _sigma - 0.5) - _corr / _sigma
+        _k2 = dt_ / 2 * (_kappa * _corr / _sigma - 0.5) + _corr / _sigma
+        _k3 = dt_ / 2 * (1 - _corr ** 2)
+        _log_growth = (_rate - _div) * dt_ - _corr * _kappa * _theta * dt_ / _sigma + _k1 * var_ + _k2 * _next + \
+            sqrt(_k3 * (var_ + _next)) * _z_spot
+        return spot_ * exp(_log_growth), _next
+
+    @staticmethod
+    def _mean_variance(vol_, t_, kappa_, theta_):
+        """average expected variance over time"""
+        with errstate(divide='ignore', invalid='ignore'):
+            _kt = kappa_ * t_
+            return where(_kt > 10 ** -8, theta_ + (vol_ ** 2 - theta_) * (1 - exp(-_kt)) / where(_kt > 0, _kt, 1),
+                         vol_ ** 2)
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Lattice engine"""
+
+from instrument.env_param import LatticeTree
+from numpy import arange, asarray, atleast_1d, exp, maximum, sqrt
+from utils import parse_kwargs
+from utils.black_scholes import BlackScholes, DAY_PER_YEAR
+
+
+class Lattice(object):
+    """
+    Lattice Engine
+    binomial (CRR) or trinomial tree with Black-Scholes smoothing on the last step and Richardson extrapolation
+    backward induction runs on whole time slices for all strikes at once
+    """
+
+    @classmethod
+    def price(cls, step_=200, tree_=LatticeTree.Binomial.value, american_=True, exercise_=(), **kwargs):
+        """evaluate option price for one strike or an array of strikes on the same tree"""
+        return cls.risk(step_, tree_, american_, exercise_, greeks_=False, **kwargs)['pv']
+
+    @classmethod
+    def risk(cls, step_=200, tree_=LatticeTree.Binomial.value, american_=True, exercise_=(), greeks_=True,
+             **kwargs):
+        """
+        evaluate option price and greeks on the tree
+        :param step_: number of time steps of the finer tree, the coarser tree uses half of it
+        :param tree_: binomial or trinomial
+        :param american_: if early exercise is allowed at every step
+        :param exercise_: early exercise times (year) for bermudan option, ignored for american option
+        :param greeks_: if delta, gamma and theta (from tree nodes) and vega and rho (from bumping) are required
+        :return: a dict with keys pv (and delta, gamma, vega, theta, rho) in same units as BlackScholes.risk
+        """
+        if step_ < 6:
+            raise ValueError("at least 6 steps are required for lattice, not {}".format(step_))
+        if tree_ not in [_t.value for _t in LatticeTree]:
+            raise ValueError("invalid lattice tree given: {}".format(tree_))
+        _sign, _isp, _strike, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't'], 0)
+        _scalar = asarray(_strike).ndim == 0
+        _strike = atleast_1d(asarray(_strike, dtype=float))[:, None]
+
+        if _t <= 0 or _vol <= 0:
+            _risk = BlackScholes.risk(sign=_sign, isp=_isp, strike=_strike[:, 0], rate=_rate, div=_div, vol=_vol,
+                                      t=_t)
+        else:
+            def _extrapolate(rate_=_rate, vol_=_vol):
+                _fine = cls._induction(step_, tree_, american_, exercise_, _sign, _isp, _strike, rate_, _div, vol_,
+                                       _t)
+                _coarse = cls._induction(step_ // 2, tree_, american_, exercise_, _sign, _isp, _strike, rate_, _div,
+                                         vol_, _t)
+                return {_key: 2 * _fine[_key] - _coarse[_key] for _key in _fine}
+
+            _risk = _extrapolate()
+            if greeks_:
+                _risk['vega'] = (_extrapolate(vol_=_vol + 0.01)['pv'] -
+                                 _extrapolate(vol_=max(_vol - 0.01, 0))['pv']) / 2
+                _risk['rho'] = (_extrapolate(rate_=_rate + 0.01)['pv'] - _extrapolate(rate_=_rate - 0.01)['pv']) / 2
+        return {_key: _value[0] if _scalar else _value for _key, _value in _risk.items()}
+
+    @classmethod
+    def _induction(cls, step_, tree_, american_, exercise_, sign_, isp_, strike_, rate_, div_, vol_, t_):
+        _dt = t_ / step_
+        _disc = exp(-rate_ * _dt)
+        if tree_ == LatticeTree.Binomial.value:
+            _dx = vol_ * sqrt(_dt)
+            _up = (exp((rate_ - div_) * _dt) - exp(-_dx)) / (exp(_dx) - exp(-_dx))
+            _prob = (1 - _up, _up)
+            _width, _record = 1, 2
+        else:
+            _dx = vol_ * sqrt(3 * _dt)
+            _drift = (rate_ - div_ - vol_ ** 2 / 2) * _dt / _dx
+            _var = (vol_ ** 2 * _dt + ((rate_ - div_ - vol_ ** 2 / 2) * _dt) ** 2) / _dx ** 2
+            _prob = ((_var - _drift) / 2, 1 - _var, (_var + _drift) / 2)
+            _width, _record = 2, 1
+        _early = set(range(step_)) if american_ else \
+            set([int(round(_e / _dt)) for _e in exercise_ if 0 < _e < t_]) - {0, step_}
+
+        def _spot(level_):
+            return isp_ * exp((arange(_width * level_ + 1) - level_ * _width / 2) * _dx * (2 / _width))
+
+        # smoothing: the last step is replaced by the european value over one period
+        _level = step_ - 1
+        _value = BlackScholes.price(sign=sign_, isp=_spot(_level), strike=strike_, rate=rate_, div=div_, vol=vol_,
+                                    t=_dt)
+        _nodes = {}
+        while True:
+            if _level in _early:
+                _value = maximum(_value, maximum(sign_ * (_spot(_level) - strike_), 0))
+            if _level <= _record:
+                _nodes[_level] = _value
+            if _level == 0:
+                break
+            _value = _disc * sum([_p * _value[:, _i:_value.shape[1] - _width + _i]
+                                  for _i, _p in enumerate(_prob)])
+            _level -= 1
+
+        _risk = dict(pv=_nodes[0][:, 0])
+        _s1, _v1 = _spot(1), _nodes[1]
+        if tree_ == LatticeTree.Binomial.value:
+            _s2, _v2 = _spot(2), _nodes[2]
+            _delta_low = (_v2[:, 1] - _v2[:, 0]) / (_s2[1] - _s2[0])
+            _delta_high = (_v2[:, 2] - _v2[:, 1]) / (_s2[2] - _s2[1])
+            _risk['delta'] = (_v1[:, 1] - _v1[:, 0]) / (_s1[1] - _s1[0])
+            _risk['gamma'] = (_delta_high - _delta_low) / (_s2[2] - _s2[0]) * 2
+            _risk['theta'] = (_v2[:, 1] - _risk['pv']) / (2 * _dt) / DAY_PER_YEAR
+        else:
+            _delta_low = (_v1[:, 1] - _v1[:, 0]) / (_s1[1] - _s1[0])
+            _delta_high = (_v1[:, 2] - _v1[:, 1]) / (_s1[2] - _s1[1])
+            _risk['delta'] = (_v1[:, 2] - _v1[:, 0]) / (_s1[2] - _s1[0])
+            _risk['gamma'] = (_delta_high - _delta_low) / (_s1[2] - _s1[0]) * 2
+            _risk['theta'] = (_v1[:, 1] - _risk['pv']) / _dt / DAY_PER_YEAR
+        return _risk
@@ -1,17 +1,207 @@
 # coding=utf-8
 """Monte-Carlo engine"""
 
+from numpy import asarray, average, concatenate, cumsum, diff, flatnonzero, maximum, ones, searchsorted, sort, unique
+from numpy import inf, where, zeros
 from numpy.ma import exp, sqrt
-from numpy.random import normal as rand_norm
-from utils import parse_kwargs
+from numpy.random import default_rng, normal as rand_norm
+from utils import forward_rates, parse_kwargs
+from utils.black_scholes import DAY_PER_YEAR
+
+
+mc_batch = 2 ** 16
 
 
 class MonteCarlo(object):
     """Monte Carlo Engine"""
 
+    @staticmethod
+    def normal(size_, seed_=None):
+        """standard normal randoms, reproducible if seed is given"""
+        return rand_norm(0, 1, size_) if seed_ is None else default_rng(seed_).standard_normal(size_)
+
     @classmethod
     def stock_price(cls, iteration_=1, **kwargs):
         """generate stock spot through stochastic process"""
-        _rand = rand_norm(0, 1, iteration_)
         _isp, _rate, _div, _vol, _t = parse_kwargs(kwargs, ['isp', 'rate', 'div', 'vol', 't'], 0)
+        _rand = kwargs.get('rand')
+        if _rand is None:
+            _rand = rand_norm(0, 1, iteration_)
         return _isp * exp((_rate - _div - _vol ** 2 / 2) * _t + _vol * sqrt(_t) * _rand)
+
+    @staticmethod
+    def estimate(sample_, cap_, seed_=None, target_error_=None, rel_tolerance_=None, batch_=mc_batch):
+        """
+        average path samples batch by batch until standard error reaches target or number of paths reaches cap
+        all batches draw from one generator, so a seeded estimate is reproducible
+        :param sample_: callable of (number of paths, random generator) returning discounted payoff of every path
+        :param cap_: most paths, all of them are run if neither target is given
+        :param target_error_: absolute standard error to reach
+        :param rel_tolerance_: standard error relative to estimate to reach
+        :return: a dict with keys value, stderr and paths
+        """
+        _generator = default_rng(seed_)
+        _paths, _mean, _square = 0, 0., 0.
+        _error = inf
+        while _paths < cap_:
+            _sample = asarray(sample_(min(batch_, cap_ - _paths), _generator), dtype=float)
+            # batch mean and sum of squared deviation are merged into running ones (Chan et al.)
+            _size, _batch_mean = _sample.size, _sample.mean()
+            _total = _paths + _size
+            _delta = _batch_mean - _mean
+            _square += ((_sample - _batch_mean) ** 2).sum() + _delta ** 2 * _paths * _size / _total
+            _mean += _delta * _size / _total
+            _paths = _total
+            _error = sqrt(_square / (_paths - 1) / _paths) if _paths > 1 else inf
+            if (target_error_ is not None and _error <= target_error_) or \
+                    (rel_tolerance_ is not None and _error <= rel_tolerance_ * abs(_mean)):
+                break
+        return dict(value=_mean, stderr=float(_error), paths=_paths)
+
+    @classmethod
+    def stock_price_chunks(cls, iteration_, chunk_, seed_=None, **kwargs):
+        """generate stock spot chunk by chunk so that memory is bounded by chunk size"""
+        _generator = default_rng(seed_)
+        for _start in range(0, iteration_, chunk_):
+            _size = min(chunk_, iteration_ - _start)
+            yield cls.stock_price(_size, rand=_generator.standard_normal(_size), **kwargs)
+
+    @classmethod
+    def stock_slices(cls, iteration_, times_, **kwargs):
+        """
+        generate stock spot on increasing time slices through one multi-step simulation
+        only one slice per distinct time is kept, so memory grows with number of slices rather than path steps
+        :param times_: increasing times (year) of slices
+        kwargs:
+            rate, div: flat, or zero rates to every slice time, paths grow at forward rates between slices
+        :return: array in shape of (slice, iteration)
+        """
+        _isp, _rate, _div, _vol = parse_kwargs(kwargs, ['isp', 'rate', 'div', 'vol'], 0)
+        _rand = kwargs.get('rand')
+        if _rand is None:
+            _rand = rand_norm(0, 1, (len(times_), iteration_))
+        _res = zeros((len(times_), iteration_))
+        _rate, _div = forward_rates(times_, _rate), forward_rates(times_, _div)
+        _spot = _isp
+        for _idx, _dt in enumerate(diff(concatenate([[0], times_]))):
+            _spot = cls.stock_price(isp=_spot, rate=_rate[_idx], div=_div[_idx], vol=_vol, t=_dt, rand=_rand[_idx])
+            _res[_idx] = _spot
+        return _res
+
+    @classmethod
+    def vanilla_value(cls, growth_, isp_, sign_, strike_):
+        """
+        evaluate average vanilla payoff of many strikes on many spots from one set of simulated growth factors
+        growth factors are sorted once, then every (spot, strike) pair costs a binary search on prefix sums
+        :param growth_: simulated spot with initial spot 1
+        :param isp_: initial spots
+        :param sign_: leg signs, 1 for call and -1 for put
+        :param strike_: leg strikes
+        :return: undiscounted average payoff in shape of (spot, leg)
+        """
+        _growth = sort(asarray(growth_))
+        _total = concatenate([[0], cumsum(_growth)])
+        _isp = asarray(isp_, dtype=float)[:, None]
+        _sign, _strike = asarray(sign_)[None, :], asarray(strike_, dtype=float)[None, :]
+        _idx = searchsorted(_growth, _strike / where(_isp > 0, _isp, 1), side='right')
+        _idx = where(_isp > 0, _idx, _growth.size)
+        _call = (_isp * (_total[-1] - _total[_idx]) - _strike * (_growth.size - _idx)) / _growth.size
+        _put = (_strike * _idx - _isp * _total[_idx]) / _growth.size
+        return where(_sign > 0, _call, _put)
+
+    @classmethod
+    def vanilla_prices(cls, iteration_, sign_, strike_, t_, seed_=None, cancel_=None, **kwargs):
+        """
+        price many european vanilla legs on one set of simulated paths
+        paths advance from one distinct maturity to the next, only the current slice is held
+        kwargs:
+            isp, rate, div, vol: market, rate and div may also be zero rates to maturity of every leg
+        :param cancel_: callable polled before every slice, pricing stops once it returns True
+        :return: discounted average payoff of every leg, or None if cancelled
+        """
+        _isp, _rate, _div, _vol = parse_kwargs(kwargs, ['isp', 'rate', 'div', 'vol'], 0)
+        _sign, _strike, _t = asarray(sign_), asarray(strike_, dtype=float), asarray(t_, dtype=float)
+        _times, _first, _inverse = unique(_t, return_index=True, return_inverse=True)
+        _zero = (zeros(_t.size) + _rate)[_first]
+        _forward = forward_rates(_times, _zero)
+        _carry = forward_rates(_times, (zeros(_t.size) + _div)[_first])
+        _generator = default_rng(seed_)
+        _res = zeros(_t.size)
+        _growth, _last = ones(iteration_), 0.
+        for _slice, _time in enumerate(_times):
+            if cancel_ is not None and cancel_():
+                return None
+            _growth = cls.stock_price(isp=_growth, rate=_forward[_slice], div=_carry[_slice], vol=_vol,
+                                      t=_time - _last, rand=_generator.standard_normal(iteration_))
+            _last = _time
+            _idx = flatnonzero(_inverse == _slice)
+            _res[_idx] = cls.vanilla_value(_growth, [_isp], _sign[_idx], _strike[_idx])[0] * \
+                exp(-_zero[_slice] * _time)
+        return _res
+
+    @classmethod
+    def stock_path(cls, iteration_, step_, seed_=None, **kwargs):
+        """
+        generate stock paths step by step on equally spaced dates, all paths advance together on each step
+        only the current step is held, so path statistics are accumulated by caller with memory of one slice
+        kwargs:
+            isp, rate, div, vol, t: market and maturity
+            bridge: if uniform randoms for brownian bridge sampling between steps are required
+        :return: generator of (previous spot, current spot, integrated variance, uniform random or None) per step
+        """
+        _isp, _rate, _div, _vol, _t = parse_kwargs(kwargs, ['isp', 'rate', 'div', 'vol', 't'], 0)
+        _bridge = kwargs.get('bridge', False)
+        _generator = default_rng(seed_)
+        _spot = zeros(iteration_) + _isp
+        for _ in range(step_):
+            _next = cls.stock_price(isp=_spot, rate=_rate, div=_div, vol=_vol, t=_t / step_,
+                                    rand=_generator.standard_normal(iteration_))
+            yield _spot, _next, _vol ** 2 * _t / step_, _generator.random(iteration_) if _bridge else None
+            _spot = _next
+
+    @classmethod
+    def option_risk(cls, iteration_=1, measures_=None, **kwargs):
+        """
+        evaluate vanilla option price and greeks by bumping market on common random numbers
+        spot bumps only rescale the simulated paths, so a single draw serves every measure
+        :param measures_: measures required, all if not given, only required bumps are run
+        :return: a dict with required ones of keys pv, delta, gamma, vega, theta, rho (same units as
+            BlackScholes.risk)
+        """
+        _sign, _isp, _strike, _rate, _div, _vol, _t = parse_kwargs(
+            kwargs, ['sign', 'isp', 'strike', 'rate', 'div', 'vol', 't'], 0)
+        _rand = kwargs.get('rand')
+        if _rand is None:
+            _rand = rand_norm(0, 1, iteration_)
+
+        def _value(isp_=_isp, rate_=_rate, vol_=_vol, t_=_t):
+            _spot = cls.stock_price(isp=isp_, rate=rate_, div=_div, vol=vol_, t=t_, rand=_rand)
+            return average(maximum(_sign * (_spot - _strike), 0)) * exp(-rate_ * t_)
+
+        return cls.bump_risk(_value, _isp, _rate, _vol, _t, measures_)
+
+    @staticmethod
+    def bump_risk(value_, isp_, rate_, vol_, t_, measures_=None):
+        """
+        PV and greeks by bumping market of value function, which takes isp_, rate_, vol_ and t_ as keywords
+        :param measures_: measures required, all if not given, only required bumps are run
+        """
+        _measures = measures_ or ['pv', 'delta', 'gamma', 'vega', 'theta', 'rho']
+        _res = dict()
+        _pv = value_() if set(_measures) & {'pv', 'gamma', 'theta'} else None
+        if 'pv' in _measures:
+            _res['pv'] = _pv
+        if 'delta' in _measures or 'gamma' in _measures:
+            _ds = isp_ * 0.01
+            _up, _down = value_(isp_=isp_ + _ds), value_(isp_=isp_ - _ds)
+            if 'delta' in _measures:
+                _res['delta'] = (_up - _down) / 2 / _ds
+            if 'gamma' in _measures:
+                _res['gamma'] = (_up - 2 * _pv + _down) / _ds ** 2
+        if 'vega' in _measures:
+            _res['vega'] = (value_(vol_=vol_ + 0.01) - value_(vol_=max(vol_ - 0.01, 0))) / 2
+        if 'theta' in _measures:
+            _res['theta'] = value_(t_=max(t_ - 1 / DAY_PER_YEAR, 0)) - _pv
+        if 'rho' in _measures:
+            _res['rho'] = (value_(rate_=rate_ + 0.01) - value_(rate_=rate_ - 0.01)) / 2
+        return _res
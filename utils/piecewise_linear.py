@@ -0,0 +1,75 @@
+# coding=utf-8
+"""piecewise linear function on non-negative spot"""
+
+from numpy import argmax, argmin, asarray, bincount, concatenate, cumsum, diff, inf, interp, unique, where
+
+
+class PiecewiseLinear(object):
+    """
+    continuous piecewise linear function on [0, inf)
+    defined by value on increasing knots starting from 0 and slope beyond the last knot
+    """
+    def __init__(self, knot_, value_, tail_slope_):
+        self._knot = asarray(knot_, dtype=float)
+        self._value = asarray(value_, dtype=float)
+        self._tail_slope = float(tail_slope_)
+
+    def __call__(self, x_):
+        """evaluate on any spot, linear extrapolation beyond the last knot"""
+        _x = asarray(x_, dtype=float)
+        return where(_x > self._knot[-1], self._value[-1] + self._tail_slope * (_x - self._knot[-1]),
+                     interp(_x, self._knot, self._value))
+
+    @classmethod
+    def from_kinks(cls, value_zero_, slope_zero_, kink_, slope_change_):
+        """
+        build from value and slope at spot 0 and slope changes at kinks in O(n log n)
+        :param value_zero_: value at spot 0
+        :param slope_zero_: slope right after spot 0
+        :param kink_: spot of kinks, need not be sorted or unique
+        :param slope_change_: slope change at each kink
+        """
+        _kink, _index = unique(asarray(kink_, dtype=float), return_inverse=True)
+        _change = bincount(_index, weights=asarray(slope_change_, dtype=float), minlength=_kink.size)
+        _change = _change[_kink > 0]
+        _kink = _kink[_kink > 0]
+        _knot = concatenate([[0], _kink])
+        _slope = slope_zero_ + concatenate([[0], cumsum(_change)])
+        _value = value_zero_ + concatenate([[0], cumsum(_slope[:-1] * diff(_knot))])
+        return cls(_knot, _value, _slope[-1])
+
+    def shift(self, value_):
+        """return the function shifted by a constant"""
+        return PiecewiseLinear(self._knot, self._value + value_, self._tail_slope)
+
+    def knots(self):
+        """spots where slope may change, starting from 0"""
+        return self._knot
+
+    def slopes(self):
+        """slope on each segment between knots and beyond the last knot"""
+        return concatenate([diff(self._value) / diff(self._knot), [self._tail_slope]])
+
+    def roots(self):
+        """all spots where value crosses or touches zero, flat zero segments give their end knots"""
+        _left, _right = self._value[:-1], self._value[1:]
+        _cross = _left * _right < 0
+        _res = list(self._knot[:-1][_cross] - _left[_cross] * diff(self._knot)[_cross] / (_right - _left)[_cross])
+        _res += list(self._knot[self._value == 0])
+        if self._value[-1] * self._tail_slope < 0:
+            _res.append(self._knot[-1] - self._value[-1] / self._tail_slope)
+        return sorted(set(_res))
+
+    def maximum(self):
+        """maximum value and its spot, value is inf if the function grows without bound"""
+        if self._tail_slope > 0:
+            return inf, inf
+        _idx = argmax(self._value)
+        return self._value[_idx], self._knot[_idx]
+
+    def minimum(self):
+        """minimum value and its spot, value is -inf if the function falls without bound"""
+        if self._tail_slope < 0:
+            return -inf, inf
+        _idx = argmin(self._value)
+        return self._value[_idx], self._knot[_idx]
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""volatility surface with precomputed smile interpolation"""
+
+from numpy import asarray, broadcast_arrays, clip, log, maximum, searchsorted, sqrt, take_along_axis
+from scipy.interpolate import CubicSpline
+
+# most surfaces kept built, the oldest is dropped beyond it
+surface_cache_size = 64
+
+_surface_cache = {}
+
+
+class VolSurface(object):
+    """
+    implied volatility quotes on a strike x maturity grid
+    every maturity slice is a natural cubic spline in log strike, built once when the surface is created
+    total variance is linear in time between slices, vols are flat beyond quoted strikes and maturities
+    lookups are vectorized, strikes and maturities of a whole book broadcast against each other
+    """
+    def __init__(self, strikes_, maturities_, vols_):
+        """
+        :param strikes_: increasing strikes, same unit as option strikes
+        :param maturities_: increasing maturities (year)
+        :param vols_: volatility (%) in shape of (maturity, strike)
+        """
+        self._strikes = asarray(strikes_, dtype=float)
+        self._maturities = asarray(maturities_, dtype=float)
+        _vols = asarray(vols_, dtype=float) / 100
+        if self._strikes.ndim != 1 or self._strikes.size < 2 or (self._strikes <= 0).any() or \
+                (self._strikes[1:] <= self._strikes[:-1]).any():
+            raise ValueError("at least 2 positive increasing strikes are required for vol surface")
+        if self._maturities.ndim != 1 or not self._maturities.size or (self._maturities <= 0).any() or \
+                (self._maturities[1:] <= self._maturities[:-1]).any():
+            raise ValueError("positive increasing maturities are required for vol surface")
+        if _vols.shape != (self._maturities.size, self._strikes.size):
+            raise ValueError("vols in shape of (maturity, strike) = {} are required for vol surface, not {}".format(
+                (self._maturities.size, self._strikes.size), _vols.shape))
+        if (_vols <= 0).any():
+            raise ValueError("positive vols are required for vol surface")
+        self._log_range = log(self._strikes[[0, -1]])
+        self._spline = CubicSpline(log(self._strikes), _vols, axis=1, bc_type='natural')
+
+    @classmethod
+    def from_quotes(cls, quotes_):
+        """
+        get surface of market quotes, surfaces are cached by their quotes so splines are built once
+        :param quotes_: a dict with keys strikes, maturities and vols as __init__
+        """
+        if not isinstance(quotes_, dict):
+            raise ValueError("type <dict> is required for vol surface, not {}".format(type(quotes_)))
+        _key = tuple(tuple(asarray(quotes_.get(_k), dtype=float).ravel()) for _k in ['strikes', 'maturities', 'vols'])
+        if _key not in _surface_cache:
+            if len(_surface_cache) >= surface_cache_size:
+                _surface_cache.pop(next(iter(_surface_cache)))
+            _surface_cache[_key] = cls(quotes_.get('strikes'), quotes_.get('maturities'), quotes_.get('vols'))
+        return _surface_cache[_key]
+
+    def vol(self, strike_, t_):
+        """volatility (decimal) at strikes and maturities"""
+        _log, _t = broadcast_arrays(clip(log(asarray(strike_, dtype=float)), *self._log_range),
+                                    asarray(t_, dtype=float))
+        # vols of every slice at all strikes, maturity axis first
+        _slice = self._spline(_log)
+        if self._maturities.size == 1:
+            return _slice[0][()]
+        _time = clip(_t, self._maturities[0], self._maturities[-1])
+        _idx = searchsorted(self._maturities, _time).clip(1, self._maturities.size - 1)
+        _t0, _t1 = self._maturities[_idx - 1], self._maturities[_idx]
+        _w0 = take_along_axis(_slice, _idx[None] - 1, axis=0)[0] ** 2 * _t0
+        _w1 = take_along_axis(_slice, _idx[None], axis=0)[0] ** 2 * _t1
+        _var = (_w0 + (_w1 - _w0) * (_time - _t0) / (_t1 - _t0)) / _time
+        return sqrt(maximum(_var, 0))[()]
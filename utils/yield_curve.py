@@ -0,0 +1,78 @@
+# coding=utf-8
+"""term structure of rate with precomputed discount factors"""
+
+from numpy import asarray, concatenate, exp, interp, where
+from utils import forward_rates, to_continuous_rate
+
+# most curves kept built, the oldest is dropped beyond it
+curve_cache_size = 64
+
+_curve_cache = {}
+
+
+class YieldCurve(object):
+    """
+    continuous zero rates on increasing pillar maturities, used for both risk free rate and dividend yield
+    log discount factors of pillars are precomputed when the curve is created, forwards follow from them
+    log discount factor is linear in time between pillars (flat forwards), zero rate is flat beyond pillars
+    lookups are vectorized, zero rates of scalar maturities are also kept per curve
+    """
+    def __init__(self, maturities_, rates_):
+        """
+        :param maturities_: increasing maturities (year)
+        :param rates_: continuous zero rates (decimal) of maturities
+        """
+        self._maturities = asarray(maturities_, dtype=float)
+        _rates = asarray(rates_, dtype=float)
+        if self._maturities.ndim != 1 or not self._maturities.size or (self._maturities <= 0).any() or \
+                (self._maturities[1:] <= self._maturities[:-1]).any():
+            raise ValueError("positive increasing maturities are required for yield curve")
+        if _rates.shape != self._maturities.shape:
+            raise ValueError("one rate per maturity is required for yield curve, not {} rates for {} maturities"
+                             .format(_rates.size, self._maturities.size))
+        self._times = concatenate([[0], self._maturities])
+        self._log_discount = concatenate([[0], -_rates * self._maturities])
+        self._last = _rates[-1]
+        self._rate_cache = {}
+
+    @classmethod
+    def from_quotes(cls, quotes_, single_=False):
+        """
+        get curve of market quotes, curves are cached by their quotes so discount factors are built once
+        :param quotes_: a dict with keys maturities (year) and rates (%)
+        :param single_: if rates are single (annually compounded) rather than continuous
+        """
+        if not isinstance(quotes_, dict):
+            raise ValueError("type <dict> is required for yield curve, not {}".format(type(quotes_)))
+        _key = tuple(tuple(asarray(quotes_.get(_k), dtype=float).ravel()) for _k in ['maturities', 'rates']) + \
+            (single_,)
+        if _key not in _curve_cache:
+            if len(_curve_cache) >= curve_cache_size:
+                _curve_cache.pop(next(iter(_curve_cache)))
+            _rates = asarray(quotes_.get('rates'), dtype=float) / 100
+            _curve_cache[_key] = cls(quotes_.get('maturities'),
+                                     asarray(to_continuous_rate(_rates)) if single_ else _rates)
+        return _curve_cache[_key]
+
+    def rate(self, t_):
+        """continuous zero rate (decimal) to maturities"""
+        if isinstance(t_, (int, float)):
+            if t_ not in self._rate_cache:
+                self._rate_cache[t_] = float(self._zero_rate(asarray(t_, dtype=float)))
+            return self._rate_cache[t_]
+        return self._zero_rate(asarray(t_, dtype=float))[()]
+
+    def discount(self, t_):
+        """discount factor to maturities"""
+        _t = asarray(t_, dtype=float)
+        return exp(-self.rate(t_) * _t)[()]
+
+    def forwards(self, times_):
+        """continuous forward rates (decimal) of intervals between increasing maturities, starting from 0"""
+        return forward_rates(times_, self.rate(asarray(times_, dtype=float)))
+
+    def _zero_rate(self, t_):
+        _t = where(t_ > 0, t_, self._maturities[0])
+        _log_discount = where(_t > self._maturities[-1], -self._last * _t,
+                              interp(_t, self._times, self._log_discount))
+        return -_log_discount / _t